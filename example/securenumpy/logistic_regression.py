@@ -46,6 +46,18 @@ class LogisticRegression:
             gradient = snp.dot(X.T, (h - y)) / y.size
             self.theta -= self.lr * gradient
 
+    def fit_minibatch(self, loader, epochs=1):
+        for epoch in range(epochs):
+            print(f"epoch: {epoch}")
+            for X, y in loader:
+                if self.fit_intercept:
+                    X = self._add_intercept(X)
+                if not hasattr(self, "theta"):
+                    self.theta = snp.zeros(X.shape[1])
+                h = self._sigmoid(snp.dot(X, self.theta))
+                gradient = snp.dot(X.T, (h - y)) / y.size
+                self.theta -= self.lr * gradient
+
     def predict_prob(self, X):
         if self.fit_intercept:
             X = self._add_intercept(X)
@@ -56,6 +68,20 @@ class LogisticRegression:
         return self.predict_prob(X) >= threshold
 
 
+def build_vm(party, host, port0, port1):
+    net_params = NetParams()
+    if party == 0:
+        net_params.remote_addr = host
+        net_params.remote_port = port1
+        net_params.local_port = port0
+    else:
+        net_params.remote_addr = host
+        net_params.remote_port = port0
+        net_params.local_port = port1
+    net = NetFactory.get_instance().build(NetScheme.SOCKET, net_params)
+    return VM(net, party)
+
+
 if __name__ == '__main__':
     # load network setting
     import argparse
@@ -65,6 +91,15 @@ if __name__ == '__main__':
     parser.add_argument("--port0", type=int, help="port of party 0, defalut 8089", default=8089)
     parser.add_argument("--port1", type=int, help="port of party 1, defalut 8090", default=8090)
     parser.add_argument("--host", type=str, help="host of this party", default="127.0.0.1")
+    parser.add_argument("--batch-size", type=int, help="minibatch size, 0 trains on the full data", default=0)
+    parser.add_argument("--loader-port0",
+                        type=int,
+                        help="port of party 0 for sharing the minibatches, default 8091",
+                        default=8091)
+    parser.add_argument("--loader-port1",
+                        type=int,
+                        help="port of party 1 for sharing the minibatches, default 8092",
+                        default=8092)
 
     args = parser.parse_args()
     party = args.party
@@ -72,19 +107,8 @@ if __name__ == '__main__':
     port1 = args.port1
     host = args.host
 
-    net_params = NetParams()
-    if party == 0:
-        net_params.remote_addr = host
-        net_params.remote_port = port1
-        net_params.local_port = port0
-    else:
-        net_params.remote_addr = host
-        net_params.remote_port = port0
-        net_params.local_port = port1
-
     # init mpc engine
-    net = NetFactory.get_instance().build(NetScheme.SOCKET, net_params)
-    vm = VM(net, party)
+    vm = build_vm(party, host, port0, port1)
     snp.set_vm(vm)
 
     # prepare data
@@ -100,7 +124,15 @@ if __name__ == '__main__':
     y_cipher = snp.array(y_plain, party=1)
 
     clf = LogisticRegression(max_iter=5)
-    clf.fit(x_cipher, y_cipher)
+    if args.batch_size > 0:
+        # a second connection shares the next minibatch while the current step runs, rows are shuffled every epoch
+        loader_vm = build_vm(party, host, args.loader_port0, args.loader_port1)
+        with sml.BatchLoader([(x_plain, 0), (y_plain, 1)], args.batch_size, shuffle=True,
+                             loader_vm=loader_vm) as loader:
+            clf.fit_minibatch(loader, epochs=5)
+        loader_vm.close()
+    else:
+        clf.fit(x_cipher, y_cipher)
 
     y_pred = clf.predict(x_cipher)
     y_pred_plain = y_pred.reveal_to(0)
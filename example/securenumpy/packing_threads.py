@@ -0,0 +1,86 @@
+# Copyright 2023 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Time the export and import of bit-packed bool shares with 1 and more threads, see `VM.set_num_threads`."""
+
+import os
+import time
+
+import numpy as numpy_np
+import petace.securenumpy as np
+from petace.network import NetParams, NetScheme, NetFactory
+from petace.duet import VM
+
+
+def best_time(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run(vm, cipher, threads, repeat):
+    vm.set_num_threads(threads)
+    share = cipher.to_share(packed=True)
+    export_time = best_time(lambda: cipher.to_share(packed=True), repeat)
+    import_time = best_time(lambda: np.fromshare(share, numpy_np.bool_, cipher.shape), repeat)
+    return export_time, import_time
+
+
+if __name__ == '__main__':
+    # load network setting
+    import argparse
+
+    parser = argparse.ArgumentParser(description='PETAce-Duet packing benchmark.')
+    parser.add_argument("-p", "--party", type=int, help="which party")
+    parser.add_argument("--port0", type=int, help="port of party 0, defalut 8089", default=8089)
+    parser.add_argument("--port1", type=int, help="port of party 1, defalut 8090", default=8090)
+    parser.add_argument("--host", type=str, help="host of this party", default="127.0.0.1")
+    parser.add_argument("--size", type=int, help="number of elements, default 2 ** 24", default=1 << 24)
+    parser.add_argument("--threads", type=int, help="number of threads, default all cores", default=os.cpu_count())
+    parser.add_argument("--repeat", type=int, help="runs of each measure, default 5", default=5)
+
+    args = parser.parse_args()
+    party = args.party
+    port0 = args.port0
+    port1 = args.port1
+    host = args.host
+
+    net_params = NetParams()
+    if party == 0:
+        net_params.remote_addr = host
+        net_params.remote_port = port1
+        net_params.local_port = port0
+    else:
+        net_params.remote_addr = host
+        net_params.remote_port = port0
+        net_params.local_port = port1
+
+    # init mpc engine
+    net = NetFactory.get_instance().build(NetScheme.SOCKET, net_params)
+    vm = VM(net, party)
+    np.set_vm(vm)
+
+    # prepare data, the packing is local so only the share of this party is timed
+    numpy_np.random.seed(43)
+    plain = numpy_np.random.random(args.size) > 0.5 if party == 0 else None
+    cipher = np.array(plain, party=0, dtype=numpy_np.bool_)
+
+    serial = run(vm, cipher, 1, args.repeat)
+    parallel = run(vm, cipher, args.threads, args.repeat)
+    vm.set_num_threads(1)
+    for name, one, many in zip(("export", "import"), serial, parallel):
+        print(f"{name}: {one * 1e3:.1f} ms with 1 thread, {many * 1e3:.1f} ms with {args.threads} threads, "
+              f"speedup {one / many:.2f}x")
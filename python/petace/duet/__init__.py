@@ -13,3 +13,5 @@
 # limitations under the License.
 
 from .vm import VM
+from .abstract_vm import AbstractVM
+from .trace import merge_traces
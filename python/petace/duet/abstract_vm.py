@@ -0,0 +1,271 @@
+# Copyright 2023 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+import math
+import time
+import queue
+import itertools
+import threading
+from typing import List, Tuple
+
+import numpy as np
+
+from .vm import BaseVM, PETAceBuffer
+from .exception import DuetVMError
+from .memory import call_site
+from .cost_model import Cost, estimate, estimate_message
+
+
+class EstimatedInstruction:
+    """An instruction recorded by `AbstractVM`.
+
+    Attributes
+    ----------
+    op : str
+        The operation, or "send_buffer" and "recv_buffer" for a raw message, whose shape is its byte length.
+    types : tuple of str
+        Data types of the operands.
+    shapes : tuple of tuples
+        Shapes of the operands.
+    cost : Cost
+        The estimated cost.
+    call_site : str
+        The line of the program that executed the instruction.
+    """
+
+    def __init__(self, op: str, types: Tuple[str], shapes: Tuple[Tuple[int]], cost: Cost, call_site: str) -> None:
+        self.op = op
+        self.types = types
+        self.shapes = shapes
+        self.cost = cost
+        self.call_site = call_site
+
+    def __repr__(self):
+        return (f"EstimatedInstruction(op={self.op}, types={self.types}, shapes={self.shapes}, cost={self.cost}, "
+                f"call_site={self.call_site})")
+
+
+class _Channel:
+    """The messages between a pair of AbstractVMs, see `AbstractVM.pair`."""
+
+    def __init__(self) -> None:
+        self.queues = (queue.Queue(), queue.Queue())
+        self.closed = threading.Event()
+
+
+class AbstractVM(BaseVM):
+    """A VM that runs nothing and only records the instructions with their estimated cost.
+
+    Buffers have shapes and dtypes but no data: every read returns zeros. By default nothing is sent
+    and received messages are zeros, the VMs made by `pair` exchange their messages instead, so the
+    shapes one party sends reach the other. Programs whose control flow depends on revealed values
+    or on the data of the other party are explained along the path taken for zeros.
+
+    Parameters
+    ----------
+    party_id : int
+        The party to simulate.
+    """
+
+    def __init__(self, party_id: int = 0, channel: _Channel = None):
+        super().__init__()
+        self._party_id = party_id
+        self._channel = channel
+        self._pending = bytearray()
+        self._addresses = itertools.count()
+        self._owners = {}
+        self._num_threads = 1
+        self.instructions: List[EstimatedInstruction] = []
+
+    @classmethod
+    def pair(cls) -> Tuple[AbstractVM, AbstractVM]:
+        """Two AbstractVMs of party 0 and 1 connected to each other, to run the two parties in two threads."""
+        channel = _Channel()
+        return cls(0, channel), cls(1, channel)
+
+    def close(self):
+        """Stop the worker thread and the exchange of messages, a party waiting for a message raises DuetVMError."""
+        super().close()
+        if self._channel is not None:
+            self._channel.closed.set()
+
+    def party_id(self) -> int:
+        return self._party_id
+
+    def set_num_threads(self, num_threads: int):
+        if num_threads < 1:
+            raise ValueError("Number of threads must be positive")
+        self._num_threads = num_threads
+
+    def num_threads(self) -> int:
+        return self._num_threads
+
+    def thread_cpu_time(self) -> float:
+        return time.thread_time()
+
+    def execute_code(self, operation: str, objs: List[PETAceBuffer]) -> None:
+        super().execute_code(operation, objs)
+        types = tuple(obj.data_type for obj in objs)
+        shapes = tuple(obj.shape for obj in objs)
+        self.instructions.append(
+            EstimatedInstruction(operation, types, shapes, estimate(operation, types, shapes), call_site()))
+
+    def __new_register(self, owner: int = None) -> int:
+        addr = next(self._addresses)
+        self._owners[addr] = owner
+        return addr
+
+    def __zeros(self, addr: int, dtype: np.dtype) -> np.ndarray:
+        for buffer in self._live.values():
+            if buffer.reg_addr == addr:
+                return np.zeros(self.matrix_shape(buffer.shape), dtype=dtype)
+        raise DuetVMError(f"register {addr} is not allocated")
+
+    def __private(self, addr: int, dtype: np.dtype) -> np.ndarray:
+        if self._owners.get(addr) != self._party_id:
+            return np.zeros((0, 0), dtype=dtype)
+        return self.__zeros(addr, dtype)
+
+    def new_airth_matrix(self) -> int:
+        return self.__new_register()
+
+    def new_bool_matrix(self) -> int:
+        return self.__new_register()
+
+    def new_public_double_matrix(self) -> int:
+        return self.__new_register()
+
+    def new_public_double(self) -> int:
+        return self.__new_register()
+
+    def new_public_index(self) -> int:
+        return self.__new_register()
+
+    def new_public_bool_matrix(self) -> int:
+        return self.__new_register()
+
+    def new_private_double_matrix(self, party: int) -> int:
+        return self.__new_register(party)
+
+    def new_private_bool_matrix(self, party: int) -> int:
+        return self.__new_register(party)
+
+    def exec_code(self, inst, addrs: List[int]):
+        pass
+
+    def exec_program(self, instructions: list, addresses: List[List[int]]):
+        pass
+
+    def delete_data(self, addr: int):
+        self._owners.pop(addr, None)
+
+    def set_private_double_matrix(self, *args):
+        pass
+
+    def set_private_bool_matrix(self, *args):
+        pass
+
+    def set_private_bool_matrix_from_bits(self, *args):
+        pass
+
+    def set_public_double_matrix(self, *args):
+        pass
+
+    def set_public_double(self, *args):
+        pass
+
+    def set_public_index(self, *args):
+        pass
+
+    def set_public_bool_matrix(self, *args):
+        pass
+
+    def set_public_bool_matrix_from_bits(self, *args):
+        pass
+
+    def set_airth_share_matrix(self, *args):
+        pass
+
+    def set_boolean_share_matrix(self, *args):
+        pass
+
+    def set_boolean_share_matrix_packed(self, *args):
+        pass
+
+    def get_private_double_matrix(self, addr: int) -> np.ndarray:
+        return self.__private(addr, np.float64)
+
+    def take_private_double_matrix(self, addr: int) -> np.ndarray:
+        return self.__private(addr, np.float64)
+
+    def get_private_bool_matrix(self, addr: int) -> np.ndarray:
+        return self.__private(addr, np.bool_)
+
+    def take_private_bool_matrix(self, addr: int) -> np.ndarray:
+        return self.__private(addr, np.bool_)
+
+    def get_airth_share_matrix(self, addr: int) -> np.ndarray:
+        return self.__zeros(addr, np.int64)
+
+    def get_boolean_share_matrix(self, addr: int) -> np.ndarray:
+        return self.__zeros(addr, np.int64)
+
+    def get_boolean_share_matrix_packed(self, addr: int) -> np.ndarray:
+        return np.zeros(math.ceil(self.__zeros(addr, np.bool_).size / 64), dtype=np.uint64)
+
+    def get_airth_share_matrix_shape(self, addr: int) -> Tuple[int, int]:
+        return self.__zeros(addr, np.bool_).shape
+
+    def get_bool_share_matrix_shape(self, addr: int) -> Tuple[int, int]:
+        return self.__zeros(addr, np.bool_).shape
+
+    def airth_share_matrix_block(self, *args):
+        pass
+
+    def bool_share_matrix_block(self, *args):
+        pass
+
+    def airth_share_vstack(self, *args):
+        pass
+
+    def airth_share_hstack(self, *args):
+        pass
+
+    def bool_share_vstack(self, *args):
+        pass
+
+    def bool_share_hstack(self, *args):
+        pass
+
+    def __message(self, op: str, size: int):
+        self.instructions.append(EstimatedInstruction(op, (), ((size,),), estimate_message(op, size), call_site()))
+
+    def send_buffer(self, data: bytearray):
+        self.__message("send_buffer", len(data))
+        if self._channel is not None:
+            self._channel.queues[1 - self._party_id].put(bytes(data))
+
+    def recv_buffer(self, size: int) -> bytearray:
+        self.__message("recv_buffer", size)
+        if self._channel is None:
+            return bytearray(size)
+        while len(self._pending) < size:
+            try:
+                self._pending += self._channel.queues[self._party_id].get(timeout=0.1)
+            except queue.Empty:
+                if self._channel.closed.is_set():
+                    raise DuetVMError("the other party stopped") from None
+        ret, self._pending = self._pending[:size], self._pending[size:]
+        return ret
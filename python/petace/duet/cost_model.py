@@ -0,0 +1,224 @@
+# Copyright 2023 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Static cost model of the Duet instructions.
+
+The estimates follow the structure of the two-party protocols behind every instruction: Beaver triple
+multiplications open two masked operands in one round, comparisons extract the sign bit of a 64-bit share
+with a log-depth adder, and reductions such as argmax run a tournament of comparisons. Every ring element
+takes 8 bytes. Offline preprocessing (triple generation) is not counted.
+
+The constants of the nonlinear protocols are estimates, compare them with `VM.profile` on the target
+deployment before relying on absolute numbers. Relative costs are what matter to pick between formulations.
+"""
+
+import math
+from typing import Tuple
+
+import numpy as np
+
+from ._type import Share
+
+ELEMENT_BYTES = 8
+# bit width of the ring of arithmetic shares
+RING_BITS = 64
+
+# operations that never communicate
+LOCAL_OPERATIONS = {"add", "sub", "not", "xor", "reshape", "transpose", "resize", "set_item", "groupby_count"}
+
+# (rounds, elements sent per input element) of the elementwise protocols on shares
+_COMPARE = (int(math.log2(RING_BITS)) + 1, 2 * int(math.log2(RING_BITS)) + 2)
+_MULTIPLEXER = (2, 4)
+_ELEMENTWISE = {
+    "mul": (1, 2),
+    "and": (1, 2),
+    "or": (1, 2),
+    "lt": _COMPARE,
+    "gt": _COMPARE,
+    "le": _COMPARE,
+    "ge": _COMPARE,
+    "eq": (_COMPARE[0] + 1, _COMPARE[1] + 2),
+    "multiplexer": _MULTIPLEXER,
+    # reciprocal by Newton iterations seeded from a normalization by comparisons, then one multiplication
+    "div": (3 * _COMPARE[0] + 2 * 3 + 1, 3 * _COMPARE[1] + 2 * 3 + 2),
+    # piecewise approximation, two comparisons in parallel then selecting the segment
+    "sigmoid": (_COMPARE[0] + _MULTIPLEXER[0] + 1, 2 * _COMPARE[1] + 2 * _MULTIPLEXER[1] + 2),
+}
+# one level of a tournament keeps the larger of two elements, a comparison then two multiplexers
+_TOURNAMENT_LEVEL = (_COMPARE[0] + _MULTIPLEXER[0], _COMPARE[1] + 2 * _MULTIPLEXER[1])
+
+
+class Cost:
+    """Estimated cost of one or more instructions.
+
+    Attributes
+    ----------
+    rounds : int
+        Communication rounds, sequential message exchanges between the parties.
+    bytes_sent : int
+        Bytes sent by each party.
+    local_ops : int
+        Local arithmetic operations on ring elements.
+    """
+
+    def __init__(self, rounds: int = 0, bytes_sent: int = 0, local_ops: int = 0) -> None:
+        self.rounds = rounds
+        self.bytes_sent = bytes_sent
+        self.local_ops = local_ops
+
+    def __add__(self, other: "Cost") -> "Cost":
+        return Cost(self.rounds + other.rounds, self.bytes_sent + other.bytes_sent, self.local_ops + other.local_ops)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Cost) and (self.rounds, self.bytes_sent,
+                                            self.local_ops) == (other.rounds, other.bytes_sent, other.local_ops)
+
+    def __repr__(self):
+        return f"Cost(rounds={self.rounds}, bytes_sent={self.bytes_sent}, local_ops={self.local_ops})"
+
+
+def _size(shape: Tuple[int]) -> int:
+    return int(np.prod(shape)) if len(shape) > 0 else 1
+
+
+def _rows_cols(shape: Tuple[int]) -> Tuple[int, int]:
+    if len(shape) == 0:
+        return 1, 1
+    if len(shape) == 1:
+        return shape[0], 1
+    return shape[0], shape[1]
+
+
+def _depth(n: int) -> int:
+    return math.ceil(math.log2(n)) if n > 1 else 0
+
+
+def _elementwise(op: str, types: Tuple[str], shapes: Tuple[Tuple[int]]) -> Cost:
+    n = _size(shapes[-1])
+    inputs = types[:-1]
+    secret = [t in Share.support_types() for t in inputs]
+    if op in ("mul", "and", "or") and sum(secret) < 2:
+        # scaling a share by a public value is local
+        return Cost(local_ops=n)
+    if op == "multiplexer" and not secret[0]:
+        # a public condition selects locally
+        return Cost(local_ops=n)
+    if op == "div" and not secret[1]:
+        # dividing by a public value is a local scaling
+        return Cost(local_ops=n)
+    rounds, elements = _ELEMENTWISE[op]
+    return Cost(rounds, elements * n * ELEMENT_BYTES, elements * n)
+
+
+def _mat_mul(types: Tuple[str], shapes: Tuple[Tuple[int]]) -> Cost:
+    m, k = (1, shapes[0][0]) if len(shapes[0]) == 1 else _rows_cols(shapes[0])
+    _, n = _rows_cols(shapes[1])
+    local_ops = 2 * m * k * n
+    if not all(t in Share.support_types() for t in types[:2]):
+        return Cost(local_ops=local_ops)
+    # both masked operands are opened, the products are computed locally
+    return Cost(1, (m * k + k * n) * ELEMENT_BYTES, local_ops)
+
+
+def _argmax(shapes: Tuple[Tuple[int]]) -> Cost:
+    rows, cols = _rows_cols(shapes[0])
+    rounds, elements = _TOURNAMENT_LEVEL
+    # a tournament over `rows` candidates takes `rows - 1` matches
+    matches = (rows - 1) * cols
+    return Cost(_depth(rows) * rounds, matches * elements * ELEMENT_BYTES, matches * elements)
+
+
+def _quick_sort(types: Tuple[str], shapes: Tuple[Tuple[int]]) -> Cost:
+    if len(types) == 1:
+        rows, cols = _size(shapes[0]), 1
+    else:
+        rows, cols = _rows_cols(shapes[0])
+    # the input is shuffled so that comparison results can be revealed, then the expected
+    # n log n comparisons run one partition level at a time
+    shuffle = Cost(2, 2 * rows * cols * ELEMENT_BYTES, 2 * rows * cols)
+    comparisons = rows * max(_depth(rows), 1)
+    compare_rounds, compare_elements = _COMPARE
+    levels = 2 * max(_depth(rows), 1)
+    sort = Cost(levels * (compare_rounds + 1),
+                comparisons * (compare_elements + 1) * ELEMENT_BYTES, comparisons * compare_elements)
+    # rows are moved to their positions by a second shuffle
+    return shuffle + sort + Cost(2, 2 * rows * cols * ELEMENT_BYTES, 2 * rows * cols)
+
+
+def _groupby(op: str, types: Tuple[str], shapes: Tuple[Tuple[int]]) -> Cost:
+    rows, cols = _rows_cols(shapes[0])
+    _, groups = _rows_cols(shapes[1])
+    if op in ("groupby_sum", "group_then_sum_by_grouped_count"):
+        # x^T @ encoding
+        return _mat_mul((types[0], types[1]), ((cols, rows), (rows, groups)))
+    # mask every column by every group, then a tournament over the rows of each (column, group) pair
+    mask = _elementwise("mul", ("am", types[1], "am"), ((rows, cols * groups),))
+    tournament = _argmax(((rows, cols * groups),))
+    return mask + tournament
+
+
+def estimate(op: str, types: Tuple[str], shapes: Tuple[Tuple[int]]) -> Cost:
+    """Estimate the cost of one instruction.
+
+    Parameters
+    ----------
+    op : str
+        The operation, one of `VM._supported_operations`.
+    types : tuple of str
+        Data types of the operands as passed to the VM, e.g. ("am", "cdm", "am").
+    shapes : tuple of tuples
+        Shapes of the operands.
+
+    Returns
+    -------
+    Cost
+        Estimated rounds, bytes sent by each party and local operations.
+    """
+    if len(types) != len(shapes):
+        raise ValueError(f"got {len(types)} types but {len(shapes)} shapes")
+    if op in LOCAL_OPERATIONS:
+        return Cost(local_ops=_size(shapes[-1]))
+    if op in ("share", "reveal"):
+        n = _size(shapes[0])
+        return Cost(1, n * ELEMENT_BYTES, n)
+    if not any(t in Share.support_types() for t in types):
+        # plaintext computation by one party or on public data
+        return Cost(local_ops=_size(shapes[-1]))
+    if op in _ELEMENTWISE:
+        return _elementwise(op, types, shapes)
+    if op == "mat_mul":
+        return _mat_mul(types, shapes)
+    if op == "argmax_and_max":
+        return _argmax(shapes)
+    if op == "quick_sort":
+        return _quick_sort(types, shapes)
+    if op == "split_by_condition":
+        # shuffle, then reveal the condition
+        n = _size(shapes[0])
+        return Cost(3, 3 * n * ELEMENT_BYTES, 3 * n)
+    if op in ("groupby_sum", "groupby_max", "groupby_min", "group_then_sum_by_grouped_count"):
+        return _groupby(op, types, shapes)
+    raise ValueError(f"no cost model for operation {op}")
+
+
+def estimate_message(op: str, size: int) -> Cost:
+    """Estimate the cost of a raw message of `size` bytes, sent by `send_buffer` or received by `recv_buffer`.
+
+    The sender is charged the bytes and the receiver the round it waits for them, so a message costs its
+    byte length and one round, and both parties sending then receiving a message takes a single round.
+    """
+    if op == "send_buffer":
+        return Cost(bytes_sent=size)
+    if op == "recv_buffer":
+        return Cost(rounds=1)
+    raise ValueError(f"no cost model for message {op}")
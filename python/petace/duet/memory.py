@@ -0,0 +1,70 @@
+# Copyright 2023 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+import os
+import gc
+import sys
+import warnings
+from typing import TYPE_CHECKING, List
+
+if TYPE_CHECKING:
+    from .vm import VM, PETAceBuffer
+
+_PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# frames in these packages are skipped, the call site is the code using the arrays
+_INTERNAL_DIRS = tuple(os.path.join(_PACKAGE_DIR, name) + os.sep for name in ("duet", "securenumpy"))
+
+
+def call_site() -> str:
+    """Return "file:line in function" of the innermost frame outside the VM and SecureNumpy."""
+    frame = sys._getframe(1)
+    while frame.f_back is not None and frame.f_code.co_filename.startswith(_INTERNAL_DIRS):
+        frame = frame.f_back
+    return f"{frame.f_code.co_filename}:{frame.f_lineno} in {frame.f_code.co_name}"
+
+
+class LeakCheck:
+    """Report the buffers allocated inside a `with` block and never deleted.
+
+    On exit the garbage collector is run, so buffers of unreachable arrays are deleted first, then every
+    buffer allocated inside the block that is still live is reported with a ResourceWarning.
+    Call sites are tracked while the block runs.
+
+    Attributes
+    ----------
+    leaks : list of PETAceBuffer
+        The buffers still live on exit.
+    """
+
+    def __init__(self, vm: VM) -> None:
+        self.vm = vm
+        self.leaks: List[PETAceBuffer] = []
+        self.__start = 0
+        self.__track_call_sites = False
+
+    def __enter__(self) -> LeakCheck:
+        self.__start = self.vm.allocation_count
+        self.__track_call_sites = self.vm._track_call_sites
+        self.vm.set_track_call_sites(True)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        self.vm.set_track_call_sites(self.__track_call_sites)
+        gc.collect()
+        self.leaks = [buffer for buffer in self.vm.live_buffers() if buffer.serial >= self.__start]
+        if self.leaks:
+            lines = [f"  {buffer.data_type} {buffer.shape} at {buffer.call_site}" for buffer in self.leaks]
+            warnings.warn(f"{len(self.leaks)} buffers were never deleted:\n" + "\n".join(lines), ResourceWarning)
+        return False
@@ -0,0 +1,663 @@
+# Copyright 2023 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Optimization passes over recorded programs.
+
+A recorded program is turned into a `Graph` in static single assignment form: every write to a register
+defines a new value, so registers reused by the recording do not tie unrelated computations together.
+The passes rewrite the graph, then `Graph.emit` assigns registers again from the liveness of the values.
+
+The passes only look at the instruction sequence, the operand types and shapes, and public constants,
+which are the same for both parties. Both parties make the same decisions and their programs stay in
+lockstep. Data set by a single party, private data and local shares, is never inspected: those setters
+are treated as writing their register in place, which no pass moves or removes.
+"""
+
+from __future__ import annotations
+import time
+from typing import TYPE_CHECKING, Callable, Dict, List, Tuple, Union
+
+import numpy as np
+
+from .cost_model import Cost, estimate
+
+if TYPE_CHECKING:
+    from .vm import BaseVM
+
+# operations whose operands cannot be described by reads and writes, the passes leave them alone
+_BARRIERS = {"split_by_condition", "group_then_sum_by_grouped_count"}
+# public constants, identical on both parties, and the type of the register they define
+_PUBLIC_SETTERS = {
+    "set_public_double_matrix": "cdm",
+    "set_public_double": "cd",
+    "set_public_index": "ci",
+    "set_public_bool_matrix": "cbm",
+    "set_public_bool_matrix_from_bits": "cbm",
+}
+# setters whose data differs between the parties
+_LOCAL_SETTERS = {
+    "set_private_double_matrix",
+    "set_private_bool_matrix",
+    "set_private_bool_matrix_from_bits",
+    "set_airth_share_matrix",
+    "set_boolean_share_matrix",
+    "set_boolean_share_matrix_packed",
+}
+_CALL_ROLES = {
+    "airth_share_matrix_block": "rw",
+    "bool_share_matrix_block": "rw",
+    "airth_share_vstack": "rrw",
+    "airth_share_hstack": "rrw",
+    "bool_share_vstack": "rrw",
+    "bool_share_hstack": "rrw",
+    "scale_airth_share_matrix": "rw",
+    "set_airth_share_zeros": "w",
+    "send_buffer": "",
+}
+_ALLOCATION_KINDS = {
+    "am": ("new_airth_matrix", ()),
+    "cdm": ("new_public_double_matrix", ()),
+    "cd": ("new_public_double", ()),
+    "ci": ("new_public_index", ()),
+}
+
+
+def _roles(op: str, count: int) -> str:
+    """One letter per operand: r is read, w is written, x is read and written in place."""
+    if op in _BARRIERS:
+        return "x" * count
+    if op == "argmax_and_max":
+        return "rww"
+    if op == "quick_sort":
+        return "x" if count == 1 else "rrw"
+    if op == "set_item":
+        return "rxrrrr"
+    return "r" * (count - 1) + "w"
+
+
+def _freeze(arg: object) -> object:
+    if isinstance(arg, np.ndarray):
+        return (arg.shape, arg.dtype.str, arg.tobytes())
+    if isinstance(arg, (bytearray, list)):
+        return bytes(arg) if isinstance(arg, bytearray) else tuple(arg)
+    return arg
+
+
+def _matrix_shape(shape: Tuple[int]) -> Tuple[int, int]:
+    if len(shape) == 0:
+        return 1, 1
+    if len(shape) == 1:
+        return 1, shape[0]
+    return shape[0], shape[1]
+
+
+class Value:
+    """A value held by a register between two writes.
+
+    Attributes
+    ----------
+    kind : tuple
+        The allocation primitive and its arguments, the register must be of this kind.
+    register : int
+        The register the value must live in, None if any register of its kind will do.
+    """
+
+    __slots__ = ("kind", "register")
+
+    def __init__(self, kind: tuple, register: int = None) -> None:
+        self.kind = kind
+        self.register = register
+
+
+class Node:
+    """One primitive of a program.
+
+    Attributes
+    ----------
+    name : str
+        The primitive, "exec_code" for instructions and "alloc" for register allocations.
+    args : tuple
+        The arguments, register operands are filled in by `Graph.emit`.
+    positions : tuple of ints
+        Positions of the register operands in `args`, None for instructions.
+    roles : str
+        What the primitive does to each register operand, see `_roles`.
+    reads : list of int
+        The value read by each operand, None if the operand is only written.
+    writes : list of int
+        The value defined by each operand, None if the operand is only read.
+    meta : tuple
+        Operation, operand types and operand shapes of instructions.
+    """
+
+    def __init__(self,
+                 name: str,
+                 args: tuple,
+                 positions: Tuple[int],
+                 roles: str,
+                 reads: List[int],
+                 writes: List[int],
+                 meta: tuple = None) -> None:
+        self.name = name
+        self.args = args
+        self.positions = positions
+        self.roles = roles
+        self.reads = reads
+        self.writes = writes
+        self.meta = meta
+
+    @property
+    def op(self) -> Union[str, None]:
+        return self.meta[0] if self.meta is not None else None
+
+
+class Graph:
+    """A recorded program in static single assignment form.
+
+    Parameters
+    ----------
+    vm : BaseVM
+        The VM the program runs on.
+    steps : list
+        The steps recorded by `ProgramRecorder`.
+    allocated : dict
+        Allocation kind of every register allocated while recording.
+    inputs : list of int
+        Registers of the inputs, their values stay in place.
+    outputs : list of int
+        Registers of the outputs, their final values stay in place.
+    external : list of int
+        Registers of arrays captured by the program, their values stay in place.
+    """
+
+    def __init__(self, vm: BaseVM, steps: list, allocated: Dict[int, tuple], inputs: List[int], outputs: List[int],
+                 external: List[int]) -> None:
+        self.vm = vm
+        self.values: List[Value] = []
+        self.nodes: List[Node] = []
+        pinned = set(inputs) | {addr for addr in external if addr not in allocated}
+        current = {}
+        for name, args, positions, meta in steps:
+            if name == "alloc":
+                value = self.new_value(meta)
+                current[args[0]] = value
+                self.nodes.append(Node(name, args, positions, "w", [None], [value]))
+                continue
+            if name == "exec_code":
+                addrs, roles = args[1], _roles(meta[0], len(args[1]))
+            else:
+                addrs = [args[i] for i in positions]
+                roles = "x" * len(positions) if name in _LOCAL_SETTERS else _CALL_ROLES.get(name, "w" * len(positions))
+            reads, writes = [], []
+            for addr, role in zip(addrs, roles):
+                read = write = None
+                if role in "rx":
+                    read = current.get(addr)
+                    if read is None:
+                        read = self.new_value(None, addr)
+                        current[addr] = read
+                if role in "wx":
+                    write = self.new_value(allocated.get(addr), addr if addr in pinned else None)
+                reads.append(read)
+                writes.append(write)
+            for addr, write in zip(addrs, writes):
+                if write is not None:
+                    current[addr] = write
+            self.nodes.append(Node(name, args, positions, roles, reads, writes, meta))
+        # the final values of the outputs and of the registers of captured arrays stay where they are
+        self.live_out = set()
+        for addr in (*inputs, *outputs, *external):
+            if addr in current:
+                self.live_out.add(current[addr])
+                if addr in outputs or addr in external:
+                    self.values[current[addr]].register = addr
+        self.__tie_in_place()
+
+    def __tie_in_place(self):
+        """Values read and written in place share a register, so pins spread along the chain."""
+        for nodes in (self.nodes, reversed(self.nodes)):
+            for node in nodes:
+                for role, read, write in zip(node.roles, node.reads, node.writes):
+                    if role != "x":
+                        continue
+                    if self.values[write].register is None:
+                        self.values[write].register = self.values[read].register
+                    elif self.values[read].register is None:
+                        self.values[read].register = self.values[write].register
+
+    def new_value(self, kind: tuple, register: int = None) -> int:
+        self.values.append(Value(kind, register))
+        return len(self.values) - 1
+
+    def new_instruction(self, op: str, types: Tuple[str], shapes: Tuple[Tuple[int]], reads: List[int],
+                        writes: List[int]) -> Node:
+        roles = _roles(op, len(types))
+        return Node("exec_code", (self.vm.instruction(op, types), [None] * len(types)), None, roles, reads, writes,
+                    (op, tuple(types), tuple(shapes)))
+
+    def new_constant(self, data: Union[float, int, np.ndarray], data_type: str) -> Tuple[Node, int]:
+        """A node setting a public constant of `data_type` ("cd", "ci" or "cdm"), and the value it defines."""
+        value = self.new_value(_ALLOCATION_KINDS[data_type])
+        if data_type == "cd":
+            node = Node("set_public_double", (float(data), None), (1,), "w", [None], [value])
+        elif data_type == "ci":
+            node = Node("set_public_index", (int(data), None), (1,), "w", [None], [value])
+        else:
+            data = np.array(np.broadcast_to(data,
+                                            np.shape(data) if np.ndim(data) == 2 else (1, np.size(data))),
+                            dtype=np.float64)
+            node = Node("set_public_double_matrix", (data, None), (1,), "w", [None], [value])
+        return node, value
+
+    def constant(self, value: int, producers: Dict[int, Node]) -> Union[Tuple[object, str], None]:
+        """The data and type of a value set by a public setter of numbers, None otherwise."""
+        node = producers.get(value)
+        if node is None or _PUBLIC_SETTERS.get(node.name) not in ("cdm", "cd", "ci"):
+            return None
+        return node.args[0], _PUBLIC_SETTERS[node.name]
+
+    def producers(self) -> Dict[int, Node]:
+        return {write: node for node in self.nodes for write in node.writes if write is not None}
+
+    def uses(self) -> Dict[int, List[Node]]:
+        ret = {}
+        for node in self.nodes:
+            for read in node.reads:
+                if read is not None:
+                    ret.setdefault(read, []).append(node)
+        return ret
+
+    def clobbered(self) -> set:
+        """Values overwritten in place, they cannot stand in for other values."""
+        return {read for node in self.nodes for role, read in zip(node.roles, node.reads) if role == "x"}
+
+    def stable(self, value: int) -> bool:
+        """Whether the value can be read later than it is now, no write overwrites it in the meantime."""
+        register = self.values[value].register
+        if register is None:
+            return value not in self.clobbered()
+        return sum(1 for other in self.values if other.register == register) == 1
+
+    def fixed(self, value: int) -> bool:
+        """Whether the value must stay as it is: it lives in a given register or is used after the program."""
+        return value in self.live_out or self.values[value].register is not None
+
+    def replace(self, old: int, new: int):
+        """Read `new` wherever `old` is read."""
+        for node in self.nodes:
+            node.reads = [new if read == old else read for read in node.reads]
+
+    def instructions(self) -> List[Node]:
+        return [node for node in self.nodes if node.name == "exec_code"]
+
+    def cost(self) -> Cost:
+        """Estimated cost of the instructions, see `cost_model.estimate`."""
+        ret = Cost()
+        for node in self.instructions():
+            ret = ret + estimate(*node.meta)
+        return ret
+
+    def emit(self, free: Dict[tuple, List[int]]) -> Tuple[list, List[int]]:
+        """Assign registers and return the steps of the program and the registers it owns.
+
+        Values live in the registers they are pinned to, others take a register of their kind from `free`
+        once the value is defined, and give it back after its last read. More registers are allocated when
+        `free` runs out, unused registers of `free` are deleted.
+        """
+        free = {kind: list(addrs) for kind, addrs in free.items()}
+        owned = {addr for addrs in free.values() for addr in addrs}
+        last_use = {}
+        for i, node in enumerate(self.nodes):
+            for read in node.reads:
+                if read is not None:
+                    last_use[read] = i
+        assigned, kinds, used = {}, {}, set()
+        steps = []
+        for i, node in enumerate(self.nodes):
+            if node.name == "alloc" and node.writes[0] not in last_use and self.values[node.writes[0]].register is None:
+                continue
+            for role, read, write in zip(node.roles, node.reads, node.writes):
+                if write is None:
+                    continue
+                value = self.values[write]
+                if value.register is not None:
+                    assigned[write] = value.register
+                elif role == "x":
+                    assigned[write] = assigned[read]
+                else:
+                    kind = value.kind
+                    if free.get(kind):
+                        addr = free[kind].pop()
+                    else:
+                        addr = getattr(self.vm, kind[0])(*kind[1])
+                        owned.add(addr)
+                    assigned[write] = addr
+                    kinds[addr] = kind
+                    used.add(addr)
+            for read in node.reads:
+                if read is not None and read not in assigned:
+                    # a register read before the program writes it
+                    assigned[read] = self.values[read].register
+            addrs = [assigned[write if write is not None else read] for read, write in zip(node.reads, node.writes)]
+            if node.name == "exec_code":
+                steps.append((node.name, (node.args[0], addrs), None, node.meta))
+            elif node.name != "alloc":
+                args = list(node.args)
+                for position, addr in zip(node.positions, addrs):
+                    args[position] = addr
+                steps.append((node.name, tuple(args), node.positions, None))
+            released = {read for read in node.reads if read is not None and last_use[read] == i}
+            released |= {write for write in node.writes if write is not None and write not in last_use}
+            released -= {read for role, read in zip(node.roles, node.reads) if role == "x"}
+            for value in released:
+                addr = assigned[value]
+                if self.values[value].register is None and value not in self.live_out and addr in kinds:
+                    free.setdefault(kinds[addr], []).append(addr)
+        for addr in owned - used:
+            self.vm.delete_data(addr)
+        return steps, sorted(owned & used)
+
+
+def _merge_scales(graph: Graph, node: Node, producers: Dict[int, Node], uses: Dict[int, List[Node]],
+                  removed: set) -> int:
+    """Merge `scale(scale(x, a), b)` into `scale(x, a * b)`, the products wrap around the ring alike."""
+    source = node.reads[0]
+    previous = producers.get(source)
+    if (previous is None or id(previous) in removed or previous.name != node.name or graph.fixed(source) or
+            len(uses.get(source, [])) != 1 or not graph.stable(previous.reads[0])):
+        return 0
+    factor = previous.args[0].astype(np.int64, copy=False) * node.args[0].astype(np.int64, copy=False)
+    node.args = (factor, *node.args[1:])
+    node.reads = [previous.reads[0], None]
+    uses.setdefault(previous.reads[0], []).append(node)
+    removed.add(id(previous))
+    return 1
+
+
+def fold_constants(graph: Graph) -> int:
+    """Compute instructions on public constants in plaintext, and merge chains of public operands.
+
+    `x * a * b` becomes `x * (a * b)`, likewise for division, addition, subtraction and the local scaling
+    by integers, when `x * a` is used only once. Returns the number of rewrites.
+    """
+    rewrites = 0
+    producers = graph.producers()
+    uses = graph.uses()
+    removed = set()
+    ops = {"add": np.add, "sub": np.subtract, "mul": np.multiply, "div": np.divide, "mat_mul": np.matmul}
+    # chains combine the two constants with the operation below
+    merge = {"add": np.add, "sub": np.add, "mul": np.multiply, "div": np.multiply}
+    for index, node in enumerate(graph.nodes):
+        if node.name == "scale_airth_share_matrix":
+            rewrites += _merge_scales(graph, node, producers, uses, removed)
+            continue
+        if node.name != "exec_code" or node.op not in ops:
+            continue
+        op, types, shapes = node.meta
+        constants = [graph.constant(read, producers) for read in node.reads[:-1]]
+        if all(constant is not None for constant in constants) and types[-1] in ("cdm", "cd"):
+            data = ops[op](*[np.asarray(constant[0], dtype=np.float64) for constant in constants])
+            replacement, _ = graph.new_constant(data, types[-1])
+            replacement.writes = [node.writes[-1]]
+            graph.nodes[index] = replacement
+            producers[node.writes[-1]] = replacement
+            rewrites += 1
+            continue
+        if op not in merge or types[0] not in ("am", "bm") or constants[1] is None:
+            continue
+        source = node.reads[0]
+        previous = producers.get(source)
+        if (previous is None or id(previous) in removed or previous.meta is None or previous.op != op or
+                previous.meta[1][0] != types[0] or graph.fixed(source) or len(uses.get(source, [])) != 1):
+            continue
+        first = graph.constant(previous.reads[1], producers)
+        if first is None or not graph.stable(previous.reads[0]):
+            continue
+        data_type = "cdm" if "cdm" in (first[1], constants[1][1]) else "cd" if "cd" in (first[1],
+                                                                                        constants[1][1]) else "ci"
+        new_types = (types[0], data_type, types[-1])
+        if new_types not in (previous.meta[1], types):
+            continue
+        data = merge[op](np.asarray(first[0]), np.asarray(constants[1][0]))
+        constant, value = graph.new_constant(data, data_type)
+        shape = np.shape(constant.args[0]) if data_type == "cdm" else ()
+        rewritten = graph.new_instruction(op, new_types, (previous.meta[2][0], shape, shapes[-1]),
+                                          [previous.reads[0], value, None], [None, None, node.writes[-1]])
+        graph.nodes[index] = rewritten
+        graph.nodes.insert(index, constant)
+        producers[value] = constant
+        producers[node.writes[-1]] = rewritten
+        uses.setdefault(previous.reads[0], []).append(rewritten)
+        removed.add(id(previous))
+        rewrites += 1
+    graph.nodes = [node for node in graph.nodes if id(node) not in removed]
+    return rewrites
+
+
+def _cse_key(node: Node) -> Union[tuple, None]:
+    if "x" in node.roles:
+        return None
+    if node.name == "exec_code":
+        return (node.meta[0], node.meta[1], tuple(node.reads))
+    if node.name in _PUBLIC_SETTERS or node.name in _CALL_ROLES and node.name != "send_buffer":
+        positions = set(node.positions)
+        return (node.name, tuple(_freeze(arg) for i, arg in enumerate(node.args) if i not in positions),
+                tuple(node.reads))
+    return None
+
+
+def eliminate_common_subexpressions(graph: Graph) -> int:
+    """Reuse the values of an earlier identical primitive on the same values, e.g. `-arr` computed twice.
+
+    Returns the number of primitives removed.
+    """
+    clobbered = graph.clobbered()
+    seen = {}
+    kept = []
+    rewrites = 0
+    for node in graph.nodes:
+        key = _cse_key(node)
+        if key is not None:
+            writes = [write for write in node.writes if write is not None]
+            previous = seen.get(key)
+            if previous is not None and not any(graph.fixed(write) or write in clobbered for write in writes):
+                for write, earlier in zip(node.writes, previous.writes):
+                    if write is not None:
+                        graph.replace(write, earlier)
+                rewrites += 1
+                continue
+            if all(graph.stable(write) for write in writes):
+                seen[key] = node
+        kept.append(node)
+    graph.nodes = kept
+    return rewrites
+
+
+def eliminate_dead_code(graph: Graph) -> int:
+    """Remove primitives none of whose values are used, e.g. an instruction whose result is discarded.
+
+    Instructions with several results, like argmax_and_max, are kept while any result is used, the
+    registers of the unused ones are given back right after the instruction. Returns the number of
+    primitives removed.
+    """
+    needed = set(graph.live_out)
+    kept = []
+    removed = 0
+    for node in reversed(graph.nodes):
+        writes = [write for write in node.writes if write is not None]
+        removable = (node.name not in ("alloc", "send_buffer") and node.op not in _BARRIERS and
+                     "x" not in node.roles and len(writes) > 0)
+        if removable and not any(write in needed or graph.values[write].register is not None for write in writes):
+            removed += 1
+            continue
+        needed.update(read for read in node.reads if read is not None)
+        kept.append(node)
+    kept.reverse()
+    graph.nodes = kept
+    return removed
+
+
+def _chain_cost(types: Tuple[str], shapes: Tuple[Tuple[int, int]], signatures: set) -> Union[tuple, None]:
+    out_type = "am" if "am" in types else "cdm"
+    if (*types, out_type) not in signatures:
+        return None
+    (rows, _), (_, cols) = shapes
+    cost = estimate("mat_mul", (*types, out_type), (*shapes, (rows, cols)))
+    return cost.rounds, cost.bytes_sent, cost.local_ops
+
+
+def reorder_matrix_chains(graph: Graph) -> int:
+    """Reorder the products of chains like `a @ b @ c` to the order of least estimated cost.
+
+    Costs are compared by rounds, then bytes, then local operations. Only operand type combinations
+    already used by the program are introduced. Returns the number of chains reordered.
+    """
+    signatures = {node.meta[1] for node in graph.instructions() if node.op == "mat_mul"}
+    producers = graph.producers()
+    uses = graph.uses()
+    clobbered = graph.clobbered()
+
+    def eligible(node: Node) -> bool:
+        return node.name == "exec_code" and node.op == "mat_mul" and set(node.meta[1]) <= {"am", "cdm"}
+
+    def inner(value: int) -> bool:
+        node = producers.get(value)
+        users = uses.get(value, [])
+        return (node is not None and eligible(node) and not graph.fixed(value) and value not in clobbered and
+                len(users) == 1 and eligible(users[0]))
+
+    def collect(node: Node, leaves: list, products: list):
+        products.append(node)
+        for position in (0, 1):
+            value = node.reads[position]
+            if inner(value):
+                collect(producers[value], leaves, products)
+            else:
+                leaves.append((value, _matrix_shape(node.meta[2][position]), node.meta[1][position]))
+
+    rewrites = 0
+    for root in [node for node in graph.nodes if eligible(node) and not inner(node.writes[-1])]:
+        leaves, products = [], []
+        collect(root, leaves, products)
+        if len(leaves) < 3 or not all(graph.stable(leaf[0]) for leaf in leaves):
+            continue
+        if any(left[1][1] != right[1][0] for left, right in zip(leaves, leaves[1:])):
+            continue
+        original = (0, 0, 0)
+        for product in products:
+            cost = estimate(*product.meta)
+            original = (original[0] + cost.rounds, original[1] + cost.bytes_sent, original[2] + cost.local_ops)
+
+        # best[i][j] is the cheapest (cost, split, type) of the product of leaves i..j
+        n = len(leaves)
+        best = [[None] * n for _ in range(n)]
+        for i in range(n):
+            best[i][i] = ((0, 0, 0), None, leaves[i][2])
+        for length in range(2, n + 1):
+            for i in range(n - length + 1):
+                j = i + length - 1
+                for k in range(i, j):
+                    left, right = best[i][k], best[k + 1][j]
+                    if left is None or right is None:
+                        continue
+                    step = _chain_cost((left[2], right[2]),
+                                       ((leaves[i][1][0], leaves[k][1][1]), (leaves[k + 1][1][0], leaves[j][1][1])),
+                                       signatures)
+                    if step is None:
+                        continue
+                    cost = tuple(a + b + c for a, b, c in zip(left[0], right[0], step))
+                    if best[i][j] is None or cost < best[i][j][0]:
+                        best[i][j] = (cost, k, "am" if "am" in (left[2], right[2]) else "cdm")
+        if best[0][n - 1] is None or best[0][n - 1][0] >= original:
+            continue
+
+        new_nodes = []
+
+        def build(i: int, j: int, write: int = None) -> Tuple[int, Tuple[int, int]]:
+            if i == j:
+                return leaves[i][0], leaves[i][1]
+            _, k, out_type = best[i][j]
+            left, left_shape = build(i, k)
+            right, right_shape = build(k + 1, j)
+            shape = (left_shape[0], right_shape[1])
+            if write is None:
+                write = graph.new_value(_ALLOCATION_KINDS[out_type])
+            types = (best[i][k][2], best[k + 1][j][2], out_type)
+            new_nodes.append(
+                graph.new_instruction("mat_mul", types, (left_shape, right_shape, shape), [left, right, None],
+                                      [None, None, write]))
+            return write, shape
+
+        build(0, n - 1, root.writes[-1])
+        new_nodes[-1].meta = (*new_nodes[-1].meta[:2], (*new_nodes[-1].meta[2][:2], root.meta[2][2]))
+        position = graph.nodes.index(root)
+        removed = {id(product) for product in products}
+        graph.nodes = [node for node in graph.nodes[:position] if id(node) not in removed
+                      ] + new_nodes + graph.nodes[position + 1:]
+        rewrites += 1
+    return rewrites
+
+
+PASSES: Dict[str, Callable[[Graph], int]] = {
+    "fold": fold_constants,
+    "cse": eliminate_common_subexpressions,
+    "matrix_chain": reorder_matrix_chains,
+    "dce": eliminate_dead_code,
+}
+DEFAULT_PASSES = ("fold", "cse", "matrix_chain", "dce")
+
+
+class PassReport:
+    """What one optimization pass did.
+
+    Attributes
+    ----------
+    name : str
+        The pass.
+    rewrites : int
+        Number of rewrites the pass made.
+    instructions_before, instructions_after : int
+        Number of instructions before and after the pass.
+    cost_before, cost_after : Cost
+        Estimated cost before and after the pass.
+    seconds : float
+        Time spent in the pass.
+    """
+
+    def __init__(self, name: str, rewrites: int, instructions_before: int, instructions_after: int, cost_before: Cost,
+                 cost_after: Cost, seconds: float) -> None:
+        self.name = name
+        self.rewrites = rewrites
+        self.instructions_before = instructions_before
+        self.instructions_after = instructions_after
+        self.cost_before = cost_before
+        self.cost_after = cost_after
+        self.seconds = seconds
+
+    def __repr__(self):
+        return (f"PassReport(name={self.name}, rewrites={self.rewrites}, instructions={self.instructions_before}->"
+                f"{self.instructions_after}, cost={self.cost_before}->{self.cost_after}, seconds={self.seconds:.6f})")
+
+
+def optimize(graph: Graph, passes: Tuple[str] = DEFAULT_PASSES) -> List[PassReport]:
+    """Run `passes` in order on the graph, see `PASSES` for their names."""
+    reports = []
+    for name in passes:
+        if name not in PASSES:
+            raise ValueError(f"unknown pass {name}, expect one of {list(PASSES)}")
+        instructions, cost = len(graph.instructions()), graph.cost()
+        start = time.perf_counter()
+        rewrites = PASSES[name](graph)
+        seconds = time.perf_counter() - start
+        reports.append(PassReport(name, rewrites, instructions, len(graph.instructions()), cost, graph.cost(), seconds))
+    return reports
@@ -0,0 +1,188 @@
+# Copyright 2023 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+import time
+from typing import TYPE_CHECKING, Callable, Dict, List, Tuple
+
+from .memory import call_site
+from .cost_model import estimate
+
+if TYPE_CHECKING:
+    from .vm import VM, PETAceBuffer
+
+
+class InstructionRecord:
+    """What one executed instruction did.
+
+    Attributes
+    ----------
+    op : str
+        The operation.
+    types : tuple of str
+        Data types of the operands, e.g. ("am", "cdm", "am").
+    shapes : tuple of tuples
+        Shapes of the operands.
+    start_time : float
+        When the instruction started, in seconds since the epoch.
+    wall_time : float
+        Elapsed seconds.
+    bytes_sent : int
+        Bytes sent to the other party.
+    bytes_received : int
+        Bytes received from the other party.
+    rounds : int
+        Communication rounds estimated by `cost_model.estimate`.
+    call_site : str
+        The line of the program that executed the instruction, only recorded when the VM tracks call sites.
+    cpu_time : float
+        CPU seconds used by the thread running the instruction and its OpenMP threads, see `VM.thread_cpu_time`,
+        so VMs running in parallel do not count each other.
+    threads : int
+        Number of threads set by `VM.set_num_threads`, which only the packing loops of bool shares use.
+    """
+
+    def __init__(self,
+                 op: str,
+                 types: Tuple[str],
+                 shapes: Tuple[Tuple[int]],
+                 start_time: float,
+                 wall_time: float,
+                 bytes_sent: int,
+                 bytes_received: int,
+                 rounds: int,
+                 call_site: str = None,
+                 cpu_time: float = 0.0,
+                 threads: int = 1) -> None:
+        self.op = op
+        self.types = types
+        self.shapes = shapes
+        self.start_time = start_time
+        self.wall_time = wall_time
+        self.bytes_sent = bytes_sent
+        self.bytes_received = bytes_received
+        self.rounds = rounds
+        self.call_site = call_site
+        self.cpu_time = cpu_time
+        self.threads = threads
+
+    @property
+    def parallel_efficiency(self) -> float:
+        """CPU time over the CPU time the threads could have used, 1.0 when every thread computed all along.
+
+        Time spent waiting for the other party lowers it as much as threads left idle.
+        """
+        return _efficiency(self.cpu_time, self.wall_time, self.threads)
+
+    def __repr__(self):
+        return (f"InstructionRecord(op={self.op}, types={self.types}, shapes={self.shapes}, "
+                f"wall_time={self.wall_time:.6f}, cpu_time={self.cpu_time:.6f}, threads={self.threads}, "
+                f"bytes_sent={self.bytes_sent}, bytes_received={self.bytes_received}, rounds={self.rounds}, "
+                f"call_site={self.call_site})")
+
+
+def _efficiency(cpu_time: float, wall_time: float, threads: int) -> float:
+    if wall_time <= 0.0:
+        return 0.0
+    return cpu_time / (wall_time * threads)
+
+
+class ProfileReport(dict):
+    """Aggregated instruction statistics, a dict from op name to a dict with "count", "wall_time",
+    "cpu_time", "thread_time", "bytes_sent", "bytes_received" and "rounds".
+
+    "thread_time" sums the wall time of every instruction times its number of threads.
+    """
+
+    def parallel_efficiency(self, op: str) -> float:
+        """Total CPU time of `op` over its total thread time, see `InstructionRecord.parallel_efficiency`."""
+        stats = self[op]
+        return _efficiency(stats["cpu_time"], stats["thread_time"], 1)
+
+    def table(self) -> str:
+        """Format the report as a text table sorted by wall time."""
+        lines = [
+            f"{'op':<32}{'count':>10}{'wall_time(s)':>16}{'cpu_time(s)':>16}{'efficiency':>12}{'sent(B)':>16}"
+            f"{'received(B)':>16}{'rounds':>10}"
+        ]
+        for op, stats in sorted(self.items(), key=lambda item: item[1]["wall_time"], reverse=True):
+            lines.append(f"{op:<32}{stats['count']:>10}{stats['wall_time']:>16.6f}{stats['cpu_time']:>16.6f}"
+                         f"{self.parallel_efficiency(op):>12.2f}{stats['bytes_sent']:>16}"
+                         f"{stats['bytes_received']:>16}{stats['rounds']:>10}")
+        return "\n".join(lines)
+
+    def __str__(self):
+        return self.table()
+
+
+class Profiler:
+    """Measure the instructions executed by a VM.
+
+    Every record is passed to the hooks, and aggregated per op when aggregation is enabled.
+    The VM only calls the profiler while it has hooks or aggregates, so it costs nothing otherwise.
+    """
+
+    def __init__(self, vm: VM) -> None:
+        self.vm = vm
+        self.hooks: List[Callable[[InstructionRecord], None]] = []
+        self.aggregate = False
+        self.report = ProfileReport()
+
+    @property
+    def active(self) -> bool:
+        return self.aggregate or len(self.hooks) > 0
+
+    def run(self, operation: str, objs: List[PETAceBuffer], func: Callable[[], None]) -> None:
+        """Run `func` which executes `operation` on `objs`, and record it."""
+        net = self.vm.net
+        sent, received = net.get_bytes_sent(), net.get_bytes_received()
+        threads = self.vm.num_threads()
+        start_time = time.time()
+        start, cpu_start = time.perf_counter(), self.vm.thread_cpu_time()
+        func()
+        wall_time = time.perf_counter() - start
+        cpu_time = self.vm.thread_cpu_time() - cpu_start
+        sent = net.get_bytes_sent() - sent
+        received = net.get_bytes_received() - received
+        site = call_site() if self.vm._track_call_sites else None
+        types = tuple(obj.data_type for obj in objs)
+        shapes = tuple(obj.shape for obj in objs)
+        record = InstructionRecord(operation, types, shapes, start_time, wall_time, sent, received,
+                                   estimate(operation, types, shapes).rounds, site, cpu_time, threads)
+        with self.vm._lock:
+            if self.aggregate:
+                self.add(record)
+            for hook in self.hooks:
+                hook(record)
+
+    def add(self, record: InstructionRecord) -> None:
+        stats = self.report.get(record.op)
+        if stats is None:
+            stats = {
+                "count": 0,
+                "wall_time": 0.0,
+                "cpu_time": 0.0,
+                "thread_time": 0.0,
+                "bytes_sent": 0,
+                "bytes_received": 0,
+                "rounds": 0
+            }
+            self.report[record.op] = stats
+        stats["count"] += 1
+        stats["wall_time"] += record.wall_time
+        stats["cpu_time"] += record.cpu_time
+        stats["thread_time"] += record.wall_time * record.threads
+        stats["bytes_sent"] += record.bytes_sent
+        stats["bytes_received"] += record.bytes_received
+        stats["rounds"] += record.rounds
@@ -0,0 +1,326 @@
+# Copyright 2023 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Record the register primitives run by a VM and replay them.
+
+A `ProgramRecorder` wraps the primitives of a VM while a function runs. Registers deleted during the
+recording are kept and handed to later allocations of the same kind, so the recorded `Program` owns a
+fixed set of pre-allocated registers. Replaying only calls the primitives again, consecutive instructions
+in a single `exec_program` call, with the registers of the inputs and outputs substituted.
+"""
+
+from __future__ import annotations
+import functools
+from typing import TYPE_CHECKING, Dict, List, Tuple, Union
+
+import numpy as np
+
+from .optimizer import Graph, optimize
+
+if TYPE_CHECKING:
+    from .vm import BaseVM, PETAceBuffer
+
+_ALLOCATIONS = (
+    "new_airth_matrix",
+    "new_bool_matrix",
+    "new_public_double_matrix",
+    "new_public_double",
+    "new_public_index",
+    "new_public_bool_matrix",
+    "new_private_double_matrix",
+    "new_private_bool_matrix",
+)
+# positions of the register arguments of the primitives that write registers
+_WRITES = {
+    "set_private_double_matrix": (1,),
+    "set_private_bool_matrix": (1,),
+    "set_private_bool_matrix_from_bits": (3,),
+    "set_public_double_matrix": (1,),
+    "set_public_double": (1,),
+    "set_public_index": (1,),
+    "set_public_bool_matrix": (1,),
+    "set_public_bool_matrix_from_bits": (3,),
+    "set_airth_share_matrix": (1,),
+    "set_boolean_share_matrix": (1,),
+    "set_boolean_share_matrix_packed": (3,),
+    "airth_share_matrix_block": (0, 1),
+    "bool_share_matrix_block": (0, 1),
+    "airth_share_vstack": (0, 1, 2),
+    "airth_share_hstack": (0, 1, 2),
+    "bool_share_vstack": (0, 1, 2),
+    "bool_share_hstack": (0, 1, 2),
+    "scale_airth_share_matrix": (1, 2),
+    "set_airth_share_zeros": (2,),
+    "send_buffer": (),
+}
+# writes of data of one party, a replay would reuse the data of the recording instead of the new one, and the
+# other party, which does not write it, may replay its recording while this one cannot
+_INPUTS = (
+    "set_private_double_matrix",
+    "set_private_bool_matrix",
+    "set_private_bool_matrix_from_bits",
+    "set_airth_share_matrix",
+    "set_boolean_share_matrix",
+    "set_boolean_share_matrix_packed",
+    "send_buffer",
+)
+# primitives returning data, the program would depend on values it cannot see on replay
+_READS = (
+    "get_private_double_matrix",
+    "get_private_bool_matrix",
+    "take_private_double_matrix",
+    "take_private_bool_matrix",
+    "get_airth_share_matrix",
+    "get_boolean_share_matrix",
+    "get_boolean_share_matrix_packed",
+    "recv_buffer",
+)
+
+
+class ProgramRecorder:
+    """Record the primitives a VM runs inside a `with` block.
+
+    The recorded function still runs for real. Call `finish` after the block to get the `Program`,
+    it returns None if the function read register data or wrote input data, which a replay could not reproduce.
+
+    Parameters
+    ----------
+    vm : BaseVM
+        The VM to record.
+    inputs : list of int
+        Register addresses of the inputs, substituted on every replay.
+    """
+
+    def __init__(self, vm: BaseVM, inputs: List[int]) -> None:
+        self.vm = vm
+        self.inputs = list(inputs)
+        self.unsupported = None
+        self.__steps = []
+        self.__allocated: Dict[int, Tuple[str, tuple]] = {}
+        self.__free: Dict[Tuple[str, tuple], List[int]] = {}
+        self.__primitives = {}
+        self.__operation = None
+        # primitives running inside a recorded primitive are part of it
+        self.__depth = 0
+
+    def __enter__(self) -> ProgramRecorder:
+        for name in (*_ALLOCATIONS, *_WRITES, *_READS, "exec_code", "delete_data", "execute_code"):
+            self.__primitives[name] = getattr(self.vm, name)
+        for name in _ALLOCATIONS:
+            setattr(self.vm, name, functools.partial(self.__allocate, name))
+        for name in _WRITES:
+            setattr(self.vm, name, functools.partial(self.__write, name))
+        for name in _READS:
+            setattr(self.vm, name, functools.partial(self.__read, name))
+        self.vm.execute_code = self.__execute
+        self.vm.exec_code = self.__exec
+        self.vm.delete_data = self.__delete
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        for name in (*_ALLOCATIONS, *_WRITES, *_READS, "exec_code", "delete_data", "execute_code"):
+            delattr(self.vm, name)
+        if exc_type is not None:
+            self.release()
+        return False
+
+    def __allocate(self, name: str, *args) -> int:
+        key = (name, args)
+        free = self.__free.get(key)
+        if free:
+            addr = free.pop()
+        else:
+            addr = self.__primitives[name](*args)
+            self.__allocated[addr] = key
+        self.__steps.append(("alloc", (addr,), (0,), key))
+        return addr
+
+    def __delete(self, addr: int):
+        key = self.__allocated.get(addr)
+        if key is None:
+            self.unsupported = "deletes a register allocated before the call"
+            self.__primitives["delete_data"](addr)
+            return
+        self.__free.setdefault(key, []).append(addr)
+
+    def __write(self, name: str, *args):
+        self.__depth += 1
+        try:
+            self.__primitives[name](*args)
+        finally:
+            self.__depth -= 1
+        if self.__depth > 0:
+            return
+        if name in _INPUTS:
+            self.unsupported = f"writes input data with {name}"
+        # the caller may reuse its arrays, keep a copy of the data
+        args = tuple(np.array(arg) if isinstance(arg, np.ndarray) else arg for arg in args)
+        if name == "send_buffer":
+            args = (bytearray(args[0]),)
+        self.__steps.append((name, args, _WRITES[name], None))
+
+    def __read(self, name: str, *args):
+        if self.__depth == 0:
+            self.unsupported = f"reads register data with {name}"
+        return self.__primitives[name](*args)
+
+    def __execute(self, operation: str, objs: List[PETAceBuffer]):
+        # operation, operand types and shapes of the instruction about to be run, kept for the optimizer
+        self.__operation = (operation, tuple(obj.data_type for obj in objs), tuple(obj.shape for obj in objs))
+        self.__primitives["execute_code"](operation, objs)
+
+    def __exec(self, inst, addrs: List[int]):
+        self.__primitives["exec_code"](inst, addrs)
+        self.__steps.append(("exec_code", (inst, list(addrs)), None, self.__operation))
+
+    def is_allocated(self, addr: int) -> bool:
+        """Whether the register was allocated while recording."""
+        return addr in self.__allocated
+
+    def release(self):
+        """Delete the registers kept for reuse, used when no program is built."""
+        for free in self.__free.values():
+            for addr in free:
+                self.vm.delete_data(addr)
+        self.__free.clear()
+
+    def finish(self, outputs: List[int], passes: Tuple[str] = ()) -> Union[Program, None]:
+        """Build the program, `outputs` are the addresses of the output registers allocated while recording.
+
+        `passes` names the optimization passes to run on the recording, see `optimizer.PASSES`.
+        Returns None and releases the kept registers if the recorded function cannot be replayed.
+        """
+        live = {buffer.reg_addr: buffer for buffer in self.vm.live_buffers()}
+        dynamic = set(self.inputs) | set(outputs)
+        external = {}
+        for name, args, positions, _ in self.__steps:
+            if name == "alloc":
+                continue
+            addrs = args[1] if name == "exec_code" else [args[i] for i in positions]
+            for addr in addrs:
+                if addr in dynamic or addr in self.__allocated:
+                    continue
+                if addr not in live:
+                    self.unsupported = f"uses register {addr} that is not live"
+                else:
+                    external[addr] = live[addr]
+        kept = {addr for free in self.__free.values() for addr in free}
+        for addr in self.__allocated:
+            # registers of arrays the function kept elsewhere, the program writes them on every replay
+            if addr in live and addr not in dynamic:
+                external[addr] = live[addr]
+            elif addr not in live and addr not in kept:
+                self.unsupported = f"frees register {addr} after returning"
+        if self.unsupported is not None:
+            self.release()
+            return None
+        steps, registers, report = self.__steps, list(kept), []
+        if passes:
+            graph = Graph(self.vm, self.__steps, self.__allocated, self.inputs, outputs, list(external))
+            report = optimize(graph, passes)
+            steps, registers = graph.emit(self.__free)
+        self.__free.clear()
+        program = Program(self.vm, steps, self.inputs, [(addr, self.__allocated[addr]) for addr in outputs], external,
+                          registers)
+        program.report = report
+        return program
+
+
+class Program:
+    """A recorded sequence of primitives that can be replayed on new inputs.
+
+    Attributes
+    ----------
+    registers : list of int
+        The pre-allocated registers owned by the program, deleted by `free`.
+    instruction_count : int
+        Number of instructions in the program.
+    report : list of PassReport
+        What each optimization pass did to the recording, empty if none ran.
+    """
+
+    def __init__(self, vm: BaseVM, steps: list, inputs: List[int], outputs: List[Tuple[int, Tuple[str, tuple]]],
+                 external: Dict[int, PETAceBuffer], registers: List[int]) -> None:
+        self.vm = vm
+        self.registers = registers
+        self.instruction_count = 0
+        self.report = []
+        self.__external = external
+        self.__outputs = [key for _, key in outputs]
+        slots = {addr: i for i, addr in enumerate(inputs)}
+        for i, (addr, _) in enumerate(outputs):
+            slots[addr] = len(inputs) + i
+        self.__calls = []
+        instructions, addresses, patches = [], [], []
+        for name, args, positions, _ in steps:
+            if name == "alloc":
+                continue
+            if name == "exec_code":
+                inst, addrs = args
+                patches.extend((len(addresses), j, slots[addr]) for j, addr in enumerate(addrs) if addr in slots)
+                instructions.append(inst)
+                addresses.append(addrs)
+                continue
+            if instructions:
+                self.__add_program(instructions, addresses, patches)
+                instructions, addresses, patches = [], [], []
+            patches = [(i, slots[args[i]]) for i in positions if args[i] in slots]
+            self.__calls.append((getattr(vm, name), args, patches, _patch_args))
+            patches = []
+        if instructions:
+            self.__add_program(instructions, addresses, patches)
+
+    def __add_program(self, instructions: list, addresses: list, patches: list):
+        self.__calls.append((self.vm.exec_program, (instructions, addresses), patches, _patch_program))
+        self.instruction_count += len(instructions)
+
+    def valid(self) -> bool:
+        """Whether the registers of the arrays captured by the program, not passed as inputs, are still the same."""
+        return self.registers is not None and all(buffer.reg_addr == addr for addr, buffer in self.__external.items())
+
+    def run(self, inputs: List[int]) -> List[int]:
+        """Replay the program on the input registers, return the newly allocated output registers."""
+        values = list(inputs)
+        values.extend(getattr(self.vm, name)(*args) for name, args in self.__outputs)
+        for func, args, patches, patch in self.__calls:
+            if patches:
+                args = patch(args, patches, values)
+            func(*args)
+        return values[len(inputs):]
+
+    def free(self):
+        """Delete the registers of the program, it cannot run afterwards."""
+        if self.registers is None:
+            return
+        for addr in self.registers:
+            self.vm.delete_data(addr)
+        self.registers = None
+
+
+def _patch_program(args: tuple, patches: list, values: List[int]) -> tuple:
+    instructions, addresses = args
+    addresses = list(addresses)
+    copied = set()
+    for i, j, slot in patches:
+        if i not in copied:
+            addresses[i] = list(addresses[i])
+            copied.add(i)
+        addresses[i][j] = values[slot]
+    return instructions, addresses
+
+
+def _patch_args(args: tuple, patches: list, values: List[int]) -> list:
+    args = list(args)
+    for i, slot in patches:
+        args[i] = values[slot]
+    return args
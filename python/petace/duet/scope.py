@@ -0,0 +1,85 @@
+# Copyright 2023 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+from typing import TYPE_CHECKING, Dict
+
+if TYPE_CHECKING:
+    from .vm import VM, PETAceBuffer
+
+
+class Scope:
+    """Free the buffers allocated inside a `with` block when it exits.
+
+    Every buffer created by the VM while the scope is the innermost active one of the thread that entered
+    it is tracked and deleted on exit, unless it was deleted before or passed to `keep`. Buffers created by
+    tasks submitted to the worker thread of the VM are not tracked. Kept buffers move to the enclosing scope,
+    or stay alive for good at the outermost level. Arrays whose buffers are freed can no longer be used.
+
+    Attributes
+    ----------
+    peak_bytes : int
+        Peak of the estimated register bytes held by the VM while the scope was active.
+    """
+
+    def __init__(self, vm: VM) -> None:
+        self.vm = vm
+        self.peak_bytes = 0
+        self.__buffers: Dict[int, PETAceBuffer] = {}
+        self.__kept = set()
+
+    def __enter__(self) -> Scope:
+        self.peak_bytes = self.vm.live_bytes
+        self.vm._enter_scope(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        parent = self.vm._exit_scope(self)
+        for key, buffer in list(self.__buffers.items()):
+            buffer.scope = None
+            if key in self.__kept:
+                if parent is not None:
+                    parent.add(buffer)
+            else:
+                self.vm.delete_buffer(buffer)
+        self.__buffers.clear()
+        self.__kept.clear()
+        return False
+
+    @property
+    def live_bytes(self) -> int:
+        """Estimated register bytes of the buffers currently tracked by the scope."""
+        return sum(buffer.nbytes for buffer in self.__buffers.values())
+
+    def add(self, buffer: PETAceBuffer) -> None:
+        """Track a buffer."""
+        buffer.scope = self
+        self.__buffers[id(buffer)] = buffer
+
+    def remove(self, buffer: PETAceBuffer) -> None:
+        """Stop tracking a buffer, called when it is deleted."""
+        buffer.scope = None
+        self.__buffers.pop(id(buffer), None)
+        self.__kept.discard(id(buffer))
+
+    def keep(self, *objs):
+        """Exempt arrays or buffers from being freed on exit, return the arguments.
+
+        Objects with a `buffer` attribute such as SecureArray are accepted, as well as buffers.
+        """
+        for obj in objs:
+            buffer = getattr(obj, "buffer", obj)
+            if id(buffer) in self.__buffers:
+                self.__kept.add(id(buffer))
+        return objs[0] if len(objs) == 1 else objs
@@ -0,0 +1,129 @@
+# Copyright 2023 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+import os
+import json
+import time
+import threading
+import contextlib
+from typing import TYPE_CHECKING, Iterator, List, Union
+
+if TYPE_CHECKING:
+    from .vm import PETAceBuffer
+    from .profiler import InstructionRecord
+
+
+class Tracer:
+    """Collect Chrome trace events of one party, see `VM.start_trace`.
+
+    Events use the party id as pid and the thread id as tid. Timestamps are microseconds since the epoch,
+    shifted by `offset` so that the timelines of both parties are aligned.
+
+    Parameters
+    ----------
+    path : str or PathLike
+        Where `write` saves the trace.
+    party : int
+        The party id.
+    offset : float
+        Microseconds added to the local clock to get the clock of party 0.
+
+    Attributes
+    ----------
+    running : int
+        Number of tracers started and not stopped yet in the process, checked before looking up the
+        tracer of a VM so that untraced calls stay cheap.
+    """
+    running = 0
+    _running_lock = threading.Lock()
+
+    @classmethod
+    def _count(cls, delta: int) -> None:
+        with cls._running_lock:
+            cls.running += delta
+
+    def __init__(self, path: Union[str, os.PathLike], party: int, offset: float = 0.0) -> None:
+        self.path = path
+        self.pid = party
+        self.offset = offset
+        self.events = [{"ph": "M", "name": "process_name", "pid": party, "args": {"name": f"party {party}"}}]
+
+    def timestamp(self, seconds: float = None) -> float:
+        """Convert seconds since the epoch, or now, to an aligned trace timestamp."""
+        if seconds is None:
+            seconds = time.time()
+        return seconds * 1e6 + self.offset
+
+    def __event(self, ph: str, name: str, cat: str, ts: float, args: dict = None, **kwargs) -> dict:
+        event = {"ph": ph, "name": name, "cat": cat, "ts": ts, "pid": self.pid, "tid": threading.get_ident()}
+        if args:
+            event["args"] = args
+        event.update(kwargs)
+        self.events.append(event)
+        return event
+
+    def complete(self, name: str, cat: str, start: float, duration: float, args: dict = None) -> None:
+        """Add a span that started at `start` seconds since the epoch and lasted `duration` seconds."""
+        self.__event("X", name, cat, self.timestamp(start), args, dur=duration * 1e6)
+
+    def instant(self, name: str, cat: str, args: dict = None) -> None:
+        """Add an event without duration."""
+        self.__event("i", name, cat, self.timestamp(), args, s="t")
+
+    def counter(self, name: str, values: dict) -> None:
+        """Add a sample of a counter track."""
+        self.__event("C", name, "counter", self.timestamp(), values)
+
+    @contextlib.contextmanager
+    def span(self, name: str, cat: str, args: dict = None) -> Iterator[None]:
+        """Add a span covering the `with` block."""
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.complete(name, cat, start, time.time() - start, args)
+
+    def on_instruction(self, record: InstructionRecord) -> None:
+        """Profile hook adding a span for an executed instruction."""
+        args = {
+            "types": " ".join(record.types),
+            "shapes": str(list(record.shapes)),
+            "bytes_sent": record.bytes_sent,
+            "bytes_received": record.bytes_received,
+        }
+        self.complete(record.op, "instruction", record.start_time, record.wall_time, args)
+
+    def on_allocate(self, buffer: PETAceBuffer, live_bytes: int) -> None:
+        self.instant("allocate", "register", {"type": buffer.data_type, "shape": str(buffer.shape)})
+        self.counter("register bytes", {"bytes": live_bytes})
+
+    def on_delete(self, buffer: PETAceBuffer, live_bytes: int) -> None:
+        self.instant("delete", "register", {"type": buffer.data_type, "shape": str(buffer.shape)})
+        self.counter("register bytes", {"bytes": live_bytes})
+
+    def write(self) -> None:
+        """Save the events as a Chrome trace JSON file."""
+        with open(self.path, "w") as f:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f)
+
+
+def merge_traces(paths: List[Union[str, os.PathLike]], output: Union[str, os.PathLike]) -> None:
+    """Merge the trace files of the parties into one file showing both timelines."""
+    events = []
+    for path in paths:
+        with open(path) as f:
+            events.extend(json.load(f)["traceEvents"])
+    with open(output, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
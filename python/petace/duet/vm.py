@@ -12,16 +12,27 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
+import time
 import struct
 import numbers
+import weakref
+import threading
+import contextvars
 import collections
-from typing import Union, List, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Callable, Union, List, Tuple
 
 import numpy as np
 
 from petace.duet.pyduet import DuetVM, Instruction
+from petace.network import Network
 from ._type import Private, Share, Public, PETAceType
 from .exception import DuetVMError
+from .scope import Scope
+from .memory import LeakCheck, call_site
+from .profiler import Profiler, ProfileReport, InstructionRecord
+from .trace import Tracer
 
 
 class PETAceBuffer:
@@ -36,7 +47,17 @@ class PETAceBuffer:
     data_type : PETAceType
         Data type of created array.
     reg_addr : int
-        Register address of created array.
+        Register address of created array, None once the buffer is deleted.
+    nbytes : int
+        Estimated size of the register, 8 bytes per element.
+    scope : Scope
+        The scope that frees the buffer on exit, if any.
+    call_site : str
+        Where the buffer was allocated, only recorded when the VM tracks call sites.
+    serial : int
+        Allocation number of the buffer in its VM.
+    vm : BaseVM
+        The VM holding the register, None for buffers it does not track.
     """
 
     def __init__(self, shape: Tuple[int], dtype: np.dtype, data_type: PETAceType, reg_addr: int):
@@ -44,10 +65,18 @@ class PETAceBuffer:
         self.dtype = dtype
         self.data_type = data_type
         self.reg_addr = reg_addr
+        self.nbytes = 8 * int(np.prod(shape))
+        self.scope = None
+        self.call_site = None
+        self.serial = None
+        self.vm = None
 
 
-class VM(DuetVM):
-    """Virtual machine for PETAce.
+class BaseVM:
+    """The Python side of the virtual machine.
+
+    It manages buffers, scopes, profiling and tracing on top of the register primitives of `DuetVM`
+    (`new_airth_matrix`, `exec_code`, `get_airth_share_matrix`, `send_buffer`, ...), which subclasses provide.
     """
     _supported_operations = {
         "add",
@@ -81,19 +110,172 @@ class VM(DuetVM):
         "groupby_max",
         "groupby_min",
     }
+    # number of fractional bits of the fixed-point encoding used by arithmetic shares
+    FIXED_POINT_BITS = 16
+    # np.int64 arrays are fixed-point values too, the product of two of them holds 2 * FIXED_POINT_BITS fractional
+    # bits before its truncation, so every value must have abs(x) < 2 ** INT_BITS
+    INT_BITS = 63 - 2 * FIXED_POINT_BITS
+    # ring width of the arithmetic shares exported by `to_share`, see `set_export_ring_bits`
+    export_ring_bits = 64
+
+    def __init__(self):
+        self._instructions = {}
+        self._lock = threading.RLock()
+        self._submit_lock = threading.RLock()
+        self._worker = None
+        self._worker_thread = None
+        self._last_task = None
+        self._profiler = Profiler(self)
+        self._profiling = False
+        self._tracer = None
+        # scopes are entered per thread, a task of the worker thread is not freed by the scope of its submitter
+        self._local = threading.local()
+        self._live = {}
+        self._type_count = collections.Counter()
+        self._type_bytes = collections.Counter()
+        self._type_peak_bytes = collections.Counter()
+        self._track_call_sites = False
+        self.allocation_count = 0
+        self.live_bytes = 0
+        self.peak_bytes = 0
+
+    @property
+    def _scopes(self) -> List[Scope]:
+        """The scopes entered by the calling thread, innermost last."""
+        scopes = getattr(self._local, "scopes", None)
+        if scopes is None:
+            scopes = self._local.scopes = []
+        return scopes
+
+    def __track(self, buffer: PETAceBuffer) -> PETAceBuffer:
+        if self._track_call_sites:
+            buffer.call_site = call_site()
+        scopes = self._scopes
+        with self._lock:
+            buffer.serial = self.allocation_count
+            buffer.vm = self
+            self.allocation_count += 1
+            self._live[id(buffer)] = buffer
+            data_type = buffer.data_type
+            self._type_count[data_type] += 1
+            self._type_bytes[data_type] += buffer.nbytes
+            self._type_peak_bytes[data_type] = max(self._type_peak_bytes[data_type], self._type_bytes[data_type])
+            self.live_bytes += buffer.nbytes
+            self.peak_bytes = max(self.peak_bytes, self.live_bytes)
+            for scope in scopes:
+                scope.peak_bytes = max(scope.peak_bytes, self.live_bytes)
+            if scopes:
+                scopes[-1].add(buffer)
+            if self._tracer is not None:
+                self._tracer.on_allocate(buffer, self.live_bytes)
+        return buffer
+
+    def set_track_call_sites(self, enabled: bool = True):
+        """Record where every buffer is allocated, shown by `memory_stats` and `leak_check`."""
+        self._track_call_sites = enabled
+
+    def live_buffers(self) -> List[PETAceBuffer]:
+        """Buffers allocated by the VM and not deleted yet."""
+        with self._lock:
+            return list(self._live.values())
+
+    def memory_stats(self, top: int = 10) -> dict:
+        """Statistics of the registers held by the VM.
+
+        Sizes are estimated as 8 bytes per element. The returned dict has the keys
+
+        - "live_count", "live_bytes", "peak_bytes": totals over all registers.
+        - "types": for each data type ("am", "bm", "pdm", "cdm", ...) a dict with
+          "count", "bytes" and "peak_bytes".
+        - "top": the `top` largest live buffers, each a dict with "type", "shape", "dtype", "bytes",
+          "reg_addr" and "call_site". Call sites are None unless `set_track_call_sites` is enabled.
+        """
+        with self._lock:
+            largest = sorted(self._live.values(), key=lambda buffer: buffer.nbytes, reverse=True)[:top]
+        return {
+            "live_count":
+                len(self._live),
+            "live_bytes":
+                self.live_bytes,
+            "peak_bytes":
+                self.peak_bytes,
+            "types": {
+                data_type: {
+                    "count": self._type_count[data_type],
+                    "bytes": self._type_bytes[data_type],
+                    "peak_bytes": self._type_peak_bytes[data_type],
+                } for data_type in self._type_peak_bytes
+            },
+            "top": [{
+                "type": buffer.data_type,
+                "shape": buffer.shape,
+                "dtype": buffer.dtype,
+                "bytes": buffer.nbytes,
+                "reg_addr": buffer.reg_addr,
+                "call_site": buffer.call_site,
+            } for buffer in largest],
+        }
+
+    def leak_check(self) -> LeakCheck:
+        """Return a context manager reporting the buffers allocated inside it and never deleted, see `LeakCheck`."""
+        return LeakCheck(self)
+
+    def scope(self) -> Scope:
+        """Return a context manager that frees every buffer allocated inside it on exit, see `Scope`."""
+        return Scope(self)
+
+    def _enter_scope(self, scope: Scope):
+        self._scopes.append(scope)
+
+    def _exit_scope(self, scope: Scope) -> Union[Scope, None]:
+        """Pop `scope` and return the enclosing scope."""
+        if not self._scopes or self._scopes[-1] is not scope:
+            raise DuetVMError("scopes must be exited in the reverse order they are entered")
+        self._scopes.pop()
+        return self._scopes[-1] if self._scopes else None
 
     def __check_type(self, data, _type):
         if not isinstance(data, _type):
             raise DuetVMError(f"Except {_type} but got {type(data)}")
 
     def __check_dtype(self, dtype):
-        if dtype not in (np.float64, np.bool_):
+        if dtype not in (np.float64, np.int64, np.bool_):
             raise DuetVMError(f"unsupported dtype, {dtype}")
 
-    def new_private(self, shape: Tuple[int], dtype: np.dtype, data: np.ndarray, party: int) -> PETAceBuffer:
+    def check_int_range(self, data: np.ndarray):
+        """Raise ValueError if integer data is out of the range of np.int64 arrays, see `INT_BITS`."""
+        if data.size > 0 and max(-int(data.min()), int(data.max())) >= 2**self.INT_BITS:
+            raise ValueError(f"np.int64 arrays only hold values with abs(x) < 2 ** {self.INT_BITS}")
+
+    def set_export_ring_bits(self, ring_bits: int):
+        """Set the default ring width of the arithmetic shares exported by `to_share`.
+
+        This is an export format: exported shares in the 32-bit ring take half the size of 64-bit ones, e.g. in
+        share files, but can only hold values with `abs(x) < 2 ** (31 - FIXED_POINT_BITS)`. Registers, computation
+        and the messages between the parties always use the 64-bit ring, so the network volume does not change.
+        """
+        if ring_bits not in (32, 64):
+            raise DuetVMError(f"ring_bits must be 32 or 64, got {ring_bits}")
+        self.export_ring_bits = ring_bits
+
+    def new_private(self,
+                    shape: Tuple[int],
+                    dtype: np.dtype,
+                    data: np.ndarray,
+                    party: int,
+                    packed: bool = False) -> PETAceBuffer:
+        """Create a private buffer of `party`.
+
+        If `packed` is True, `data` is a bool matrix of `shape` packed by `np.packbits` in row-major order.
+        """
         self.__check_dtype(dtype)
+        if packed and dtype != np.bool_:
+            raise DuetVMError(f"packed data only support np.bool_, got {dtype}")
 
-        if dtype == np.float64:
+        # int64 arrays are stored the same way as float64 ones, holding integral values
+        if dtype == np.int64 and data is not None:
+            self.check_int_range(data)
+        if dtype in (np.float64, np.int64):
             reg_addr = self.new_private_double_matrix(party)
             data_type = Private.DOUBLE
         elif dtype == np.bool_:
@@ -101,14 +283,37 @@ class VM(DuetVM):
             data_type = Private.BOOL
 
         if data is not None:
-            if dtype == np.float64:
-                self.set_private_double_matrix(data, reg_addr)
+            if packed:
+                self.set_private_bool_matrix_from_bits(data, *self.matrix_shape(shape), reg_addr)
+            elif dtype in (np.float64, np.int64):
+                self.set_private_double_matrix(data.astype(np.float64, copy=False), reg_addr)
             elif dtype == np.bool_:
                 self.set_private_bool_matrix(data, reg_addr)
-        return PETAceBuffer(shape, dtype, data_type, reg_addr)
+        return self.__track(PETAceBuffer(shape, dtype, data_type, reg_addr))
 
-    def new_share(self, shape: Tuple[int], dtype: np.dtype, share: np.ndarray = None) -> PETAceBuffer:
+    def new_share(self,
+                  shape: Tuple[int],
+                  dtype: np.dtype,
+                  share: np.ndarray = None,
+                  packed: bool = False) -> PETAceBuffer:
+        """Create a share buffer.
+
+        If `packed` is True, `share` is a np.uint64 array of a bool share holding 64 elements per word,
+        element k of the flattened array is bit k % 64 of word k // 64. The register is unpacked, it holds one
+        int64 per element like any bool share, only the transfer is packed.
+        """
         self.__check_dtype(dtype)
+        if packed:
+            if dtype != np.bool_:
+                raise DuetVMError(f"packed share only support np.bool_, got {dtype}")
+            reg_addr = self.new_bool_matrix()
+            if share is not None:
+                self.set_boolean_share_matrix_packed(share.reshape(-1), *self.matrix_shape(shape), reg_addr)
+            return self.__track(PETAceBuffer(shape, dtype, Share.BOOL, reg_addr))
+        if share is not None and share.dtype == np.int32:
+            if dtype == np.bool_:
+                raise DuetVMError("32-bit ring share only support arithmetic dtypes")
+            return self.__lift_share(shape, dtype, share)
         if share is not None:
             if share.ndim == 0:
                 share = np.reshape(share, (1, 1))
@@ -117,7 +322,7 @@ class VM(DuetVM):
             elif share.ndim > 2:
                 raise ValueError(f"Only support 0d, 1d or 2d array, got {share.ndim} dimension")
 
-        if dtype == np.float64:
+        if dtype in (np.float64, np.int64):
             reg_addr = self.new_airth_matrix()
             data_type = Share.DOUBLE
             if share is not None:
@@ -128,7 +333,33 @@ class VM(DuetVM):
             if share is not None:
                 self.set_boolean_share_matrix(share, reg_addr)
 
-        return PETAceBuffer(shape, dtype, data_type, reg_addr)
+        return self.__track(PETAceBuffer(shape, dtype, data_type, reg_addr))
+
+    def __lift_share(self, shape: Tuple[int], dtype: np.dtype, share: np.ndarray) -> PETAceBuffer:
+        """Convert a share in the 32-bit ring to a share buffer in the 64-bit ring.
+
+        Party 0 offsets its share by 2 ** 31 so the secret becomes non-negative, then both shares are read
+        as unsigned and added in the 64-bit ring. One secure comparison tells whether the sum wrapped
+        around 2 ** 32, and the offset and the wrap are removed accordingly.
+        """
+        low = share.astype(np.int64) & 0xFFFFFFFF
+        if self.party_id() == 0:
+            low = (low + (1 << 31)) & 0xFFFFFFFF
+        total = self.new_share(shape, dtype, low)
+        scale = float(1 << self.FIXED_POINT_BITS)
+        bound = self.new_public(np.full(shape, (1 << 32) / scale))
+        no_wrap = self.new_share(shape, np.bool_)
+        self.execute_code("lt", [total, bound, no_wrap])
+        offset = self.new_public(np.full(shape, (1 << 31) / scale))
+        unwrapped = self.new_share(shape, dtype)
+        self.execute_code("sub", [total, offset, unwrapped])
+        wrapped = self.new_share(shape, dtype)
+        self.execute_code("sub", [unwrapped, bound, wrapped])
+        ret = self.new_share(shape, dtype)
+        self.execute_code("multiplexer", [no_wrap, wrapped, unwrapped, ret])
+        for buffer in (total, bound, no_wrap, offset, unwrapped, wrapped):
+            self.delete_buffer(buffer)
+        return ret
 
     def new_public(self, data: Union[numbers.Number, np.ndarray]) -> PETAceBuffer:
         self.__check_type(data, (numbers.Number, np.ndarray))
@@ -152,114 +383,383 @@ class VM(DuetVM):
             shape = data.shape
             if data.ndim < 2:
                 data = np.reshape(data, (1, -1))
-            if dtype == np.float64:
+            if dtype in (np.float64, np.int64):
                 reg_addr = self.new_public_double_matrix()
                 data_type = Public.DOUBLE
-                self.set_public_double_matrix(data, reg_addr)
+                self.set_public_double_matrix(data.astype(np.float64, copy=False), reg_addr)
             elif dtype == np.bool_:
                 reg_addr = self.new_public_bool_matrix()
                 data_type = Public.BOOL
                 self.set_public_bool_matrix(data, reg_addr)
 
-        return PETAceBuffer(shape, dtype, data_type, reg_addr)
+        return self.__track(PETAceBuffer(shape, dtype, data_type, reg_addr))
+
+    def new_public_from_bits(self, shape: Tuple[int], bits: np.ndarray) -> PETAceBuffer:
+        """Create a public bool matrix of `shape` from the `np.packbits` output of its data."""
+        self.__check_type(bits, np.ndarray)
+        reg_addr = self.new_public_bool_matrix()
+        self.set_public_bool_matrix_from_bits(bits, *self.matrix_shape(shape), reg_addr)
+        return self.__track(PETAceBuffer(shape, np.bool_, Public.BOOL, reg_addr))
+
+    def adopt(self, shape: Tuple[int], dtype: np.dtype, data_type: str, reg_addr: int) -> PETAceBuffer:
+        """Create a buffer for a register allocated by a primitive directly, e.g. an output of a replayed program."""
+        return self.__track(PETAceBuffer(shape, dtype, data_type, reg_addr))
 
     def delete_buffer(self, obj: PETAceBuffer):
+        """Free the register of a buffer, deleting a buffer twice is a no-op.
+
+        While tasks submitted to the worker thread are pending, the register is freed by a task run after them,
+        as they may still use it. It does not wait for them, so it is safe in a finalizer.
+        """
         self.__check_type(obj, PETAceBuffer)
-        self.delete_data(obj.reg_addr)
+        if obj.reg_addr is None:
+            return
+        task = self._last_task
+        if task is not None and not task.done() and threading.get_ident() != self._worker_thread:
+            self.submit(self.delete_buffer, obj)
+            return
+        with self._lock:
+            if obj.reg_addr is None:
+                return
+            self.delete_data(obj.reg_addr)
+            obj.reg_addr = None
+            self._live.pop(id(obj), None)
+            self._type_count[obj.data_type] -= 1
+            self._type_bytes[obj.data_type] -= obj.nbytes
+            self.live_bytes -= obj.nbytes
+            if obj.scope is not None:
+                obj.scope.remove(obj)
+            if self._tracer is not None:
+                self._tracer.on_delete(obj, self.live_bytes)
+
+    def to_numpy(self, obj: PETAceBuffer, consume: bool = False) -> np.ndarray:
+        """Get the plaintext of a private buffer.
 
-    def to_numpy(self, obj: PETAceBuffer) -> np.ndarray:
+        If `consume` is True, the data is moved out of the register instead of copied and the
+        buffer is left empty, this is meant for temporary buffers that are deleted right after.
+        """
         self.__check_type(obj, PETAceBuffer)
         if obj.data_type not in Private.support_types():
             raise DuetVMError(f"Only support private, unsupported data type, {obj.data_type}")
-        if obj.dtype == np.float64:
-            res = self.get_private_double_matrix(obj.reg_addr)
+        if obj.dtype in (np.float64, np.int64):
+            getter = self.take_private_double_matrix if consume else self.get_private_double_matrix
         elif obj.dtype == np.bool_:
-            res = self.get_private_bool_matrix(obj.reg_addr)
+            getter = self.take_private_bool_matrix if consume else self.get_private_bool_matrix
         else:
             raise DuetVMError(f"unsupported dtype, {obj.dtype}")
+        res = getter(obj.reg_addr)
+        if obj.dtype == np.int64:
+            # remove the fixed-point error left by truncations
+            res = np.rint(res).astype(np.int64)
         return res
 
-    def to_share(self, obj: PETAceBuffer) -> np.ndarray:
+    def scale_airth_share_matrix(self, factor: np.ndarray, src: int, dst: int):
+        """Multiply the arithmetic share in register `src` by the public integers `factor` into register `dst`.
+
+        Shares are linear, so it runs on the local shares and needs neither communication nor truncation.
+        """
+        share = self.get_airth_share_matrix(src)
+        self.set_airth_share_matrix(share * factor.astype(np.int64, copy=False).reshape(share.shape), dst)
+
+    def set_airth_share_zeros(self, rows: int, cols: int, reg_addr: int):
+        """Set register `reg_addr` to arithmetic shares of a `rows` x `cols` zero matrix.
+
+        Zero shares of both parties share 0, so it is a constant that needs no communication, which a recorded
+        program can replay unlike the shares of data set by `set_airth_share_matrix`.
+        """
+        self.set_airth_share_matrix(np.zeros((rows, cols), dtype=np.int64), reg_addr)
+
+    def to_share(self,
+                 obj: PETAceBuffer,
+                 packed: bool = False,
+                 ring_bits: int = None,
+                 out: Union[np.ndarray, memoryview, bytearray] = None) -> np.ndarray:
+        """Get the local share of a share buffer.
+
+        The share is copied out of the register, so the result is owned by the caller and later instructions on
+        the buffer do not change it.
+        If `packed` is True, a bool share is returned as a 1d np.uint64 array holding 64 elements per word, it is
+        packed when it is read, the register keeps one int64 per element.
+        `ring_bits` is the ring width of arithmetic shares, 32 returns np.int32 shares reduced modulo 2 ** 32,
+        defaults to `export_ring_bits`.
+        If `out` is given, that copy is then written into it and it is returned as an array. It can be an array of
+        the same size, e.g. a np.memmap, or any writable buffer-protocol object of the same number of bytes.
+        """
         self.__check_type(obj, PETAceBuffer)
         if obj.data_type not in Share.support_types():
             raise DuetVMError(f"Only support share, unsupported data type, {obj.data_type}")
-        if obj.dtype == np.float64:
+        if packed and obj.dtype != np.bool_:
+            raise DuetVMError(f"packed share only support np.bool_, got {obj.dtype}")
+        if packed:
+            res = self.get_boolean_share_matrix_packed(obj.reg_addr).reshape(-1)
+        elif obj.dtype in (np.float64, np.int64):
             res = self.get_airth_share_matrix(obj.reg_addr)
         elif obj.dtype == np.bool_:
             res = self.get_boolean_share_matrix(obj.reg_addr)
-        return res
+        dtype = res.dtype
+        if not packed and obj.dtype in (np.float64, np.int64):
+            if ring_bits is None:
+                ring_bits = self.export_ring_bits
+            if ring_bits not in (32, 64):
+                raise DuetVMError(f"ring_bits must be 32 or 64, got {ring_bits}")
+            dtype = np.dtype(np.int32) if ring_bits == 32 else dtype
+
+        if out is None:
+            return res if dtype == res.dtype else res.astype(dtype)
+        target = out if isinstance(out, np.ndarray) else np.frombuffer(out, dtype=dtype)
+        # the byte order of `out` may differ, e.g. a little-endian np.memmap of a file
+        if target.dtype.newbyteorder("=") != dtype:
+            raise DuetVMError(f"Expect out of {dtype}, got {target.dtype}")
+        if target.size != res.size:
+            raise ValueError(f"Expect out of {res.size} elements, got {target.size}")
+        # an unsafe cast from int64 to int32 is the reduction modulo 2 ** 32
+        np.copyto(target, res.reshape(target.shape), casting="unsafe")
+        return target
 
     def execute_code(self, operation: str, objs: List[PETAceBuffer]) -> None:
         if operation not in self._supported_operations:
             raise DuetVMError(f"unsupported operation, {operation}")
         for obj in objs:
             self.__check_type(obj, PETAceBuffer)
-        inst = Instruction([operation, *[obj.data_type for obj in objs]])
-        self.exec_code(inst, [obj.reg_addr for obj in objs])
+            if obj.reg_addr is None:
+                raise DuetVMError(f"{operation} got a deleted buffer")
+            if obj.vm is not None and obj.vm is not self:
+                raise DuetVMError(f"{operation} got a buffer of another VM")
+        inst = self.instruction(operation, tuple(obj.data_type for obj in objs))
+        if not self._profiling:
+            self.exec_code(inst, [obj.reg_addr for obj in objs])
+            return
+        self._profiler.run(operation, objs, lambda: self.exec_code(inst, [obj.reg_addr for obj in objs]))
 
-    def vstack(self, buffers: Union[List[PETAceBuffer], Tuple[PETAceBuffer]]) -> PETAceBuffer:
-        if not isinstance(buffers, collections.Iterable):
-            raise TypeError("Input must be an iterable")
-        if len(buffers) < 2:
-            raise ValueError("Input must be at least 2 arrays")
-        shape = np.vstack([np.empty(buffer.shape) for buffer in buffers]).shape
-        first = buffers[0]
-        for i in buffers[1:]:
-            ret = self.new_share(shape, np.float64)
-            self.airth_share_vstack(first.reg_addr, i.reg_addr, ret.reg_addr)
-            if first.reg_addr != buffers[0].reg_addr:
-                self.delete_buffer(first)
-            first = ret
-        return ret
+    def execute_code_async(self, operation: str, objs: List[PETAceBuffer]) -> Future:
+        """Execute an instruction on the worker thread, see `submit`."""
+        return self.submit(self.execute_code, operation, objs)
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """Run `fn(*args, **kwargs)` on the worker thread of the VM and return its future.
+
+        Tasks run one at a time in the order they are submitted, so the parties stay in lockstep as long as they
+        submit the same tasks. Instructions, messages, reads and writes of registers of other threads wait for the
+        pending tasks first, the plaintext work of the caller overlaps with them. Duet releases the GIL while it computes and communicates.
+        Buffers allocated by a task are not tracked by the scopes of the caller. Call `close` to stop the worker.
+        """
+        with self._submit_lock:
+            if self._worker is None:
+                # the worker only holds a weak reference, the VM can be collected without calling `close`
+                self._worker = ThreadPoolExecutor(max_workers=1,
+                                                  thread_name_prefix="petace-vm",
+                                                  initializer=_set_worker_thread,
+                                                  initargs=(weakref.ref(self),))
+            # the task sees the context of the caller, e.g. the VM set by `snp.use_vm`
+            task = self._worker.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+            self._last_task = task
+            return task
+
+    def close(self):
+        """Wait for the submitted tasks and stop the worker thread, a later `submit` starts a new one."""
+        with self._submit_lock:
+            worker, self._worker = self._worker, None
+        if worker is not None:
+            worker.shutdown(wait=True)
+        self._worker_thread = None
+        self._last_task = None
 
-    def hstack(self, buffers: Union[List[PETAceBuffer], Tuple[PETAceBuffer]]) -> PETAceBuffer:
+    def synchronize(self):
+        """Wait for the tasks submitted so far, it returns at once on the worker thread."""
+        task = self._last_task
+        if task is None or threading.get_ident() == self._worker_thread:
+            return
+        wait([task])
+
+    def instruction(self, operation: str, types: Tuple[str]) -> Instruction:
+        """The instruction running `operation` on operands of `types`, built once and reused."""
+        key = (operation, *types)
+        inst = self._instructions.get(key)
+        if inst is None:
+            inst = Instruction(list(key))
+            self._instructions[key] = inst
+        return inst
+
+    def add_profile_hook(self, hook: Callable[[InstructionRecord], None]):
+        """Call `hook` with an `InstructionRecord` after every executed instruction."""
+        self._profiler.hooks.append(hook)
+        self._profiling = self._profiler.active
+
+    def remove_profile_hook(self, hook: Callable[[InstructionRecord], None]):
+        self._profiler.hooks.remove(hook)
+        self._profiling = self._profiler.active
+
+    def enable_profile(self, enabled: bool = True):
+        """Start or stop aggregating instruction statistics for `profile`."""
+        self._profiler.aggregate = enabled
+        self._profiling = self._profiler.active
+
+    def profile(self, reset: bool = False) -> ProfileReport:
+        """Return the instruction statistics aggregated per op since `enable_profile`.
+
+        Time and bytes are measured, rounds are estimated by `petace.duet.cost_model`. The parallel efficiency
+        of an op, see `ProfileReport.parallel_efficiency`, tells how well it used the threads of `set_num_threads`.
+        If `reset` is True, the statistics are cleared after they are returned.
+        """
+        report = ProfileReport({op: dict(stats) for op, stats in self._profiler.report.items()})
+        if reset:
+            self._profiler.report.clear()
+        return report
+
+    @staticmethod
+    def __check_stack(buffers: Union[List[PETAceBuffer], Tuple[PETAceBuffer]]):
         if not isinstance(buffers, collections.Iterable):
             raise TypeError("Input must be an iterable")
         if len(buffers) < 2:
             raise ValueError("Input must be at least 2 arrays")
-        shape = np.hstack([np.empty(buffer.shape) for buffer in buffers]).shape
-        first = buffers[0]
-        for i in buffers[1:]:
-            ret = self.new_share(shape, np.float64)
-            if len(first.shape) == 1:
-                self.airth_share_vstack(first.reg_addr, i.reg_addr, ret.reg_addr)
-            else:
-                self.airth_share_hstack(first.reg_addr, i.reg_addr, ret.reg_addr)
-            if first.reg_addr != buffers[0].reg_addr:
-                self.delete_buffer(first)
-            first = ret
-        return ret
+
+    def __stack(self, buffers: List[PETAceBuffer], shape: Tuple[int], primitive: Callable,
+                merged_shape: Callable) -> PETAceBuffer:
+        """Join `buffers` two by two with `primitive`, level by level like a balanced tree.
+
+        Every element is copied once per level, so stacking N buffers copies the data log2(N) times
+        instead of N times when the result grows one buffer at a time.
+        """
+        inputs = {id(buffer) for buffer in buffers}
+        level = list(buffers)
+        while len(level) > 1:
+            joined = []
+            for first, second in zip(level[0::2], level[1::2]):
+                ret = self.new_share(shape if len(level) == 2 else merged_shape(first.shape, second.shape),
+                                     buffers[0].dtype)
+                primitive(first.reg_addr, second.reg_addr, ret.reg_addr)
+                for used in (first, second):
+                    if id(used) not in inputs:
+                        self.delete_buffer(used)
+                joined.append(ret)
+            level = joined + level[len(joined) * 2:]
+        return level[0]
+
+    def vstack(self, buffers: Union[List[PETAceBuffer], Tuple[PETAceBuffer]], shape: Tuple[int]) -> PETAceBuffer:
+        """Stack share buffers, `shape` is the shape of the stacked result."""
+        self.__check_stack(buffers)
+        vstack = self.bool_share_vstack if buffers[0].dtype == np.bool_ else self.airth_share_vstack
+
+        def merged_shape(first, second):
+            return (self.matrix_shape(first)[0] + self.matrix_shape(second)[0], self.matrix_shape(first)[1])
+
+        return self.__stack(buffers, shape, vstack, merged_shape)
+
+    def hstack(self, buffers: Union[List[PETAceBuffer], Tuple[PETAceBuffer]], shape: Tuple[int]) -> PETAceBuffer:
+        """Stack share buffers, `shape` is the shape of the stacked result."""
+        self.__check_stack(buffers)
+        if buffers[0].dtype == np.bool_:
+            vstack, hstack = self.bool_share_vstack, self.bool_share_hstack
+        else:
+            vstack, hstack = self.airth_share_vstack, self.airth_share_hstack
+
+        def merged_shape(first, second):
+            return (first[0] + second[0],) if len(first) == 1 else (first[0], first[1] + second[1])
+
+        return self.__stack(buffers, shape, vstack if len(buffers[0].shape) == 1 else hstack, merged_shape)
 
     def make_share(self,
                    data: Union[np.ndarray, None],
                    shape,
                    party: int = 0,
-                   dtype: np.dtype = np.float64) -> PETAceBuffer:
-        if dtype not in (np.float64, np.bool_):
-            raise DuetVMError(f"unsupported dtype, {dtype}")
-        if isinstance(data, np.ndarray):
-            data = data.astype(dtype)
+                   dtype: np.dtype = np.float64,
+                   packed: bool = False) -> PETAceBuffer:
+        """Secret share the data of `party`.
+
+        If `packed` is True, `data` is the `np.packbits` output of a bool array of `shape`.
+        """
+        self.__check_dtype(dtype)
+        if isinstance(data, np.ndarray) and not packed:
+            data = data.astype(dtype, copy=False)
             if data.ndim < 2:
                 data = data.reshape((1, -1))
-        private_matrix = self.new_private(shape, dtype, data, party)
+        private_matrix = self.new_private(shape, dtype, data, party, packed)
         share_matrix = self.new_share(shape, dtype)
         self.execute_code("share", [private_matrix, share_matrix])
         self.delete_buffer(private_matrix)
         return share_matrix
 
+    @staticmethod
+    def matrix_shape(shape: Tuple[int]) -> Tuple[int, int]:
+        """Shape of the 2d matrix that stores an array of `shape` in C++."""
+        if len(shape) == 0:
+            return 1, 1
+        if len(shape) == 1:
+            return 1, shape[0]
+        return shape[0], shape[1]
+
+    @property
+    def tracer(self) -> Union[Tracer, None]:
+        """The active tracer, None if not tracing."""
+        return self._tracer
+
+    def __clock_offset(self, samples: int = 5) -> float:
+        """Estimate the microseconds to add to the local clock to get the clock of party 0.
+
+        Party 1 sends pings and party 0 answers with its clock, the sample with the shortest round trip wins.
+        """
+        if self.party_id() == 0:
+            for _ in range(samples):
+                self.recv_buffer(8)
+                self.send_buffer(bytearray(struct.pack('d', time.time() * 1e6)))
+            return 0.0
+        best_rtt, offset = None, 0.0
+        for _ in range(samples):
+            start = time.time() * 1e6
+            self.send_buffer(bytearray(8))
+            remote = struct.unpack('d', bytes(self.recv_buffer(8)))[0]
+            end = time.time() * 1e6
+            if best_rtt is None or end - start < best_rtt:
+                best_rtt, offset = end - start, remote - (start + end) / 2
+        return offset
+
+    def start_trace(self, path: Union[str, os.PathLike]):
+        """Start recording a Chrome trace-event timeline, saved to `path` by `stop_trace`.
+
+        The trace shows instruction spans, SecureNumpy function and SecureArray operator spans, `send_buffer`
+        and `recv_buffer` spans and register allocations. Both parties must call it together, the clocks are
+        aligned with a ping exchange so the traces can be merged with `petace.duet.merge_traces` and opened
+        in chrome://tracing or Perfetto.
+        """
+        if self._tracer is not None:
+            raise DuetVMError("trace is already started")
+        offset = self.__clock_offset()
+        self._tracer = Tracer(path, self.party_id(), offset)
+        self.add_profile_hook(self._tracer.on_instruction)
+        Tracer._count(1)
+
+    def stop_trace(self) -> str:
+        """Stop recording and save the trace, return its path."""
+        if self._tracer is None:
+            raise DuetVMError("trace is not started")
+        tracer, self._tracer = self._tracer, None
+        Tracer._count(-1)
+        self.remove_profile_hook(tracer.on_instruction)
+        tracer.write()
+        return tracer.path
+
     def send_shape(self, shape: tuple):
-        ndim = len(shape)
-        self.send_buffer(bytearray(struct.pack('i', ndim)))
-        if ndim > 0:
-            self.send_buffer(bytearray(struct.pack('i' * ndim, *shape)))
+        self.send_shapes([shape])
 
     def recv_shape(self) -> tuple:
-        ndim = struct.unpack('i', bytes(self.recv_buffer(4)))[0]
-        if ndim == 0:
-            return ()
-        buffer = bytes(self.recv_buffer(4 * ndim))
-        shape = struct.unpack('i' * ndim, buffer)
-        return shape
+        return self.recv_shapes(1)[0]
+
+    def send_shapes(self, shapes: List[tuple]):
+        """Send the shapes of up to 2d arrays in a single message, each shape takes 3 ints (ndim, rows, cols)."""
+        values = []
+        for shape in shapes:
+            if len(shape) > 2:
+                raise DuetVMError(f"Only support 0d, 1d or 2d array, got {len(shape)} dimension")
+            values.append(len(shape))
+            values.extend(shape)
+            values.extend([0] * (2 - len(shape)))
+        self.send_buffer(bytearray(struct.pack('i' * len(values), *values)))
+
+    def recv_shapes(self, count: int) -> List[tuple]:
+        """Receive `count` shapes sent by `send_shapes`."""
+        buffer = bytes(self.recv_buffer(12 * count))
+        values = struct.unpack('i' * (3 * count), buffer)
+        return [tuple(values[i + 1:i + 1 + values[i]]) for i in range(0, 3 * count, 3)]
 
     def inner_flatten(self, buffer: PETAceBuffer) -> PETAceBuffer:
         """transform 2d matrix to 1d matrix(row major).
@@ -274,3 +774,74 @@ class VM(DuetVM):
         self.execute_code("reshape", [buffer, row_public, col_public, ret])
         self.delete_buffer(buffer)
         return ret
+
+
+def _set_worker_thread(ref: weakref.ref):
+    vm = ref()
+    if vm is not None:
+        vm._worker_thread = threading.get_ident()
+
+
+# primitives touching neither registers nor the channel, the others run after the tasks submitted before them
+_INDEPENDENT = (
+    "new_airth_matrix",
+    "new_bool_matrix",
+    "new_public_double_matrix",
+    "new_public_double",
+    "new_public_index",
+    "new_public_bool_matrix",
+    "new_private_double_matrix",
+    "new_private_bool_matrix",
+    "party_id",
+    "set_num_threads",
+    "num_threads",
+    "thread_cpu_time",
+    "get_bytes_sent",
+    "get_bytes_received",
+)
+
+
+def _locked(name: str) -> Callable:
+    primitive = getattr(DuetVM, name)
+    waits = name not in _INDEPENDENT
+
+    def call(self, *args):
+        if waits:
+            self.synchronize()
+        with self._lock:
+            return primitive(self, *args)
+
+    call.__name__ = name
+    call.__doc__ = primitive.__doc__
+    return call
+
+
+class _LockedDuetVM(DuetVM):
+    """DuetVM whose primitives hold the lock of the VM, Duet is not thread-safe once it releases the GIL."""
+
+
+for _name in dir(DuetVM):
+    if not _name.startswith("_") and callable(getattr(DuetVM, _name)):
+        setattr(_LockedDuetVM, _name, _locked(_name))
+
+
+class VM(BaseVM, _LockedDuetVM):
+    """Virtual machine for PETAce.
+    """
+
+    def __init__(self, net: Network, party_id: int):
+        _LockedDuetVM.__init__(self, net, party_id)
+        BaseVM.__init__(self)
+        self.net = net
+
+    def send_buffer(self, data: bytearray):
+        if self._tracer is None:
+            return super().send_buffer(data)
+        with self._tracer.span("send", "network", {"bytes": len(data)}):
+            return super().send_buffer(data)
+
+    def recv_buffer(self, size: int) -> bytearray:
+        if self._tracer is None:
+            return super().recv_buffer(size)
+        with self._tracer.span("recv", "network", {"bytes": size}):
+            return super().recv_buffer(size)
@@ -13,3 +13,4 @@
 # limitations under the License.
 
 from .activation_function import sigmoid
+from .data import BatchLoader
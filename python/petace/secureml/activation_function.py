@@ -12,10 +12,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from petace.securenumpy import SecureArray, get_vm
+from petace.securenumpy import SecureArray
 from petace.securenumpy import where, ones, zeros
+from petace.securenumpy.core.trace import traced
 
 
+@traced
 def sigmoid(arr: SecureArray, mode: int = 0) -> SecureArray:
     """Return the sigmoid of an array.
 
@@ -34,7 +36,7 @@ def sigmoid(arr: SecureArray, mode: int = 0) -> SecureArray:
     if mode not in (0, 1):
         raise ValueError("mode must be 0 or 1.")
     if mode == 0:
-        vm = get_vm()
+        vm = arr.vm
         output = vm.new_share(arr.buffer.shape, arr.dtype)
         vm.execute_code("sigmoid", [arr.buffer, output])
         return SecureArray(output)
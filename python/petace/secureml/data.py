@@ -0,0 +1,273 @@
+# Copyright 2023 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import collections
+import secrets
+import struct
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Dict, Iterable, Iterator, List, Tuple, Union
+
+import numpy as np
+
+from petace.duet import VM
+from petace.duet.vm import PETAceBuffer
+from petace.securenumpy import SecureArray, get_vm
+
+
+class BatchLoader:
+    """Iterate over minibatches of secret shared rows, sharing the next batches while the current step runs.
+
+    Every entry is an array of one party with the same number of rows, e.g. the features of party 0 and the
+    labels of party 1. Each batch is a tuple with one SecureArray per entry holding the same rows of every entry.
+    A background thread reads and converts the rows of the next `prefetch` batches, so the data may be a
+    `np.memmap` larger than memory. The batches are shared into registers allocated once and reused, so the
+    arrays of a batch are overwritten once the next batch is taken, copy them to keep them longer.
+
+    The shares of a VM can only be computed in the order its messages are exchanged, so by default a batch is
+    shared on the current VM when it is taken, and only reading the rows overlaps with the step. Pass a second
+    VM connected to the other party as `loader_vm` to share the next batches on its worker thread, overlapping
+    with the communication of the step as well, the shares are then copied into the registers of the current VM.
+
+    Both parties must create the loader with the same arguments and iterate over it the same way.
+
+    Parameters
+    ----------
+    entries : iterable of tuples
+        `(data, party)` or `(data, party, dtype)` for every array, with the same meaning as the arguments of
+        `snp.array`, `data` is ignored on the party that does not provide it. 1d arrays are batched by element.
+    batch_size : int
+        Number of rows of a batch.
+    shuffle : bool
+        Visit the rows in a new random order every epoch. The order is drawn from `seed` and the epoch, the
+        rows of a batch are sorted, which keeps the reads of a `np.memmap` sequential.
+    seed : int, optional
+        Non-negative seed of the shuffle, known to both parties. By default party 0 draws one and sends it.
+    drop_last : bool
+        Skip the last batch of an epoch if it has less than `batch_size` rows.
+    prefetch : int
+        Number of batches read ahead.
+    loader_vm : VM, optional
+        A VM with its own connection to the other party, used to share the batches in the background.
+
+    Attributes
+    ----------
+    rows : int
+        Number of rows of every entry.
+    epoch : int
+        Number of epochs started.
+    """
+
+    def __init__(self,
+                 entries: Iterable[Tuple[np.ndarray, int, np.dtype]],
+                 batch_size: int,
+                 shuffle: bool = False,
+                 seed: int = None,
+                 drop_last: bool = False,
+                 prefetch: int = 1,
+                 loader_vm: VM = None) -> None:
+        if batch_size < 1:
+            raise ValueError(f"batch_size must be positive, got {batch_size}")
+        if prefetch < 1:
+            raise ValueError(f"prefetch must be positive, got {prefetch}")
+        if seed is not None and seed < 0:
+            raise ValueError(f"seed must be non-negative, got {seed}")
+        self.vm = get_vm()
+        self.loader_vm = loader_vm
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.prefetch = prefetch
+        self.epoch = 0
+        self.__entries = [(entry[0], entry[1], entry[2] if len(entry) > 2 else np.float64) for entry in entries]
+        if len(self.__entries) == 0:
+            raise ValueError("entries must contain at least one array")
+        self.__shapes = self.__exchange_shapes()
+        rows = {shape[0] for shape in self.__shapes}
+        if len(rows) != 1:
+            raise ValueError(f"all arrays must have the same number of rows, got {sorted(rows)}")
+        self.rows = rows.pop()
+        self.seed = self.__exchange_seed(seed) if shuffle else seed
+        self.__reader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="petace-batch")
+        # (slot, rows) -> private and share buffers of every entry on the VM sharing the batches
+        self.__staging: Dict[Tuple[int, int], List[Tuple[PETAceBuffer, PETAceBuffer]]] = {}
+        # (slot, rows) -> the batch handed out, on the current VM
+        self.__outputs: Dict[Tuple[int, int], Tuple[SecureArray]] = {}
+
+    def __exchange_shapes(self) -> List[tuple]:
+        for data, party, dtype in self.__entries:
+            if party not in (0, 1):
+                raise ValueError(f"party must be 0 or 1, got {party}")
+            if dtype not in (np.float64, np.int64, np.bool_):
+                raise TypeError(f"Unsupported dtype: {dtype}")
+            if self.vm.party_id() == party:
+                if not isinstance(data, np.ndarray):
+                    raise TypeError(f"Only support numpy.ndarray, got {type(data)}")
+                if data.ndim not in (1, 2):
+                    raise ValueError(f"Only support 1d or 2d array, got {data.ndim} dimension")
+
+        shapes = [None] * len(self.__entries)
+        for party in (0, 1):
+            index = [i for i, entry in enumerate(self.__entries) if entry[1] == party]
+            if len(index) == 0:
+                continue
+            if self.vm.party_id() == party:
+                for i in index:
+                    shapes[i] = self.__entries[i][0].shape
+                self.vm.send_shapes([shapes[i] for i in index])
+            else:
+                for i, shape in zip(index, self.vm.recv_shapes(len(index))):
+                    shapes[i] = shape
+        return shapes
+
+    def __exchange_seed(self, seed: Union[int, None]) -> int:
+        if seed is not None:
+            return seed
+        if self.vm.party_id() == 0:
+            seed = secrets.randbits(63)
+            self.vm.send_buffer(bytearray(struct.pack('q', seed)))
+            return seed
+        return struct.unpack('q', bytes(self.vm.recv_buffer(8)))[0]
+
+    def __len__(self) -> int:
+        if self.drop_last:
+            return self.rows // self.batch_size
+        return (self.rows + self.batch_size - 1) // self.batch_size
+
+    def batches(self, epoch: int) -> List[Union[slice, np.ndarray]]:
+        """The rows of every batch of `epoch`, slices without shuffling, sorted indices otherwise."""
+        stop = len(self) * self.batch_size if self.drop_last else self.rows
+        if not self.shuffle:
+            return [slice(start, min(start + self.batch_size, stop)) for start in range(0, stop, self.batch_size)]
+        order = np.random.default_rng([self.seed, epoch]).permutation(self.rows)
+        return [np.sort(order[start:start + self.batch_size]) for start in range(0, stop, self.batch_size)]
+
+    def __iter__(self) -> Iterator[Tuple[SecureArray]]:
+        batches = self.batches(self.epoch)
+        self.epoch += 1
+        slots = self.prefetch + 1
+        pending = collections.deque()
+
+        def schedule(i: int):
+            slot, length = i % slots, self.__length(batches[i])
+            future = self.__reader.submit(self.__read, batches[i])
+            if self.loader_vm is not None:
+                future = self.loader_vm.submit(self.__share_later, length, future)
+            pending.append((slot, length, future))
+
+        try:
+            for i in range(min(self.prefetch, len(batches))):
+                schedule(i)
+            for i in range(len(batches)):
+                slot, length, future = pending.popleft()
+                if self.loader_vm is None:
+                    self.__share(self.vm, slot, length, future.result())
+                else:
+                    self.__copy(slot, length, future.result())
+                # the batch before this one is not used anymore, its slot takes the next batch
+                if i + self.prefetch < len(batches):
+                    schedule(i + self.prefetch)
+                yield self.__output(slot, length)
+        finally:
+            # the other party shares the batches read ahead as well
+            wait([future for _, _, future in pending])
+
+    def __length(self, batch: Union[slice, np.ndarray]) -> int:
+        return batch.stop - batch.start if isinstance(batch, slice) else len(batch)
+
+    def __read(self, batch: Union[slice, np.ndarray]) -> List[Union[np.ndarray, None]]:
+        """Rows of the batch of the entries of this party, as the 2d matrices stored by the registers."""
+        ret = []
+        for data, party, dtype in self.__entries:
+            if self.vm.party_id() != party:
+                ret.append(None)
+                continue
+            rows = np.asarray(data[batch], dtype=np.float64 if dtype == np.int64 else dtype)
+            ret.append(np.ascontiguousarray(rows.reshape((1, -1)) if rows.ndim == 1 else rows))
+        return ret
+
+    def __registers(self, vm: VM, slot: int, length: int) -> List[Tuple[PETAceBuffer, PETAceBuffer]]:
+        """Private and share buffers of a batch, allocated the first time the slot takes a batch of `length` rows."""
+        buffers = self.__staging.get((slot, length))
+        if buffers is None:
+            buffers = []
+            for (_, party, dtype), shape in zip(self.__entries, self.__shapes):
+                shape = (length, *shape[1:])
+                buffers.append((vm.new_private(shape, dtype, None, party), vm.new_share(shape, dtype)))
+            self.__staging[(slot, length)] = buffers
+        return buffers
+
+    def __share(self, vm: VM, slot: int, length: int, rows: List[Union[np.ndarray, None]]):
+        for (private, share), data in zip(self.__registers(vm, slot, length), rows):
+            if data is not None:
+                if private.dtype == np.bool_:
+                    vm.set_private_bool_matrix(data, private.reg_addr)
+                else:
+                    vm.set_private_double_matrix(data, private.reg_addr)
+            vm.execute_code("share", [private, share])
+
+    def __share_later(self, length: int, rows: Future) -> List[np.ndarray]:
+        """Share a batch on the loader VM and export the shares, it runs on the worker thread of the loader VM.
+
+        The shares are copied out at once, so the loader VM needs a single set of registers per batch length.
+        """
+        vm = self.loader_vm
+        self.__share(vm, 0, length, rows.result())
+        ret = []
+        for _, share in self.__registers(vm, 0, length):
+            if share.dtype == np.bool_:
+                ret.append(np.array(vm.get_boolean_share_matrix(share.reg_addr)))
+            else:
+                ret.append(np.array(vm.get_airth_share_matrix(share.reg_addr)))
+        return ret
+
+    def __copy(self, slot: int, length: int, shares: List[np.ndarray]):
+        """Load the shares made by the loader VM into the batch, shares are local so nothing is sent."""
+        for arr, share in zip(self.__output(slot, length), shares):
+            if arr.dtype == np.bool_:
+                self.vm.set_boolean_share_matrix(share, arr.buffer.reg_addr)
+            else:
+                self.vm.set_airth_share_matrix(share, arr.buffer.reg_addr)
+
+    def __output(self, slot: int, length: int) -> Tuple[SecureArray]:
+        arrays = self.__outputs.get((slot, length))
+        if arrays is None:
+            if self.loader_vm is None:
+                arrays = tuple(SecureArray(share, self.vm) for _, share in self.__registers(self.vm, slot, length))
+            else:
+                arrays = tuple(
+                    SecureArray(self.vm.new_share((length, *shape[1:]), dtype), self.vm)
+                    for (_, _, dtype), shape in zip(self.__entries, self.__shapes))
+            self.__outputs[(slot, length)] = arrays
+        return arrays
+
+    def close(self):
+        """Stop the reader thread and free the registers of the batches."""
+        self.__reader.shutdown(wait=True)
+        vm = self.vm if self.loader_vm is None else self.loader_vm
+        for buffers in self.__staging.values():
+            for private, share in buffers:
+                vm.delete_buffer(private)
+                vm.delete_buffer(share)
+        for arrays in self.__outputs.values():
+            for arr in arrays:
+                self.vm.delete_buffer(arr.buffer)
+        self.__staging.clear()
+        self.__outputs.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        self.close()
+        return False
@@ -12,7 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from .core import SecureArray, set_vm, get_vm
+from .core import SecureArray, SecureMemmap, set_vm, get_vm, use_vm, current_vm, scope
 from .array_manipulation import (
     vstack,
     hstack,
@@ -32,7 +32,10 @@ from .sort_search import (
 )
 from .array_creation import (
     array,
+    array_many,
+    array_from_chunks,
     fromshare,
+    frombits,
     ones,
     zeros,
     empty,
@@ -52,6 +55,20 @@ from .math import (
 from .linalg import (
     inner,
     dot,
+    tiled_matmul,
+)
+from .io import (
+    reveal_many,
+    reveal_many_to_all,
+    save,
+    load,
+)
+from .jit import jit, JitFunction
+from .parallel import parallel, ParallelExecutor
+from .explain import (
+    explain,
+    AbstractArray,
+    Explanation,
 )
 from .statistics import (
     ptp,
@@ -13,12 +13,17 @@
 # limitations under the License.
 
 import numbers
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, List, Tuple, Union
 
 import numpy as np
 
 from .core import SecureArray, get_vm
+from .core.trace import traced
+from .array_manipulation import vstack, hstack
 
 
+@traced
 def array(data: np.ndarray, party: int, dtype: np.dtype = np.float64) -> SecureArray:
     """
     Create an SecureArray.
@@ -31,7 +36,14 @@ def array(data: np.ndarray, party: int, dtype: np.dtype = np.float64) -> SecureA
         Which party provide this data.
     dtype : dtype object, default is np.float64
         Data-type of the array's elements.
-        Now only support {np.float64, np.bool_}.
+        Now only support {np.float64, np.int64, np.bool_}. np.int64 arrays hold integers such as
+        counts, indices or categorical codes. They are not a native integer type: Duet has no integer
+        ring kernels, so they are stored as fixed-point values like np.float64 arrays, and every value,
+        including the products of two secret np.int64 arrays, must have `abs(x) < 2 ** 31`
+        (`VM.INT_BITS`). The data is checked here, results of secret operations cannot be checked.
+        Products by public integers run without truncation. The product of two secret np.int64 arrays
+        is truncated like a np.float64 product and may be off by a few units of 2 ** -16, which revealing
+        and comparisons round away.
 
     Returns
     -------
@@ -42,15 +54,14 @@ def array(data: np.ndarray, party: int, dtype: np.dtype = np.float64) -> SecureA
     if vm.party_id() == party:
         if not isinstance(data, np.ndarray):
             raise TypeError(f"Only support numpy.ndarray, got {type(data)}")
-        if dtype not in (np.float64, np.bool_):
+        if dtype not in (np.float64, np.int64, np.bool_):
             raise TypeError(f"Unsupported dtype: {dtype}")
-        shape = data.shape
-        vm.send_shape(data.shape)
-
-        if not isinstance(data, np.ndarray):
-            raise TypeError(f"Only support numpy.ndarray, got {type(data)}")
         if data.ndim > 2:
             raise ValueError(f"Only support 0d, 1d or 2d array, got {data.ndim} dimension")
+        if dtype == np.int64:
+            vm.check_int_range(data)
+        shape = data.shape
+        vm.send_shape(data.shape)
     else:
         shape = vm.recv_shape()
 
@@ -58,26 +69,279 @@ def array(data: np.ndarray, party: int, dtype: np.dtype = np.float64) -> SecureA
     return SecureArray(share_matrix)
 
 
-def fromshare(share: np.ndarray, dtype: np.dtype) -> SecureArray:
+@traced
+def array_many(entries: Iterable[Tuple[np.ndarray, int, np.dtype]]) -> List[SecureArray]:
+    """
+    Create many SecureArrays at once.
+
+    All shapes are exchanged in one message per party, and the arrays provided by the same party
+    with the same dtype are shared together, so the number of round trips does not grow with
+    the number of arrays.
+
+    Parameters
+    ----------
+    entries : iterable of tuples
+        `(data, party)` or `(data, party, dtype)` for every array, with the same meaning as the
+        arguments of `snp.array`. Both parties must pass the same parties and dtypes in the same order,
+        `data` is ignored on the party that does not provide it.
+
+    Returns
+    -------
+    out : list of SecureArray
+        The SecureArrays, in the order of `entries`.
+    """
+    vm = get_vm()
+    entries = [(entry[0], entry[1], entry[2] if len(entry) > 2 else np.float64) for entry in entries]
+    for data, party, dtype in entries:
+        if party not in (0, 1):
+            raise ValueError(f"party must be 0 or 1, got {party}")
+        if dtype not in (np.float64, np.int64, np.bool_):
+            raise TypeError(f"Unsupported dtype: {dtype}")
+        if vm.party_id() == party:
+            if not isinstance(data, np.ndarray):
+                raise TypeError(f"Only support numpy.ndarray, got {type(data)}")
+            if data.ndim > 2:
+                raise ValueError(f"Only support 0d, 1d or 2d array, got {data.ndim} dimension")
+
+    shapes = [None] * len(entries)
+    for party in (0, 1):
+        index = [i for i, entry in enumerate(entries) if entry[1] == party]
+        if len(index) == 0:
+            continue
+        if vm.party_id() == party:
+            for i in index:
+                shapes[i] = entries[i][0].shape
+            vm.send_shapes([shapes[i] for i in index])
+        else:
+            for i, shape in zip(index, vm.recv_shapes(len(index))):
+                shapes[i] = shape
+
+    groups = {}
+    for i, (_, party, dtype) in enumerate(entries):
+        groups.setdefault((party, np.dtype(dtype).type), []).append(i)
+
+    ret = [None] * len(entries)
+    for (party, dtype), index in groups.items():
+        sizes = [int(np.prod(shapes[i])) for i in index]
+        for i, size in zip(index, sizes):
+            if size == 0:
+                ret[i] = SecureArray(vm.new_share(shapes[i], dtype))
+        index = [i for i, size in zip(index, sizes) if size > 0]
+        sizes = [size for size in sizes if size > 0]
+        if len(index) == 0:
+            continue
+        data = None
+        if vm.party_id() == party:
+            data = np.concatenate([entries[i][0].astype(dtype, copy=False).reshape(-1) for i in index])
+        flat = vm.make_share(data, (sum(sizes),), party, dtype)
+        block = vm.bool_share_matrix_block if dtype == np.bool_ else vm.airth_share_matrix_block
+        offset = 0
+        for i, size in zip(index, sizes):
+            # 0d and 1d arrays are stored as one row like the flat share, 2d ones are reshaped after
+            part = vm.new_share(shapes[i] if len(shapes[i]) < 2 else (size,), dtype)
+            block(flat.reg_addr, part.reg_addr, 0, offset, 1, size)
+            ret[i] = SecureArray(part) if len(shapes[i]) < 2 else SecureArray(part).reshape(shapes[i])
+            offset += size
+        vm.delete_buffer(flat)
+    return ret
+
+
+def _next_chunk(chunks: Iterator[np.ndarray], dtype: np.dtype) -> Union[np.ndarray, None]:
+    chunk = next(chunks, None)
+    if chunk is None:
+        return None
+    if not isinstance(chunk, np.ndarray):
+        raise TypeError(f"Only support numpy.ndarray, got {type(chunk)}")
+    if chunk.ndim not in (1, 2):
+        raise ValueError(f"Only support 1d or 2d chunks, got {chunk.ndim} dimension")
+    return np.ascontiguousarray(chunk, dtype=dtype)
+
+
+# sent instead of the next shape when the chunks can not be read, empty chunks are never sent
+_FAILED = (0, 0)
+
+
+def _prefetch(chunks: Iterable[np.ndarray], dtype: np.dtype) -> Iterator[np.ndarray]:
+    """Yield the chunks converted to `dtype`, the next chunk is read and converted in a background thread."""
+    chunks = iter(chunks)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(_next_chunk, chunks, dtype)
+        while True:
+            chunk = future.result()
+            if chunk is None:
+                return
+            future = executor.submit(_next_chunk, chunks, dtype)
+            yield chunk
+
+
+@traced
+def array_from_chunks(chunks: Iterable[np.ndarray], party: int, dtype: np.dtype = np.float64) -> SecureArray:
+    """
+    Create a SecureArray from a stream of row blocks.
+
+    Each block is shared as soon as it is available while the next one is read and converted
+    in the background, so only a few plaintext blocks are held in memory at a time. The shared
+    blocks are merged pairwise as they arrive, which keeps the number of copies logarithmic.
+
+    Parameters
+    ----------
+    chunks : iterable of np.ndarray
+        Blocks of the array, e.g. a generator reading a file. 2d blocks are stacked vertically and
+        must have the same number of columns, 1d blocks are concatenated. Ignored on the party that
+        does not provide the data.
+    party : int
+        Which party provide this data.
+    dtype : dtype object, default is np.float64
+        Data-type of the array's elements.
+
+    Returns
+    -------
+    out : SecureArray
+        The SecureArray.
+    """
+    vm = get_vm()
+    if dtype not in (np.float64, np.int64, np.bool_):
+        raise TypeError(f"Unsupported dtype: {dtype}")
+
+    blocks = []
+    ndim = None
+
+    def merge(left: SecureArray, right: SecureArray) -> SecureArray:
+        return vstack([left, right]) if ndim == 2 else hstack([left, right])
+
+    def push(block: SecureArray):
+        blocks.append((block, 1))
+        while len(blocks) > 1 and blocks[-1][1] == blocks[-2][1]:
+            (right, count), (left, _) = blocks.pop(), blocks.pop()
+            blocks.append((merge(left, right), 2 * count))
+
+    if vm.party_id() == party:
+        try:
+            for chunk in _prefetch(chunks, dtype):
+                if ndim is not None and chunk.ndim != ndim:
+                    raise ValueError(f"All chunks must have the same dimension, got {ndim} and {chunk.ndim}")
+                ndim = chunk.ndim
+                if chunk.size == 0:
+                    continue
+                vm.send_shape(chunk.shape)
+                push(SecureArray(vm.make_share(chunk, chunk.shape, party, dtype)))
+        except Exception:
+            # the other party is waiting for the next shape
+            vm.send_shape(_FAILED)
+            raise
+        vm.send_shape(())
+    else:
+        while True:
+            shape = vm.recv_shape()
+            if shape == _FAILED:
+                raise ValueError(f"party {party} failed to read the chunks")
+            if len(shape) == 0:
+                break
+            ndim = len(shape)
+            push(SecureArray(vm.make_share(None, shape, party, dtype)))
+
+    if len(blocks) == 0:
+        raise ValueError("chunks must contain at least one non-empty array")
+    while len(blocks) > 1:
+        (right, _), (left, _) = blocks.pop(), blocks.pop()
+        blocks.append((merge(left, right), 0))
+    return blocks[0][0]
+
+
+@traced
+def frombits(bits: np.ndarray, shape, party: int) -> SecureArray:
+    """
+    Create a bool SecureArray from a packed bitmap.
+
+    Loading a mask this way needs one bit per element instead of one byte.
+
+    Parameters
+    ----------
+    bits : np.ndarray
+        Output of `np.packbits(data)` for a bool array `data`, with the default big bit order.
+        Bits are taken from the flattened array in row-major order.
+    shape : int or tuple of ints
+        Shape of the bool array.
+    party : int
+        Which party provide this data.
+
+    Returns
+    -------
+    out : SecureArray
+        The SecureArray of np.bool_ dtype.
+    """
+    vm = get_vm()
+    if vm.party_id() == party:
+        if not isinstance(bits, np.ndarray):
+            raise TypeError(f"Only support numpy.ndarray, got {type(bits)}")
+        if bits.dtype != np.uint8:
+            raise TypeError(f"Only support bits with numpy.uint8, got {bits.dtype}")
+        if isinstance(shape, int):
+            shape = (shape,)
+        shape = tuple(shape)
+        if len(shape) > 2:
+            raise ValueError(f"Only support 0d, 1d or 2d array, got {len(shape)} dimension")
+        if bits.size * 8 < np.prod(shape):
+            raise ValueError(f"Expect at least {np.prod(shape)} bits but got {bits.size * 8}")
+        vm.send_shape(shape)
+    else:
+        shape = vm.recv_shape()
+
+    share_matrix = vm.make_share(bits, shape, party, np.bool_, packed=True)
+    return SecureArray(share_matrix)
+
+
+@traced
+def fromshare(share: Union[np.ndarray, memoryview, bytes, bytearray], dtype: np.dtype, shape=None) -> SecureArray:
     """
     Recover share to SecureArray.
 
+    The share is copied once, straight from its memory into the VM register. C-contiguous arrays such
+    as a np.memmap of a share file are read in place without any intermediate copy.
+
     Parameters
     ----------
-    share : np.ndarray
-        Share of the new array.
+    share : np.ndarray or buffer-protocol object
+        Share of the new array. A np.uint64 share is a bit-packed bool share returned by
+        `SecureArray.to_share(packed=True)`, it is unpacked into the register.
+        A np.int32 share is an arithmetic share in the 32-bit ring returned by `SecureArray.to_share(ring_bits=32)`,
+        it is converted back to the 64-bit ring with one secure comparison.
+        Typed buffers (e.g. a memoryview of an array) keep their item type, raw bytes are read as np.int64.
     dtype : np.dtype
         Data type of the new array.
+    shape : int or tuple of ints, optional
+        Shape of the new array, needed for bit-packed shares and raw bytes, defaults to the shape of `share`.
 
     Returns
     -------
     out : SecureArray
     """
     if not isinstance(share, np.ndarray):
-        raise TypeError(f"Only support numpy.ndarray, got {type(share)}")
-    if share.dtype != np.int64:
-        raise TypeError(f"Only support share with numpy.int64, got {share.dtype}")
+        try:
+            view = memoryview(share)
+        except TypeError:
+            raise TypeError(f"Only support numpy.ndarray or buffer-protocol objects, got {type(share)}") from None
+        if view.format in ("B", "b", "c"):
+            share = np.frombuffer(view, dtype=np.int64)
+        else:
+            share = np.asarray(view)
+    if isinstance(shape, int):
+        shape = (shape,)
     vm = get_vm()
+    if share.dtype == np.uint64:
+        if dtype != np.bool_:
+            raise TypeError(f"Packed share only support np.bool_, got {dtype}")
+        if shape is None:
+            raise ValueError("shape is required for packed share")
+        shape = tuple(shape)
+        if share.size * 64 < np.prod(shape):
+            raise ValueError(f"Expect at least {np.prod(shape)} bits but got {share.size * 64}")
+        buffer = vm.new_share(shape, dtype, share, packed=True)
+        return SecureArray(buffer)
+    if share.dtype not in (np.int64, np.int32):
+        raise TypeError(f"Only support share with numpy.int64 or numpy.int32, got {share.dtype}")
+    if shape is not None:
+        share = share.reshape(shape)
     buffer = vm.new_share(share.shape, dtype, share)
     return SecureArray(buffer)
 
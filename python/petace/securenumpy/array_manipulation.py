@@ -15,10 +15,13 @@
 import collections
 from typing import List, Union, Tuple
 
-from .core import SecureArray, get_vm
+from .core import SecureArray
+from .core.trace import traced
+from .core.shape_utils import vstack_shape, hstack_shape
 from .exceptions import AxisError
 
 
+@traced
 def vstack(arrays: Union[List[SecureArray], Tuple[SecureArray]]) -> SecureArray:
     """
     Stack arrays in sequence vertically (row wise).
@@ -37,11 +40,12 @@ def vstack(arrays: Union[List[SecureArray], Tuple[SecureArray]]) -> SecureArray:
         raise ValueError("need at least one array to concatenate")
     if not isinstance(arrays, collections.Iterable):
         raise TypeError("Input must be an iterable")
-    vm = get_vm()
-    ret = vm.vstack([i.buffer for i in arrays])
+    vm = arrays[0].vm
+    ret = vm.vstack([i.buffer for i in arrays], vstack_shape([i.shape for i in arrays]))
     return SecureArray(ret)
 
 
+@traced
 def hstack(arrays: Union[List[SecureArray], Tuple[SecureArray]]) -> SecureArray:
     """
     Stack arrays in sequence horizontally (column wise).
@@ -60,8 +64,8 @@ def hstack(arrays: Union[List[SecureArray], Tuple[SecureArray]]) -> SecureArray:
         raise ValueError("need at least one array to concatenate")
     if not isinstance(arrays, collections.Iterable):
         raise TypeError("Input must be an iterable")
-    vm = get_vm()
-    ret = vm.hstack([i.buffer for i in arrays])
+    vm = arrays[0].vm
+    ret = vm.hstack([i.buffer for i in arrays], hstack_shape([i.shape for i in arrays]))
     return SecureArray(ret)
 
 
@@ -106,6 +110,7 @@ def row_stack(tup: Union[List[SecureArray], Tuple[SecureArray]]) -> SecureArray:
     return vstack(tup)
 
 
+@traced
 def concatenate(arrays: Union[List[SecureArray], Tuple[SecureArray]], axis: int = 0) -> SecureArray:
     """
     Join a sequence of arrays along an existing axis.
@@ -13,4 +13,5 @@
 # limitations under the License.
 
 from .securearray import SecureArray
-from .init import set_vm, get_vm
+from .securememmap import SecureMemmap
+from .init import set_vm, get_vm, use_vm, current_vm, scope
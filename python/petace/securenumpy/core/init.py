@@ -12,7 +12,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from petace.duet.vm import VM
+import contextlib
+import contextvars
+from typing import Iterator, Union
+
+from petace.duet.vm import BaseVM, VM
+from petace.duet.scope import Scope
 
 
 class GlobalVm:
@@ -20,13 +25,52 @@ class GlobalVm:
 
 
 GLOBALVM = GlobalVm()
+# the VM of the current context, set by `use_vm`, every thread and asyncio task has its own
+_CURRENT_VM = contextvars.ContextVar("petace_current_vm", default=None)
 
 
 def set_vm(vm: VM):
+    """Set the process-wide VM, used where no `use_vm` block is active."""
     GLOBALVM.vm = vm
 
 
+def current_vm() -> Union[BaseVM, None]:
+    """Return the VM of the innermost `use_vm` block of this context, or the global VM, None if neither is set."""
+    vm = _CURRENT_VM.get()
+    return vm if vm is not None else GLOBALVM.vm
+
+
 def get_vm() -> VM:
-    if GLOBALVM.vm is None:
+    vm = current_vm()
+    if vm is None:
         raise RuntimeError("Global VM is not initialized")
-    return GLOBALVM.vm
+    return vm
+
+
+@contextlib.contextmanager
+def use_vm(vm: BaseVM) -> Iterator[BaseVM]:
+    """Return a context manager making `vm` the VM of the current context, e.g.
+
+        with snp.use_vm(vm):
+            a = snp.array(data, 0)
+
+    The VM is local to the thread or asyncio task that enters the block, so several sessions with
+    their own VMs can run in one process. Arrays stay bound to the VM that created them.
+    """
+    token = _CURRENT_VM.set(vm)
+    try:
+        yield vm
+    finally:
+        _CURRENT_VM.reset(token)
+
+
+def scope() -> Scope:
+    """Return a context manager freeing every array allocated inside it on exit.
+
+    Use `keep` on the scope for the arrays that must outlive it, e.g.
+
+        with snp.scope() as s:
+            loss = s.keep(compute_loss(x, y))
+        print(s.peak_bytes)
+    """
+    return get_vm().scope()
@@ -13,15 +13,18 @@
 # limitations under the License.
 
 from __future__ import annotations
+import asyncio
 import numbers
 from typing import Tuple, Union
 
 import numpy as np
 
-from petace.duet.vm import PETAceBuffer
+from petace.duet.vm import BaseVM, PETAceBuffer
 from .index_utils import index_to_block_index
+from .shape_utils import getitem_shape, matmul_shape
 from .broad_cast import auto_broadcast
 from .init import get_vm
+from .trace import traced
 
 
 class SecureArray:
@@ -36,6 +39,8 @@ class SecureArray:
     ----------
     buffer : PETAceBuffer
         The buffer of the new array.
+    vm : BaseVM
+        The VM holding the buffer, defaults to the VM that created the buffer, then to the current VM.
 
     Attributes
     ----------
@@ -51,9 +56,11 @@ class SecureArray:
     # Higher values are used to suppress the numpy overload priority.
     __array_priority__ = 10000
 
-    def __init__(self, buffer: PETAceBuffer) -> None:
+    def __init__(self, buffer: PETAceBuffer, vm: BaseVM = None) -> None:
         self.buffer = buffer
-        self.vm = get_vm()
+        if vm is None:
+            vm = buffer.vm if buffer.vm is not None else get_vm()
+        self.vm = vm
 
     @property
     def shape(self) -> Tuple[int]:
@@ -98,6 +105,7 @@ class SecureArray:
         """Return repr(self)."""
         return f"SecureArray(shape={self.shape}, dtype={self.dtype}, party={self.vm.party_id()}, addr={self.buffer.reg_addr})"
 
+    @traced
     def reveal_to(self, party: int) -> np.ndarray:
         """
         Reveal a SecureArray to a given party. Another party will get None.
@@ -114,27 +122,68 @@ class SecureArray:
         """
         private = self.vm.new_private(self.shape, self.dtype, None, party)
         self.vm.execute_code("reveal", [self.buffer, private])
-        res = self.vm.to_numpy(private)
+        res = self.vm.to_numpy(private, consume=True)
         self.vm.delete_buffer(private)
         if self.vm.party_id() == party:
             res = res.reshape(self.shape)
         return res
 
-    def to_share(self) -> np.ndarray[np.int64]:
+    async def reveal_to_async(self, party: int) -> np.ndarray:
+        """
+        Reveal a SecureArray to a given party on the worker thread of its VM, see `VM.submit`.
+
+        The event loop keeps running while the parties communicate, e.g.
+        `res = await arr.reveal_to_async(0)`.
+
+        Parameters
+        ----------
+        party : int
+            The party to reveal to.
+
+        Returns
+        -------
+        out: np.ndarray
+            The revealed array, None for the other party.
+        """
+        return await asyncio.wrap_future(self.vm.submit(self.reveal_to, party))
+
+    def to_share(self,
+                 packed: bool = False,
+                 ring_bits: int = None,
+                 out: Union[np.ndarray, memoryview, bytearray] = None) -> np.ndarray[np.int64]:
         """Share the SecureArray to different party.
         You can use snp.fromshare to recover a SecureArray from a numpy share array.
 
+        Parameters
+        ----------
+        packed : bool, default is False
+            Only for np.bool_ arrays. Return the share bit-packed as a 1d np.uint64 array, 64 elements per word,
+            which is 64 times smaller than the unpacked share. Only the returned share is packed, the VM stores
+            and sends bool shares with one int64 per element.
+        ring_bits : int, optional
+            Only for arithmetic arrays. With 32 the share is exported as np.int32 in the 32-bit ring, which
+            halves the exported share but only holds values with `abs(x) < 2 ** 15`. The VM still computes
+            and communicates in the 64-bit ring. Defaults to the ring width set by `VM.set_export_ring_bits`.
+        out : np.ndarray or buffer-protocol object, optional
+            Copy the share into `out` instead of a new array, e.g. straight into a np.memmap.
+            It must have as many elements as the share and its dtype, a raw buffer must have as many bytes.
+
         Returns
         -------
         out: np.ndarray[np.int64]
-            The shared array.
+            The shared array, a copy of the share held by the VM.
         """
-        share = self.vm.to_share(self.buffer)
-        return share.reshape(self.shape)
+        if packed:
+            if self.dtype != np.bool_:
+                raise TypeError(f"packed share only support np.bool_, got {self.dtype}")
+            return self.vm.to_share(self.buffer, packed=True, out=out)
+        share = self.vm.to_share(self.buffer, ring_bits=ring_bits, out=out)
+        return share if out is not None else share.reshape(self.shape)
 
     def __del__(self):
         self.vm.delete_buffer(self.buffer)
 
+    @traced
     def __getitem__(self, index: Union[slice, int]) -> SecureArray:
         if not isinstance(index, (int, slice, tuple)):
             raise IndexError(f"unsupported index type {type(index)}")
@@ -143,14 +192,16 @@ class SecureArray:
         if self.ndim == 1:
             shape = (shape[0], 1)
         row_start, col_start, row_num, col_num = index_to_block_index(index, shape, self.ndim)
-        ret = self.vm.new_share(np.empty(self.shape)[index].shape, self.dtype)
-        self.vm.airth_share_matrix_block(self.buffer.reg_addr, ret.reg_addr, row_start, col_start, row_num, col_num)
+        ret = self.vm.new_share(getitem_shape(index, self.shape), self.dtype)
+        block = self.vm.bool_share_matrix_block if self.dtype == np.bool_ else self.vm.airth_share_matrix_block
+        block(self.buffer.reg_addr, ret.reg_addr, row_start, col_start, row_num, col_num)
 
         # transform shape of 1d matrix to (1, n) in cpp
         if len(ret.shape) == 1 and self._debug_shape()[0] != 1:
             ret = self.vm.inner_flatten(ret)
         return SecureArray(ret)
 
+    @traced
     def __setitem__(self, key: Union[slice, int, tuple], value: Union[numbers.Number, np.ndarray, SecureArray]) -> None:
         if not isinstance(key, (int, slice, tuple)):
             raise IndexError(f"unsupported index type {type(key)}")
@@ -183,18 +234,42 @@ class SecureArray:
         self.vm.delete_buffer(row_number_public)
         self.vm.delete_buffer(col_number_public)
 
-    def __operator(self, arr1: SecureArray, arr2: Union[SecureArray, np.ndarray], operation: str) -> SecureArray:
-        if operation in {"lt", "gt", "ge", "eq", "ne", "and", "or", "xor"}:
-            res_type = np.bool_
+    @staticmethod
+    def __is_integral(arr: Union[SecureArray, np.ndarray]) -> bool:
+        return np.issubdtype(arr.dtype, np.integer)
+
+    def __result_dtype(self, arr1: SecureArray, arr2: Union[SecureArray, np.ndarray], operation: str) -> np.dtype:
+        if operation in {"lt", "gt", "ge", "eq", "ne", "and", "or", "xor"} or arr1.dtype == np.bool_:
+            return np.bool_
+        if operation != "div" and self.__is_integral(arr1) and self.__is_integral(arr2):
+            return np.int64
+        return np.float64
+
+    def __share_public(self, data: np.ndarray) -> SecureArray:
+        """Share a public array from party 0, integers are kept as np.int64."""
+        if self.dtype == np.bool_:
+            dtype = np.bool_
+        elif self.__is_integral(data):
+            dtype = np.int64
         else:
-            res_type = self.dtype
+            dtype = np.float64
+        return SecureArray(self.vm.make_share(data, data.shape, 0, dtype))
+
+    def __scale(self, factor: np.ndarray) -> SecureArray:
+        """Multiply by public integers on the local shares, which needs neither communication nor truncation."""
+        share_res = self.vm.new_share(self.shape, self.dtype)
+        self.vm.scale_airth_share_matrix(factor, self.buffer.reg_addr, share_res.reg_addr)
+        return SecureArray(share_res)
+
+    def __operator(self, arr1: SecureArray, arr2: Union[SecureArray, np.ndarray], operation: str) -> SecureArray:
+        res_type = self.__result_dtype(arr1, arr2, operation)
         if arr1.shape != arr2.shape:
             raise ValueError(f"Cannot {operation} two arrays with different shape")
         share_res = self.vm.new_share(arr1.shape, res_type)
         if isinstance(arr2, SecureArray):
             self.vm.execute_code(operation, [arr1.buffer, arr2.buffer, share_res])
         elif isinstance(arr2, np.ndarray):
-            arr2 = arr2.astype(self.dtype)
+            arr2 = arr2.astype(np.bool_ if arr1.dtype == np.bool_ else np.float64, copy=False)
             public = self.vm.new_public(arr2)
             self.vm.execute_code(operation, [arr1.buffer, public, share_res])
             self.vm.delete_buffer(public)
@@ -202,97 +277,140 @@ class SecureArray:
             raise TypeError(f"Unsupported data type {type(arr2)}")
         return SecureArray(share_res)
 
+    @traced
     def __add__(self, other: Union[numbers.Number, np.ndarray, SecureArray]) -> SecureArray:
         """Return self+other."""
         self.__check_type(other, (numbers.Number, np.ndarray, SecureArray))
         arr1, arr2 = auto_broadcast(self, other)
         return self.__operator(arr1, arr2, "add")
 
+    @traced
     def __sub__(self, other: Union[numbers.Number, np.ndarray, SecureArray]) -> SecureArray:
         """Return self-other."""
         self.__check_type(other, (numbers.Number, np.ndarray, SecureArray))
         arr1, arr2 = auto_broadcast(self, other)
         return self.__operator(arr1, arr2, "sub")
 
+    @traced
     def __mul__(self, other: Union[numbers.Number, np.ndarray, SecureArray]) -> SecureArray:
-        """Return self*other."""
+        """Return self*other.
+
+        Products by public integers run on the local shares without truncation. Other products, including those
+        of two secret np.int64 arrays, use the truncating fixed-point multiplication, np.int64 products must have
+        `abs(x * y) < 2 ** VM.INT_BITS`.
+        """
         self.__check_type(other, (numbers.Number, np.ndarray, SecureArray))
         arr1, arr2 = auto_broadcast(self, other)
+        if isinstance(arr2, np.ndarray) and self.__is_integral(arr2) and self.dtype != np.bool_:
+            return arr1.__scale(arr2)
         return self.__operator(arr1, arr2, "mul")
 
+    @traced
     def __radd__(self, other: Union[numbers.Number, np.ndarray]) -> SecureArray:
         """Return other + self."""
         self.__check_type(other, (numbers.Number, np.ndarray))
         return self + other
 
+    @traced
     def __rsub__(self, other: Union[numbers.Number, np.ndarray]) -> SecureArray:
         """Return other-self."""
         self.__check_type(other, (numbers.Number, np.ndarray))
         return -self + other
 
+    @traced
     def __rmul__(self, other: Union[numbers.Number, np.ndarray]) -> SecureArray:
         """Return other*self."""
         self.__check_type(other, (numbers.Number, np.ndarray))
         return self * other
 
+    @traced
     def __rtruediv__(self, other: Union[numbers.Number, np.ndarray]) -> SecureArray:
         """Return other/self
         """
         self.__check_type(other, (numbers.Number, np.ndarray))
         arr1, arr2 = auto_broadcast(self, other)
         if isinstance(arr2, np.ndarray):
-            arr2 = SecureArray(self.vm.make_share(arr2, arr2.shape, 0, self.dtype))
+            arr2 = self.__share_public(arr2)
         return arr2 / arr1
 
+    @traced
     def __truediv__(self, other: Union[numbers.Number, np.ndarray, SecureArray]) -> SecureArray:
         """Return self/other."""
         self.__check_type(other, (numbers.Number, np.ndarray, SecureArray))
         arr1, arr2 = auto_broadcast(self, other)
         return self.__operator(arr1, arr2, "div")
 
+    @traced
     def __lt__(self, other: Union[numbers.Number, np.ndarray, SecureArray]) -> SecureArray:
         """Return self<other."""
         self.__check_type(other, (numbers.Number, np.ndarray, SecureArray))
         arr1, arr2 = auto_broadcast(self, other)
+        if self.__is_integral(arr1) and self.__is_integral(arr2):
+            # integers are compared with a margin of 0.5, so fixed-point errors never flip the result
+            arr1 = arr1 + 0.5
         return self.__operator(arr1, arr2, "lt")
 
+    @traced
     def __gt__(self, other: Union[numbers.Number, np.ndarray, SecureArray]) -> SecureArray:
         """Return self>other."""
         self.__check_type(other, (numbers.Number, np.ndarray, SecureArray))
         arr1, arr2 = auto_broadcast(self, other)
+        if self.__is_integral(arr1) and self.__is_integral(arr2):
+            arr2 = arr2 + 0.5
         return self.__operator(arr1, arr2, "gt")
 
+    @traced
     def __eq__(self, other: Union[numbers.Number, np.ndarray, SecureArray]) -> SecureArray:
         """Return self==other."""
         self.__check_type(other, (numbers.Number, np.ndarray, SecureArray))
         arr1, arr2 = auto_broadcast(self, other)
+        if self.__is_integral(arr1) and self.__is_integral(arr2):
+            return self.__is_zero(arr1 - arr2)
         return self.__operator(arr1, arr2, "eq")
 
+    def __is_zero(self, diff: SecureArray) -> SecureArray:
+        """Whether the integers of `diff` are 0, i.e. -0.5 < diff < 0.5 despite the fixed-point error.
+
+        Both bounds are stacked into one comparison, so it costs the rounds of a single comparison and an and.
+        """
+        row = diff.reshape((1, diff.size))
+        lower, upper = row + 0.5, 0.5 - row
+        bounds = SecureArray(self.vm.vstack([lower.buffer, upper.buffer], (2, diff.size)))
+        inside = bounds > 0
+        return (inside[0] & inside[1]).reshape(diff.shape)
+
+    @traced
     def __ne__(self, other: Union[numbers.Number, np.ndarray, SecureArray]) -> SecureArray:
         """Return self!=other."""
         self.__check_type(other, (numbers.Number, np.ndarray, SecureArray))
         return ~(self == other)
 
+    @traced
     def __le__(self, other: Union[numbers.Number, np.ndarray, SecureArray]) -> SecureArray:
         """Return self<=other."""
         self.__check_type(other, (numbers.Number, np.ndarray, SecureArray))
         arr1, arr2 = auto_broadcast(self, other)
         if isinstance(arr2, np.ndarray):
-            arr2 = SecureArray(self.vm.make_share(arr2, arr2.shape, 0, self.dtype))
+            arr2 = self.__share_public(arr2)
         return arr2 >= arr1
 
+    @traced
     def __ge__(self, other: Union[numbers.Number, np.ndarray, SecureArray]) -> SecureArray:
         """Return self>=other."""
         self.__check_type(other, (numbers.Number, np.ndarray, SecureArray))
         arr1, arr2 = auto_broadcast(self, other)
         if isinstance(arr2, np.ndarray):
-            arr2 = SecureArray(self.vm.make_share(arr2, arr2.shape, 0, self.dtype))
+            arr2 = self.__share_public(arr2)
+        if self.__is_integral(arr1) and self.__is_integral(arr2):
+            arr1 = arr1 + 0.5
         return self.__operator(arr1, arr2, "ge")
 
+    @traced
     def __neg__(self) -> SecureArray:
         """-self"""
         return self * -1
 
+    @traced
     def __invert__(self) -> SecureArray:
         """~self"""
         if not self.dtype == np.bool_:
@@ -301,12 +419,14 @@ class SecureArray:
         self.vm.execute_code("not", [self.buffer, ret])
         return SecureArray(ret)
 
+    @traced
     def quick_sort(self) -> None:
         """Sort all elements inplace and not change shape.
         Equal to `np.sort(data, axis=None).reshape(data.shape)`
         """
         self.vm.execute_code("quick_sort", [self.buffer])
 
+    @traced
     def quick_sort_by_column(self, column_index: int) -> SecureArray:
         """Sort all elements according to the column_index.
         Equal to `data[np.argsort(data[:, column_index])]`
@@ -318,45 +438,82 @@ class SecureArray:
         self.vm.delete_buffer(column_index)
         return SecureArray(ret)
 
+    @traced
     def __and__(self, other: Union[bool, np.ndarray, SecureArray]) -> SecureArray:
         """Return self & other."""
         self.__check_type(other, (bool, np.ndarray, SecureArray))
         arr1, arr2 = auto_broadcast(self, other)
         if isinstance(arr2, np.ndarray):
-            arr2 = SecureArray(self.vm.make_share(arr2, arr2.shape, 0, self.dtype))
+            arr2 = self.__share_public(arr2)
         return self.__operator(arr1, arr2, "and")
 
+    @traced
     def __or__(self, other: Union[bool, np.ndarray, SecureArray]) -> SecureArray:
         """Return self | other."""
         self.__check_type(other, (bool, np.ndarray, SecureArray))
         arr1, arr2 = auto_broadcast(self, other)
         if isinstance(arr2, np.ndarray):
-            arr2 = SecureArray(self.vm.make_share(arr2, arr2.shape, 0, self.dtype))
+            arr2 = self.__share_public(arr2)
         return self.__operator(arr1, arr2, "or")
 
+    @traced
     def __xor__(self, other: Union[bool, np.ndarray, SecureArray]) -> SecureArray:
         """Return self ^ other."""
         self.__check_type(other, (bool, np.ndarray, SecureArray))
         arr1, arr2 = auto_broadcast(self, other)
         if isinstance(arr2, np.ndarray):
-            arr2 = SecureArray(self.vm.make_share(arr2, arr2.shape, 0, self.dtype))
+            arr2 = self.__share_public(arr2)
         return self.__operator(arr1, arr2, "xor")
 
+    @traced
     def __rand__(self, other: Union[bool, np.ndarray]) -> SecureArray:
         """Return other & self."""
         self.__check_type(other, (bool, np.ndarray))
         return self & other
 
+    @traced
     def __ror__(self, other: Union[bool, SecureArray]) -> SecureArray:
         """Return self | other."""
         self.__check_type(other, (bool, np.ndarray))
         return self | other
 
+    @traced
     def __rxor__(self, other: Union[bool, SecureArray]) -> SecureArray:
         """Return self ^ other."""
         self.__check_type(other, (bool, np.ndarray))
         return self ^ other
 
+    @traced
+    def astype(self, dtype: np.dtype) -> SecureArray:
+        """Copy of the array, cast to a specified type.
+
+        Bool arrays are converted to arithmetic shares of 0 and 1, which is needed e.g. before
+        using a comparison result in arithmetic. Arithmetic arrays are converted to bool with `self != 0`.
+        Casting np.float64 to np.int64 is not supported, as rounding a secret value is not free.
+        """
+        if dtype not in (np.float64, np.int64, np.bool_):
+            raise TypeError(f"Unsupported dtype: {dtype}")
+        if dtype == self.dtype:
+            return self.copy()
+        if dtype == np.bool_:
+            return self != 0
+        if self.dtype == np.int64:
+            return self + 0.0
+        if self.dtype == np.float64:
+            raise TypeError("Cannot cast np.float64 to np.int64")
+        # zero shares on both parties share 0, adding a public 1 makes the shares of 1, neither is communicated
+        zeros = self.vm.new_share(self.shape, dtype)
+        self.vm.set_airth_share_zeros(*self.vm.matrix_shape(self.shape), zeros.reg_addr)
+        ones = self.vm.new_share(self.shape, dtype)
+        public = self.vm.new_public(np.ones(self.shape))
+        self.vm.execute_code("add", [zeros, public, ones])
+        self.vm.delete_buffer(public)
+        ret = self.vm.new_share(self.shape, dtype)
+        self.vm.execute_code("multiplexer", [self.buffer, zeros, ones, ret])
+        self.vm.delete_buffer(ones)
+        self.vm.delete_buffer(zeros)
+        return SecureArray(ret)
+
     def __copy__(self) -> SecureArray:
         """Used if copy.copy is called on an array. Returns a copy of the array.
         """
@@ -367,19 +524,20 @@ class SecureArray:
         """
         return self + 0
 
+    @traced
     def __matmul__(self, other: Union[np.ndarray, SecureArray]) -> SecureArray:
         """return self @ other
         """
         self.__check_type(other, (np.ndarray, SecureArray))
-        res_shape = (np.ones(self.shape) @ np.ones(other.shape)).shape
-        share_res = self.vm.new_share(res_shape, self.dtype)
+        res_shape = matmul_shape(self.shape, other.shape)
+        share_res = self.vm.new_share(res_shape, self.__result_dtype(self, other, "mat_mul"))
         if other.ndim == 1:
             other = other.reshape((-1, 1))
 
         if isinstance(other, SecureArray):
             self.vm.execute_code("mat_mul", [self.buffer, other.buffer, share_res])
         else:
-            other = other.astype(self.dtype)
+            other = other.astype(np.float64, copy=False)
             public = self.vm.new_public(other)
             self.vm.execute_code("mat_mul", [self.buffer, public, share_res])
             self.vm.delete_buffer(public)
@@ -388,15 +546,17 @@ class SecureArray:
             share_res = self.vm.inner_flatten(share_res)
         return SecureArray(share_res)
 
+    @traced
     def __rmatmul__(self, other: np.ndarray) -> SecureArray:
         """return other @ self
         """
         self.__check_type(other, np.ndarray)
-        res_shape = (np.ones(other.shape) @ np.ones(self.shape)).shape
-        other = other.astype(self.dtype)
+        res_shape = matmul_shape(other.shape, self.shape)
+        res_type = self.__result_dtype(self, other, "mat_mul")
+        other = other.astype(np.float64, copy=False)
         if other.ndim == 1 and self.ndim == 1:
             return self @ other.reshape((-1, 1))
-        share_res = self.vm.new_share(res_shape, self.dtype)
+        share_res = self.vm.new_share(res_shape, res_type)
         if self.ndim == 1:
             other = other.transpose()
             public = self.vm.new_public(other)
@@ -408,6 +568,7 @@ class SecureArray:
         self.vm.delete_buffer(public)
         return SecureArray(share_res)
 
+    @traced
     def reshape(self, new_shape) -> SecureArray:
         """
         Gives a new shape to an array without changing its data.
@@ -468,6 +629,7 @@ class SecureArray:
         """
         return self.reshape(-1)
 
+    @traced
     def transpose(self) -> SecureArray:
         """Returns a copy of the array with axes transposed.
         """
@@ -477,6 +639,7 @@ class SecureArray:
         self.vm.execute_code("transpose", [self.buffer, ret])
         return SecureArray(ret)
 
+    @traced
     def resize(self, new_shape) -> SecureArray:
         """Change shape and size of array and return a copy.
         """
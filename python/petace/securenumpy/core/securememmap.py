@@ -0,0 +1,304 @@
+# Copyright 2023 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from __future__ import annotations
+import os
+import numbers
+import operator
+import tempfile
+from typing import Callable, Iterator, Tuple, Union
+
+import numpy as np
+
+from .securearray import SecureArray
+from .init import get_vm
+
+Operand = Union[numbers.Number, np.ndarray, SecureArray, "SecureMemmap"]
+
+
+class SecureMemmap:
+    """
+    A SecureArray whose local share is stored in a memory-mapped file.
+
+    Only one tile of rows is loaded into the VM at a time, so the array can be much larger than memory.
+    Element-wise operators run the existing kernels tile by tile and write the result to a new
+    temporary share file next to this one. Sums are linear, so they are computed directly on the
+    local shares without loading any tile into the VM.
+
+    Each party opens the file holding its own share, both parties must use the same shape,
+    dtype and tile size.
+
+    Parameters
+    ----------
+    filename : str or PathLike
+        The share file of this party.
+    dtype : dtype object
+        Data-type of the array's elements, {np.float64, np.int64, np.bool_}.
+    mode : {'r+', 'r', 'w+', 'c'}, default is 'r+'
+        The file is opened in this mode, see `np.memmap`.
+    shape : tuple of ints, optional
+        The shape of the array, required when creating a file with mode 'w+'.
+    tile_rows : int, optional
+        Number of rows loaded into the VM at a time.
+
+    Attributes
+    ----------
+    share : np.memmap
+        The local share, np.int64 for all dtypes.
+    """
+    DEFAULT_TILE_ROWS = 1 << 16
+
+    def __init__(self,
+                 filename: Union[str, os.PathLike],
+                 dtype: np.dtype,
+                 mode: str = "r+",
+                 shape: Tuple[int] = None,
+                 tile_rows: int = None) -> None:
+        if dtype not in (np.float64, np.int64, np.bool_):
+            raise TypeError(f"Unsupported dtype: {dtype}")
+        if shape is not None and len(shape) not in (1, 2):
+            raise ValueError(f"Only support 1d or 2d array, got {len(shape)} dimension")
+        self.share = np.memmap(filename, dtype=np.int64, mode=mode, shape=shape)
+        if self.share.ndim not in (1, 2):
+            raise ValueError(f"Only support 1d or 2d array, got {self.share.ndim} dimension")
+        self.filename = filename
+        self.tile_rows = tile_rows or self.DEFAULT_TILE_ROWS
+        self._dtype = dtype
+        self._temporary = False
+
+    @classmethod
+    def from_array(cls, arr: SecureArray, filename: Union[str, os.PathLike], tile_rows: int = None) -> SecureMemmap:
+        """Write the share of a SecureArray to a new share file."""
+        if arr.ndim not in (1, 2):
+            raise ValueError(f"Only support 1d or 2d array, got {arr.ndim} dimension")
+        ret = cls(filename, arr.dtype, "w+", arr.shape, tile_rows)
+        arr.to_share(ring_bits=64, out=ret.share)
+        return ret
+
+    @classmethod
+    def _temp_like(cls, like: SecureMemmap, dtype: np.dtype, shape: Tuple[int]) -> SecureMemmap:
+        fd, filename = tempfile.mkstemp(suffix=".share", dir=os.path.dirname(os.path.abspath(like.filename)))
+        os.close(fd)
+        ret = cls(filename, dtype, "w+", shape, like.tile_rows)
+        ret._temporary = True
+        return ret
+
+    def __del__(self):
+        if getattr(self, "_temporary", False):
+            del self.share
+            os.remove(self.filename)
+
+    @property
+    def shape(self) -> Tuple[int]:
+        """Tuple of array dimensions."""
+        return self.share.shape
+
+    @property
+    def ndim(self) -> int:
+        """Number of array dimensions."""
+        return self.share.ndim
+
+    @property
+    def dtype(self) -> np.dtype:
+        """Data-type of the array's elements."""
+        return self._dtype
+
+    @property
+    def size(self) -> int:
+        """Number of elements in the array."""
+        return self.share.size
+
+    def __len__(self) -> int:
+        """Return len(self)."""
+        return self.shape[0]
+
+    def __repr__(self):
+        """Return repr(self)."""
+        return f"SecureMemmap(shape={self.shape}, dtype={self.dtype}, filename={self.filename})"
+
+    def __getitem__(self, index: Union[int, slice, tuple]) -> SecureArray:
+        """Load the block selected by `index` into the VM."""
+        if not isinstance(index, (int, slice, tuple)):
+            raise IndexError(f"unsupported index type {type(index)}")
+        share = np.ascontiguousarray(self.share[index])
+        return SecureArray(get_vm().new_share(share.shape, self.dtype, share))
+
+    def __setitem__(self, index: Union[int, slice, Tuple[Union[int, slice]]], value: SecureArray) -> None:
+        """Store a SecureArray into the rows, or the block of rows and columns, selected by `index`."""
+        keys = index if isinstance(index, tuple) else (index,)
+        if len(keys) > self.ndim or not all(isinstance(key, (int, slice)) for key in keys):
+            raise IndexError(f"unsupported index {index}, only rows and columns can be selected")
+        if not isinstance(value, SecureArray):
+            raise TypeError(f"Expect SecureArray, got {type(value)}")
+        if value.dtype != self.dtype:
+            raise TypeError(f"Expect {self.dtype}, got {value.dtype}")
+        target = self.share[(*keys, ...)]
+        if value.shape != target.shape:
+            raise ValueError(f"could not broadcast input array from shape {value.shape} into shape {target.shape}")
+        value.to_share(ring_bits=64, out=target)
+
+    def flush(self) -> None:
+        """Write any changes in the share to the file."""
+        self.share.flush()
+
+    def tile_slices(self) -> Iterator[slice]:
+        """Slices of the rows of every tile."""
+        for start in range(0, self.shape[0], self.tile_rows):
+            yield slice(start, min(start + self.tile_rows, self.shape[0]))
+
+    def tiles(self) -> Iterator[Tuple[slice, SecureArray]]:
+        """Load the tiles one by one, yield the rows and the SecureArray of every tile."""
+        for rows in self.tile_slices():
+            yield rows, self[rows]
+
+    def map(self, func: Callable[..., SecureArray], *others: Operand) -> SecureMemmap:
+        """
+        Apply `func` tile by tile.
+
+        Parameters
+        ----------
+        func : callable
+            Called as `func(tile, *other_tiles)` for every tile, it must return a SecureArray with
+            as many rows as the tile.
+        others : number, np.ndarray, SecureArray or SecureMemmap
+            Additional operands. Arrays must have the same number of rows as this array and are sliced
+            into the same tiles, numbers are passed as they are.
+
+        Returns
+        -------
+        out : SecureMemmap
+            The result, stored in a temporary share file removed when the object is deleted.
+        """
+        for other in others:
+            if not isinstance(other, numbers.Number) and len(other) != len(self):
+                raise ValueError(f"Shape mismatch: {self.shape} and {other.shape}")
+        ret = None
+        for rows, tile in self.tiles():
+            args = [other if isinstance(other, numbers.Number) else other[rows] for other in others]
+            res = func(tile, *args)
+            if ret is None:
+                ret = self._temp_like(self, res.dtype, self.shape[:1] + res.shape[1:])
+            ret[rows] = res
+        return ret
+
+    def __binary(self, other: Operand, func: Callable) -> SecureMemmap:
+        if isinstance(other, (np.ndarray, SecureArray, SecureMemmap)) and other.shape != self.shape:
+            raise ValueError(f"Shape mismatch: {self.shape} and {other.shape}")
+        return self.map(func, other)
+
+    def __add__(self, other: Operand) -> SecureMemmap:
+        """Return self+other."""
+        return self.__binary(other, operator.add)
+
+    def __radd__(self, other: Operand) -> SecureMemmap:
+        """Return other+self."""
+        return self.__binary(other, operator.add)
+
+    def __sub__(self, other: Operand) -> SecureMemmap:
+        """Return self-other."""
+        return self.__binary(other, operator.sub)
+
+    def __rsub__(self, other: Operand) -> SecureMemmap:
+        """Return other-self."""
+        return self.__binary(other, lambda tile, value: value - tile)
+
+    def __mul__(self, other: Operand) -> SecureMemmap:
+        """Return self*other."""
+        return self.__binary(other, operator.mul)
+
+    def __rmul__(self, other: Operand) -> SecureMemmap:
+        """Return other*self."""
+        return self.__binary(other, operator.mul)
+
+    def __truediv__(self, other: Operand) -> SecureMemmap:
+        """Return self/other."""
+        return self.__binary(other, operator.truediv)
+
+    def __neg__(self) -> SecureMemmap:
+        """Return -self."""
+        return self.map(operator.neg)
+
+    def __lt__(self, other: Operand) -> SecureMemmap:
+        """Return self<other."""
+        return self.__binary(other, operator.lt)
+
+    def __le__(self, other: Operand) -> SecureMemmap:
+        """Return self<=other."""
+        return self.__binary(other, operator.le)
+
+    def __gt__(self, other: Operand) -> SecureMemmap:
+        """Return self>other."""
+        return self.__binary(other, operator.gt)
+
+    def __ge__(self, other: Operand) -> SecureMemmap:
+        """Return self>=other."""
+        return self.__binary(other, operator.ge)
+
+    def __and__(self, other: Operand) -> SecureMemmap:
+        """Return self&other."""
+        return self.__binary(other, operator.and_)
+
+    def __or__(self, other: Operand) -> SecureMemmap:
+        """Return self|other."""
+        return self.__binary(other, operator.or_)
+
+    def astype(self, dtype: np.dtype) -> SecureMemmap:
+        """Copy of the array, cast to a specified type."""
+        return self.map(lambda tile: tile.astype(dtype))
+
+    def __sum_shares(self, axis: int) -> np.ndarray:
+        arithmetic = self if self.dtype != np.bool_ else self.astype(np.float64)
+        total = 0
+        for rows in self.tile_slices():
+            # additive shares are summed locally, the int64 overflow is the modular reduction of the ring
+            total = total + np.sum(arithmetic.share[rows], axis=axis, dtype=np.int64)
+        return np.asarray(total, dtype=np.int64)
+
+    def sum(self, axis: int = None) -> Union[SecureArray, SecureMemmap]:
+        """
+        Sum of array elements over a given axis.
+
+        Parameters
+        ----------
+        axis : None or int {0, 1}, optional
+            Axis along which a sum is performed. The default, axis=None, will sum all of the elements.
+
+        Returns
+        -------
+        sum_along_axis : SecureArray or SecureMemmap
+            A SecureArray for axis None and 0, a SecureMemmap with one element per row for axis 1.
+            Bool arrays are summed as np.float64.
+        """
+        if axis is not None and not 0 <= axis < self.ndim:
+            raise ValueError(f"axis {axis} is out of bounds for array of dimension {self.ndim}")
+        dtype = np.float64 if self.dtype == np.bool_ else self.dtype
+        if axis == 1:
+            ret = self._temp_like(self, dtype, self.shape[:1])
+            source = self if self.dtype != np.bool_ else self.astype(np.float64)
+            for rows in self.tile_slices():
+                ret.share[rows] = np.sum(source.share[rows], axis=1, dtype=np.int64)
+            return ret
+        share = self.__sum_shares(axis)
+        return SecureArray(get_vm().new_share(share.shape, dtype, share))
+
+    def mean(self, axis: int = None) -> Union[SecureArray, SecureMemmap]:
+        """Compute the arithmetic mean along the specified axis."""
+        total = self.sum(axis)
+        return total / (self.size if axis is None else self.shape[axis])
+
+    def reveal_to(self, party: int) -> np.ndarray:
+        """Reveal the whole array to a given party, another party will get None."""
+        tiles = [tile.reveal_to(party) for _, tile in self.tiles()]
+        if get_vm().party_id() != party:
+            return None
+        return np.concatenate(tiles).reshape(self.shape)
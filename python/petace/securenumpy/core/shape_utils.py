@@ -0,0 +1,115 @@
+# Copyright 2023 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Shape inference without allocating arrays.
+
+Every function here follows the numpy semantics of the corresponding operation
+for arrays of at most two dimensions, but only does arithmetic on shape tuples.
+"""
+
+from typing import List, Tuple, Union
+
+
+def matmul_shape(a: Tuple[int], b: Tuple[int]) -> Tuple[int]:
+    """Return the shape of `a @ b`.
+    """
+    if len(a) == 0 or len(b) == 0:
+        raise ValueError("matmul: Input operand does not have enough dimensions")
+    if len(a) > 2 or len(b) > 2:
+        raise ValueError("matmul only support 1-d or 2-d arrays")
+    inner_a = a[-1]
+    inner_b = b[0] if len(b) == 1 else b[-2]
+    if inner_a != inner_b:
+        raise ValueError(f"matmul: Input operand 1 has a mismatch in its core dimension 0 (size {inner_b} "
+                         f"is different from {inner_a})")
+    out = []
+    if len(a) == 2:
+        out.append(a[0])
+    if len(b) == 2:
+        out.append(b[1])
+    return tuple(out)
+
+
+def getitem_shape(index: Union[int, slice, tuple], shape: Tuple[int]) -> Tuple[int]:
+    """Return the shape of `arr[index]` for an array of shape `shape`.
+
+    Only int and slice indices are supported, the same as SecureArray indexing.
+    """
+    if not isinstance(index, tuple):
+        index = (index,)
+    if len(index) > len(shape):
+        raise IndexError(f"too many indices for array: array is {len(shape)}-dimensional, "
+                         f"but {len(index)} were indexed")
+    out = []
+    for axis, (idx, limit) in enumerate(zip(index, shape)):
+        if isinstance(idx, int):
+            if idx >= limit or idx < -limit:
+                raise IndexError(f"index {idx} is out of bounds for axis {axis} with size {limit}")
+        elif isinstance(idx, slice):
+            out.append(len(range(*idx.indices(limit))))
+        else:
+            raise IndexError(f"unsupported index type {type(idx)}")
+    out.extend(shape[len(index):])
+    return tuple(out)
+
+
+def _atleast_1d(shape: Tuple[int]) -> Tuple[int]:
+    return shape if len(shape) >= 1 else (1,)
+
+
+def _atleast_2d(shape: Tuple[int]) -> Tuple[int]:
+    if len(shape) == 0:
+        return (1, 1)
+    if len(shape) == 1:
+        return (1, shape[0])
+    return shape
+
+
+def concatenate_shape(shapes: List[Tuple[int]], axis: int = 0) -> Tuple[int]:
+    """Return the shape of `np.concatenate(arrays, axis)`.
+    """
+    if len(shapes) == 0:
+        raise ValueError("need at least one array to concatenate")
+    first = shapes[0]
+    if len(first) == 0:
+        raise ValueError("zero-dimensional arrays cannot be concatenated")
+    if not 0 <= axis < len(first):
+        raise ValueError(f"axis {axis} is out of bounds for array of dimension {len(first)}")
+    total = 0
+    for i, shape in enumerate(shapes):
+        if len(shape) != len(first):
+            raise ValueError("all the input array dimensions except for the concatenation axis must match exactly, "
+                             f"but along dimension 0, the array at index 0 has {len(first)} dimension(s) "
+                             f"and the array at index {i} has {len(shape)} dimension(s)")
+        for dim, (size, expect) in enumerate(zip(shape, first)):
+            if dim != axis and size != expect:
+                raise ValueError("all the input array dimensions except for the concatenation axis must match "
+                                 f"exactly, but along dimension {dim}, the array at index 0 has size {expect} "
+                                 f"and the array at index {i} has size {size}")
+        total += shape[axis]
+    return first[:axis] + (total,) + first[axis + 1:]
+
+
+def vstack_shape(shapes: List[Tuple[int]]) -> Tuple[int]:
+    """Return the shape of `np.vstack(arrays)`.
+    """
+    return concatenate_shape([_atleast_2d(shape) for shape in shapes], 0)
+
+
+def hstack_shape(shapes: List[Tuple[int]]) -> Tuple[int]:
+    """Return the shape of `np.hstack(arrays)`.
+    """
+    shapes = [_atleast_1d(shape) for shape in shapes]
+    if len(shapes) > 0 and len(shapes[0]) == 1:
+        return concatenate_shape(shapes, 0)
+    return concatenate_shape(shapes, 1)
@@ -0,0 +1,52 @@
+# Copyright 2023 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import functools
+from typing import Callable, Union
+
+from petace.duet.trace import Tracer
+from petace.duet.vm import BaseVM
+from .init import current_vm
+
+
+def _vm_of(args: tuple) -> Union[BaseVM, None]:
+    """The VM of the first SecureArray argument, or of the first array of a list argument."""
+    for arg in args:
+        if isinstance(arg, (list, tuple)) and len(arg) > 0:
+            arg = arg[0]
+        vm = getattr(arg, "vm", None)
+        if isinstance(vm, BaseVM):
+            return vm
+    return current_vm()
+
+
+def traced(func: Callable) -> Callable:
+    """Add a span for every call of `func` to the trace of the VM of its arrays, while it is tracing.
+
+    The VM is the one of the first SecureArray argument, the current VM if there is none.
+    """
+    name = func.__qualname__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if Tracer.running == 0:
+            return func(*args, **kwargs)
+        vm = _vm_of(args)
+        tracer = vm.tracer if vm is not None else None
+        if tracer is None:
+            return func(*args, **kwargs)
+        with tracer.span(name, "securenumpy"):
+            return func(*args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,165 @@
+# Copyright 2023 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+from petace.duet.abstract_vm import AbstractVM, EstimatedInstruction
+from petace.duet.cost_model import Cost
+from .core import SecureArray
+from .core.init import use_vm
+
+
+class AbstractArray:
+    """The shape and dtype of a SecureArray, standing for an input of `explain`.
+
+    Parameters
+    ----------
+    shape : tuple of ints
+        Shape of the array.
+    dtype : np.dtype
+        Data type of the array, np.float64, np.int64 or np.bool_.
+    """
+
+    def __init__(self, shape: Tuple[int], dtype: np.dtype = np.float64) -> None:
+        self.shape = tuple(shape)
+        self.dtype = dtype
+
+    def __repr__(self):
+        return f"AbstractArray(shape={self.shape}, dtype={np.dtype(self.dtype).name})"
+
+
+class Explanation:
+    """Estimated cost of a function, returned by `explain`.
+
+    Attributes
+    ----------
+    instructions : list of EstimatedInstruction
+        Every instruction the function executes and every raw message it sends or receives, in order.
+    total : Cost
+        The sum of the instruction costs. Instructions run one after another, so rounds add up.
+    peak_bytes : int
+        Peak size of the registers, 8 bytes per element, see `VM.memory_stats`.
+    result : object
+        What the function returned, SecureArrays without data.
+    """
+
+    def __init__(self, instructions: List[EstimatedInstruction], peak_bytes: int, result: object) -> None:
+        self.instructions = instructions
+        self.peak_bytes = peak_bytes
+        self.result = result
+        self.total = Cost()
+        for inst in instructions:
+            self.total = self.total + inst.cost
+
+    def by_op(self) -> Dict[str, Dict[str, int]]:
+        """Aggregate the costs per op, a dict from op name to a dict with "count", "rounds", "bytes_sent"
+        and "local_ops".
+        """
+        ret = {}
+        for inst in self.instructions:
+            stats = ret.setdefault(inst.op, {"count": 0, "rounds": 0, "bytes_sent": 0, "local_ops": 0})
+            stats["count"] += 1
+            stats["rounds"] += inst.cost.rounds
+            stats["bytes_sent"] += inst.cost.bytes_sent
+            stats["local_ops"] += inst.cost.local_ops
+        return ret
+
+    def by_call_site(self) -> Dict[str, Cost]:
+        """Aggregate the costs per line of the explained program."""
+        ret = {}
+        for inst in self.instructions:
+            ret[inst.call_site] = ret.get(inst.call_site, Cost()) + inst.cost
+        return ret
+
+    def table(self) -> str:
+        """Format the per-op costs and the total as a text table sorted by rounds."""
+        lines = [f"{'op':<32}{'count':>10}{'rounds':>10}{'sent(B)':>16}{'local_ops':>16}"]
+        for op, stats in sorted(self.by_op().items(), key=lambda item: item[1]["rounds"], reverse=True):
+            lines.append(f"{op:<32}{stats['count']:>10}{stats['rounds']:>10}{stats['bytes_sent']:>16}"
+                         f"{stats['local_ops']:>16}")
+        lines.append(f"{'total':<32}{len(self.instructions):>10}{self.total.rounds:>10}{self.total.bytes_sent:>16}"
+                     f"{self.total.local_ops:>16}")
+        lines.append(f"peak register bytes: {self.peak_bytes}")
+        return "\n".join(lines)
+
+    def __str__(self):
+        return self.table()
+
+
+def _bind(vm: AbstractVM, arg: object) -> object:
+    if isinstance(arg, AbstractArray):
+        return SecureArray(vm.new_share(arg.shape, arg.dtype))
+    return arg
+
+
+def explain(fn: Callable, *args, party: int = 0, **kwargs) -> Explanation:
+    """
+    Estimate the rounds, communication and local compute of `fn` without running any protocol.
+
+    `fn` is run on an `AbstractVM`: every `AbstractArray` argument becomes a SecureArray of its shape and
+    dtype without data, other arguments are passed as they are. The instructions are recorded and costed
+    by `petace.duet.cost_model`. Both parties are run in two threads on a pair of AbstractVMs exchanging
+    their messages, so the shapes of the inputs of either party, e.g. of `snp.array(data, 0)`, are known
+    to the other one. It needs no peer and works without a global VM. The AbstractVM is the VM of the
+    current context while `fn` runs, see `use_vm`.
+
+    Parameters
+    ----------
+    fn : callable
+        The function to explain, e.g. `lambda x, y: snp.sum(x * y, axis=0)`. It is called once per party,
+        with the same arguments.
+    *args
+        Positional arguments of `fn`, AbstractArray for secret inputs.
+    party : int
+        The party to explain.
+    **kwargs
+        Keyword arguments of `fn`.
+
+    Returns
+    -------
+    out : Explanation
+        The estimated cost, per instruction, per op and in total.
+
+    Notes
+    -----
+    Revealed values are zeros, so data-dependent control flow is explained along the path taken for zeros.
+    """
+    if party not in (0, 1):
+        raise ValueError(f"party must be 0 or 1, got {party}")
+    vms = AbstractVM.pair()
+    results = [None, None]
+    errors = []
+
+    def run(vm: AbstractVM):
+        try:
+            with use_vm(vm):
+                bound = [_bind(vm, arg) for arg in args]
+                bound_kwargs = {key: _bind(vm, arg) for key, arg in kwargs.items()}
+                results[vm.party_id()] = fn(*bound, **bound_kwargs)
+        except BaseException as e:
+            # the first error stops the other party, which fails waiting for a message
+            errors.append(e)
+        finally:
+            vm.close()
+
+    peer = threading.Thread(target=run, args=(vms[1 - party],), name="petace-explain")
+    peer.start()
+    run(vms[party])
+    peer.join()
+    if errors:
+        raise errors[0]
+    return Explanation(vms[party].instructions, vms[party].peak_bytes, results[party])
@@ -0,0 +1,228 @@
+# Copyright 2023 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import json
+import struct
+from typing import Iterable, List, Tuple, Union
+
+import numpy as np
+
+from .core import SecureArray, get_vm
+from .core.trace import traced
+from .array_creation import fromshare
+
+MAGIC = b"PETACESA"
+FORMAT_VERSION = 1
+HEADER_ALIGNMENT = 64
+_DTYPES = {"float64": np.float64, "int64": np.int64, "bool": np.bool_}
+
+
+def _reveal_many(arrays: Iterable[SecureArray], parties: Tuple[int]) -> List[np.ndarray]:
+    arrays = list(arrays)
+    for arr in arrays:
+        if not isinstance(arr, SecureArray):
+            raise TypeError(f"Only support SecureArray, got {type(arr)}")
+    groups = {}
+    for i, arr in enumerate(arrays):
+        groups.setdefault(np.dtype(arr.dtype).type, []).append(i)
+
+    ret = [None] * len(arrays)
+    for dtype, index in groups.items():
+        # the arrays of a dtype are flattened and stacked into one share, which the VM reveals at once
+        for i in index:
+            if arrays[i].size == 0 and arrays[i].vm.party_id() in parties:
+                ret[i] = np.empty(arrays[i].shape, dtype=dtype)
+        index = [i for i in index if arrays[i].size > 0]
+        if len(index) == 0:
+            continue
+        rows = [arrays[i] if arrays[i].ndim == 1 else arrays[i].reshape(-1) for i in index]
+        vm = rows[0].vm
+        flat = rows[0] if len(rows) == 1 else SecureArray(
+            vm.hstack([row.buffer for row in rows], (sum(row.size for row in rows),)))
+        for party in parties:
+            plain = flat.reveal_to(party)
+            if vm.party_id() != party:
+                continue
+            offset = 0
+            for i in index:
+                ret[i] = plain[offset:offset + arrays[i].size].reshape(arrays[i].shape)
+                offset += arrays[i].size
+    return ret
+
+
+@traced
+def reveal_many(arrays: Iterable[SecureArray], party: int) -> List[np.ndarray]:
+    """
+    Reveal many SecureArrays to a given party at once.
+
+    The arrays of each dtype are stacked into one share and revealed by a single reveal of the VM, so the
+    number of rounds grows with the number of dtypes, not with the number of arrays.
+
+    Parameters
+    ----------
+    arrays : iterable of SecureArray
+        The arrays to reveal.
+    party : int
+        The party to reveal to.
+
+    Returns
+    -------
+    out : list of np.ndarray
+        The revealed arrays, in the order of `arrays`. Another party will get a list of None.
+    """
+    return _reveal_many(arrays, (party,))
+
+
+@traced
+def reveal_many_to_all(arrays: Iterable[SecureArray]) -> List[np.ndarray]:
+    """
+    Reveal many SecureArrays to both parties at once.
+
+    The arrays of each dtype are stacked into one share and revealed by one reveal of the VM to each party,
+    whatever the number of arrays.
+
+    Parameters
+    ----------
+    arrays : iterable of SecureArray
+        The arrays to reveal.
+
+    Returns
+    -------
+    out : list of np.ndarray
+        The revealed arrays, in the order of `arrays`.
+    """
+    return _reveal_many(arrays, (0, 1))
+
+
+@traced
+def save(file: Union[str, os.PathLike], arr: SecureArray, ring_bits: int = None, packed: bool = False) -> None:
+    """
+    Save the local share of a SecureArray to a file.
+
+    The file starts with the magic string `PETACESA`, the format version and the length of a JSON header
+    as two little-endian uint32, followed by the header with the shape, dtype, ring width, packing and
+    party of the share. The raw share follows in C order, aligned to 64 bytes so it can be memory-mapped.
+The share read from the VM is copied into the memory-mapped file, rather than into a new array written after.
+
+    Parameters
+    ----------
+    file : str or PathLike
+        The file to write.
+    arr : SecureArray
+        The array to save, each party saves its own share.
+    ring_bits : int, optional
+        Ring width of arithmetic shares, see `SecureArray.to_share`.
+    packed : bool, default is False
+        Save bool shares bit-packed, which makes the file 64 times smaller, see `SecureArray.to_share`.
+        The loaded share is unpacked again into the VM.
+    """
+    if not isinstance(arr, SecureArray):
+        raise TypeError(f"Only support SecureArray, got {type(arr)}")
+    if ring_bits is None:
+        ring_bits = arr.vm.export_ring_bits
+    if ring_bits not in (32, 64):
+        raise ValueError(f"ring_bits must be 32 or 64, got {ring_bits}")
+    if packed:
+        share_dtype = np.dtype("<u8")
+        share_shape = ((arr.size + 63) // 64,)
+    else:
+        share_dtype = np.dtype("<i4") if ring_bits == 32 and arr.dtype != np.bool_ else np.dtype("<i8")
+        share_shape = arr.shape
+    header = {
+        "shape": list(arr.shape),
+        "dtype": np.dtype(arr.dtype).name,
+        "ring_bits": 32 if share_dtype == np.int32 else 64,
+        "packed": packed,
+        "party": int(arr.vm.party_id()),
+    }
+    header = json.dumps(header).encode("utf-8")
+    prefix_size = len(MAGIC) + 8
+    padding = -(prefix_size + len(header)) % HEADER_ALIGNMENT
+    header += b" " * padding
+    offset = prefix_size + len(header)
+    with open(file, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<II", FORMAT_VERSION, len(header)))
+        f.write(header)
+        f.truncate(offset + int(np.prod(share_shape)) * share_dtype.itemsize)
+    if int(np.prod(share_shape)) == 0:
+        return
+    # the share is copied from the VM straight into the file
+    share = np.memmap(file, dtype=share_dtype, mode="r+", offset=offset, shape=share_shape)
+    arr.to_share(packed=packed, ring_bits=ring_bits, out=share)
+    share.flush()
+    del share
+
+
+def read_header(file: Union[str, os.PathLike]) -> Tuple[dict, int]:
+    """
+    Read the header of a file written by `snp.save`.
+
+    Returns
+    -------
+    out : tuple of dict and int
+        The header and the offset of the share in the file.
+    """
+    with open(file, "rb") as f:
+        prefix = f.read(len(MAGIC) + 8)
+        if len(prefix) != len(MAGIC) + 8 or prefix[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{file} is not a SecureArray file")
+        version, header_size = struct.unpack("<II", prefix[len(MAGIC):])
+        if version > FORMAT_VERSION:
+            raise ValueError(f"Unsupported format version {version}, the latest supported is {FORMAT_VERSION}")
+        header = json.loads(f.read(header_size).decode("utf-8"))
+    return header, len(prefix) + header_size
+
+
+@traced
+def load(file: Union[str, os.PathLike], mmap: bool = True) -> SecureArray:
+    """
+    Load a SecureArray saved by `snp.save`.
+
+    Both parties must load their own share of the same array. 32-bit ring shares are converted back to
+    the 64-bit ring, which needs one secure comparison.
+
+    Parameters
+    ----------
+    file : str or PathLike
+        The file to read.
+    mmap : bool, default is True
+        Memory-map the share instead of reading it into a temporary array.
+
+    Returns
+    -------
+    out : SecureArray
+        The loaded array.
+    """
+    header, offset = read_header(file)
+    party = get_vm().party_id()
+    if header["party"] != party:
+        raise ValueError(f"{file} holds the share of party {header['party']}, but this is party {party}")
+    if header["dtype"] not in _DTYPES:
+        raise ValueError(f"Unsupported dtype {header['dtype']}")
+    dtype = _DTYPES[header["dtype"]]
+    shape = tuple(header["shape"])
+    if header["packed"]:
+        share_dtype = np.dtype("<u8")
+        share_shape = ((int(np.prod(shape)) + 63) // 64,)
+    else:
+        share_dtype = np.dtype("<i4") if header["ring_bits"] == 32 else np.dtype("<i8")
+        share_shape = shape
+    if mmap:
+        share = np.memmap(file, dtype=share_dtype, mode="r", offset=offset, shape=share_shape)
+    else:
+        share = np.fromfile(file, dtype=share_dtype, count=int(np.prod(share_shape)), offset=offset)
+        share = share.reshape(share_shape)
+    return fromshare(share, dtype, shape)
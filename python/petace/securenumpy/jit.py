@@ -0,0 +1,204 @@
+# Copyright 2023 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import functools
+import warnings
+from typing import Callable, List, Tuple, Union
+
+import numpy as np
+
+from petace.duet.optimizer import DEFAULT_PASSES
+from petace.duet.program import Program, ProgramRecorder
+from .core import SecureArray, get_vm, use_vm
+
+# marks a signature whose function cannot be replayed
+_EAGER = object()
+
+
+def _signature(value: object, arrays: List[SecureArray]) -> tuple:
+    """Key of an argument, appending the SecureArrays it holds to `arrays`."""
+    if isinstance(value, SecureArray):
+        for i, arr in enumerate(arrays):
+            if arr.buffer is value.buffer:
+                return ("array", i)
+        arrays.append(value)
+        return ("array", value.shape, np.dtype(value.dtype).str, value.buffer.data_type)
+    if isinstance(value, np.ndarray):
+        return ("ndarray", value.shape, value.dtype.str, value.tobytes())
+    if isinstance(value, (tuple, list)):
+        return (type(value).__name__, *(_signature(item, arrays) for item in value))
+    try:
+        hash(value)
+    except TypeError:
+        raise TypeError(f"jit arguments must be SecureArray, np.ndarray, tuple, list or hashable, got {type(value)}")
+    return ("value", value)
+
+
+class _Compiled:
+    """A program with how to build the result of the function from its output registers."""
+
+    def __init__(self, program: Program, template: list, container: type, specs: list) -> None:
+        self.program = program
+        self.template = template
+        self.container = container
+        self.specs = specs
+
+
+class JitFunction:
+    """A function compiled per input signature by `jit`.
+
+    Attributes
+    ----------
+    trace_count : int
+        Number of times the function was traced.
+    passes : tuple of str
+        The optimization passes run on every recording.
+    """
+
+    def __init__(self, func: Callable, passes: Tuple[str] = DEFAULT_PASSES) -> None:
+        functools.update_wrapper(self, func)
+        self.trace_count = 0
+        self.passes = tuple(passes)
+        self.__func = func
+        self.__compiled = {}
+
+    def __call__(self, *args, **kwargs):
+        arrays = []
+        key = (_signature(args, arrays), _signature(tuple(sorted(kwargs.items())), arrays))
+        # the function runs on the VM of its array arguments, or on the current VM without any
+        vm = arrays[0].vm if arrays else get_vm()
+        key = (id(vm), *key)
+        compiled = self.__compiled.get(key)
+        if compiled is _EAGER:
+            with use_vm(vm):
+                return self.__func(*args, **kwargs)
+        if compiled is not None and compiled.program.vm is vm and compiled.program.valid():
+            return self.__replay(vm, compiled, arrays)
+        if compiled is not None:
+            compiled.program.free()
+        return self.__trace(vm, key, arrays, args, kwargs)
+
+    def __trace(self, vm, key: tuple, arrays: List[SecureArray], args: tuple, kwargs: dict):
+        self.trace_count += 1
+        recorder = ProgramRecorder(vm, [arr.buffer.reg_addr for arr in arrays])
+        with use_vm(vm), recorder:
+            result = self.__func(*args, **kwargs)
+
+        container = type(result) if isinstance(result, (tuple, list)) else None
+        values = [result] if container is None else list(result)
+        template, specs, outputs = [], [], []
+        inputs = {arr.buffer.reg_addr: i for i, arr in enumerate(arrays)}
+        for value in values:
+            if not isinstance(value, SecureArray) or value.buffer.reg_addr is None:
+                template.append(("value", value))
+            elif value.buffer.reg_addr in inputs:
+                template.append(("input", inputs[value.buffer.reg_addr]))
+            elif not recorder.is_allocated(value.buffer.reg_addr):
+                template.append(("value", value))
+            elif value.buffer.reg_addr in outputs:
+                template.append(("output", outputs.index(value.buffer.reg_addr)))
+            else:
+                template.append(("output", len(outputs)))
+                outputs.append(value.buffer.reg_addr)
+                specs.append((value.shape, value.dtype, value.buffer.data_type))
+
+        program = recorder.finish(outputs, self.passes)
+        reason = recorder.unsupported
+        if not self.__agree(vm, program is not None) and program is not None:
+            program.free()
+            program, reason = None, "runs eagerly on the other party"
+        if program is None:
+            warnings.warn(f"{self.__name__} runs eagerly for this signature, it {reason} and cannot be replayed",
+                          RuntimeWarning)
+            self.__compiled[key] = _EAGER
+        else:
+            self.__compiled[key] = _Compiled(program, template, container, specs)
+        return result
+
+    def __agree(self, vm, replayable: bool) -> bool:
+        """Whether both parties can replay, a replay on one party only would not exchange the same messages."""
+        vm.send_buffer(bytearray([replayable]))
+        other = vm.recv_buffer(1)[0]
+        return replayable and bool(other)
+
+    def __replay(self, vm, compiled: _Compiled, arrays: List[SecureArray]):
+        addrs = compiled.program.run([arr.buffer.reg_addr for arr in arrays])
+        outputs = [SecureArray(vm.adopt(*spec, addr)) for spec, addr in zip(compiled.specs, addrs)]
+        values = []
+        for kind, value in compiled.template:
+            if kind == "input":
+                values.append(arrays[value])
+            elif kind == "output":
+                values.append(outputs[value])
+            else:
+                values.append(value)
+        if compiled.container is None:
+            return values[0]
+        return compiled.container(values)
+
+    def programs(self) -> List[Program]:
+        """The compiled programs, one per traced signature, see `Program.report` for what the passes did."""
+        return [compiled.program for compiled in self.__compiled.values() if compiled is not _EAGER]
+
+    def clear(self):
+        """Drop the compiled programs and free their registers."""
+        for compiled in self.__compiled.values():
+            if compiled is not _EAGER:
+                compiled.program.free()
+        self.__compiled.clear()
+
+
+def jit(func: Callable = None, *, passes: Tuple[str] = DEFAULT_PASSES) -> Union[JitFunction, Callable]:
+    """
+    Compile a function on SecureArrays by tracing it once per input signature.
+
+    The first call with a signature runs the function and records the register primitives it runs,
+    keeping its temporary registers. Later calls with the same signature replay the recording on the
+    registers of the new inputs, consecutive instructions in a single call into Duet, so none of the
+    Python work of the function (type checks, broadcasting, shape inference, building instructions) runs again.
+
+    The signature of a call is the shape, dtype and data type of every SecureArray argument and the value
+    of every other argument, np.ndarrays included. Changing any of them traces the function again.
+    SecureArrays used by the function without being arguments are captured by register, the function is
+    traced again once they are freed. The function runs on the VM of its SecureArray arguments, or on the
+    current VM if it has none, see `use_vm`.
+
+    The recording is optimized before it is replayed, by the passes of `petace.duet.optimizer` named in
+    `passes`: "fold" computes public-only arithmetic in plaintext, "cse" reuses identical instructions,
+    "matrix_chain" reorders chains of matrix products and "dce" drops instructions whose results are unused.
+
+    Parameters
+    ----------
+    func : callable
+        A function of SecureArrays and public values, returning a SecureArray, a tuple or list of
+        SecureArrays and other values, or anything else.
+    passes : tuple of str
+        The optimization passes to run, in order, `()` replays the recording as it is.
+
+    Returns
+    -------
+    out : JitFunction
+        The compiled function, or a decorator making one if `func` is None, e.g. `@snp.jit(passes=("cse",))`.
+
+    Notes
+    -----
+    A function reading register data, e.g. revealing or exporting shares, or receiving from the other party,
+    cannot be replayed since its Python code depends on the values. Neither can a function writing data of
+    one party, e.g. creating arrays with `snp.array` or loading shares, since a replay would reuse the data of
+    the first call. It runs eagerly for that signature and a RuntimeWarning is issued, on both parties: they
+    exchange whether they can replay after every trace. Replayed instructions are not seen by the profiler nor the tracer.
+    """
+    if func is None:
+        return functools.partial(JitFunction, passes=passes)
+    return JitFunction(func, passes)
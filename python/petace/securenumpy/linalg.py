@@ -12,10 +12,18 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from .core import SecureArray
+from typing import Union
+
+import numpy as np
+
+from .core import SecureArray, SecureMemmap, get_vm
+from .core.trace import traced
 from .math import sum
 
+Operand = Union[np.ndarray, SecureArray, SecureMemmap]
+
 
+@traced
 def inner(a: SecureArray, b: SecureArray) -> SecureArray:
     """
     Inner product of two arrays.
@@ -38,6 +46,7 @@ def inner(a: SecureArray, b: SecureArray) -> SecureArray:
     raise NotImplementedError
 
 
+@traced
 def dot(a: SecureArray, b: SecureArray) -> SecureArray:
     """
     Dot product of two arrays.
@@ -56,3 +65,92 @@ def dot(a: SecureArray, b: SecureArray) -> SecureArray:
         The dot product of a and b.
     """
     return a @ b
+
+
+def _block(x: Operand, rows: slice, cols: slice, trans: bool) -> Union[np.ndarray, SecureArray]:
+    block = x[cols, rows].T if trans else x[rows, cols]
+    if isinstance(block, np.ndarray):
+        block = np.ascontiguousarray(block)
+    return block
+
+
+def _zeros(m: int, n: int, dtype: np.dtype, out: SecureMemmap) -> Union[SecureArray, SecureMemmap]:
+    """Shares of a (m, n) zero matrix, zero shares on both parties share 0 without communication."""
+    if out is not None:
+        out.share[...] = 0
+        return out
+    vm = get_vm()
+    ret = vm.new_share((m, n), dtype)
+    if m > 0 and n > 0:
+        vm.set_airth_share_zeros(m, n, ret.reg_addr)
+    return SecureArray(ret)
+
+
+@traced
+def tiled_matmul(a: Operand,
+                 b: Operand,
+                 tile_size: int = 4096,
+                 trans_a: bool = False,
+                 out: SecureMemmap = None) -> Union[SecureArray, SecureMemmap]:
+    """
+    Matrix product of two 2-D arrays computed block by block.
+
+    The operands are loaded `tile_size` rows and columns at a time and the partial products over the
+    inner dimension of every block of the result are accumulated, so at most `tile_size` by `tile_size`
+    blocks of the operands and of the result are held in the VM besides the result itself. Every block is
+    written in place into the result, or into `out` if it is given. Empty operands give an empty result,
+    and a zero inner dimension gives zeros. Operands can be secret (SecureArray or SecureMemmap) or
+    public (np.ndarray or np.memmap), at least one of them must be secret.
+
+    Parameters
+    ----------
+    a : np.ndarray, SecureArray or SecureMemmap
+        First operand, of shape (m, k), or (k, m) if `trans_a` is True.
+    b : np.ndarray, SecureArray or SecureMemmap
+        Second operand, of shape (k, n).
+    tile_size : int, default is 4096
+        Number of rows and columns of the blocks.
+    trans_a : bool, default is False
+        Multiply by the transpose of `a`, e.g. `tiled_matmul(x, x, trans_a=True)` is the Gram matrix of
+        a tall matrix `x`, computed from row blocks of `x`.
+    out : SecureMemmap, optional
+        Where the result of shape (m, n) is written block by block, for results larger than memory.
+
+    Returns
+    -------
+    out : SecureArray or SecureMemmap
+        The matrix product, `out` if it is given.
+    """
+    if a.ndim != 2 or b.ndim != 2:
+        raise ValueError("tiled_matmul only support 2-d arrays")
+    if isinstance(a, np.ndarray) and isinstance(b, np.ndarray):
+        raise TypeError("At least one operand must be secret")
+    m, k = a.shape[::-1] if trans_a else a.shape
+    if k != b.shape[0]:
+        raise ValueError(f"tiled_matmul: Input operand 1 has a mismatch in its core dimension 0 (size {b.shape[0]} "
+                         f"is different from {k})")
+    n = b.shape[1]
+    if out is not None and out.shape != (m, n):
+        raise ValueError(f"Expect out of shape {(m, n)}, got {out.shape}")
+
+    dtype = np.int64 if all(np.issubdtype(x.dtype, np.integer) for x in (a, b)) else np.float64
+    if m == 0 or n == 0 or k == 0:
+        return _zeros(m, n, dtype, out)
+
+    ret = out
+    for row in range(0, m, tile_size):
+        rows = slice(row, min(row + tile_size, m))
+        for col in range(0, n, tile_size):
+            cols = slice(col, min(col + tile_size, n))
+            acc = None
+            for start in range(0, k, tile_size):
+                inner = slice(start, min(start + tile_size, k))
+                part = _block(a, rows, inner, trans_a) @ _block(b, inner, cols, False)
+                acc = part if acc is None else acc + part
+            if ret is None and acc.shape == (m, n):
+                return acc
+            if ret is None:
+                # the blocks are written into the result in place, so each of them is copied once
+                ret = _zeros(m, n, acc.dtype, None)
+            ret[rows, cols] = acc
+    return ret
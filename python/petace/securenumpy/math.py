@@ -13,9 +13,11 @@
 # limitations under the License.
 
 from .core import SecureArray
+from .core.trace import traced
 from .sort_search import argmax_and_max
 
 
+@traced
 def sum(arr: SecureArray, axis: int = None) -> SecureArray:
     """
     Sum of array elements over a given axis.
@@ -53,6 +55,7 @@ def sum(arr: SecureArray, axis: int = None) -> SecureArray:
     return res
 
 
+@traced
 def max(arr: SecureArray, axis: int = None) -> SecureArray:
     """
     Return the maximum of an array or the maximum along an axis.
@@ -73,6 +76,7 @@ def max(arr: SecureArray, axis: int = None) -> SecureArray:
     return max_value
 
 
+@traced
 def min(arr: SecureArray, axis: int = None) -> SecureArray:
     """Return the minimum of an array or the minimum along an axis.
 
@@ -92,6 +96,7 @@ def min(arr: SecureArray, axis: int = None) -> SecureArray:
     return -min_value
 
 
+@traced
 def prod(arr: SecureArray, axis: int = None) -> SecureArray:
     """
     Return the product of array elements over a given axis.
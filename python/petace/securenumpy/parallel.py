@@ -0,0 +1,225 @@
+# Copyright 2023 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import Callable, List, Tuple, Union
+
+import numpy as np
+
+from petace.duet import VM
+from petace.network import NetParams, NetScheme, NetFactory
+from .core import SecureArray, get_vm, use_vm
+from . import math as snp_math
+
+
+def _move(share: np.ndarray, shape: Tuple[int], dtype: np.dtype, vm: VM) -> SecureArray:
+    """Load a local share into `vm`, shares are plain ring elements, so no communication is needed."""
+    return SecureArray(vm.new_share(shape, dtype, np.ascontiguousarray(share)), vm)
+
+
+def _share(arr: SecureArray) -> np.ndarray:
+    return arr.to_share() if arr.dtype == np.bool_ else arr.to_share(ring_bits=64)
+
+
+class ParallelExecutor:
+    """Run a function on row blocks of SecureArrays, each block on its own VM.
+
+    Every VM has its own connection to the other party, its instructions run on the worker thread of the
+    VM and Duet releases the GIL while it computes and communicates, so the blocks run on separate cores.
+    Both parties must create the executor with the same number of VMs, paired in the same order.
+    The executor owns the VMs, `close`, or leaving its `with` block, stops them.
+
+    Parameters
+    ----------
+    vms : list of VM
+        The worker VMs.
+
+    Attributes
+    ----------
+    vms : list of VM
+        The worker VMs.
+    """
+
+    def __init__(self, vms: List[VM]) -> None:
+        if len(vms) == 0:
+            raise ValueError("need at least one worker VM")
+        self.vms = list(vms)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        self.close()
+        return False
+
+    def close(self):
+        """Wait for the submitted tasks, stop the worker threads of the VMs and release them.
+
+        The connections of the VMs are closed once nothing else refers to them, so the ports can be used
+        again, e.g. by a later `parallel` call with the same `base_port`.
+        """
+        vms, self.vms = self.vms, []
+        for vm in vms:
+            vm.close()
+
+    def partition(self, rows: int) -> List[slice]:
+        """Split `rows` rows into one contiguous block per VM, the first blocks get one more row.
+
+        There are fewer blocks than VMs if there are fewer rows, none without rows, block i runs on VM i.
+        """
+        if len(self.vms) == 0:
+            raise ValueError("the executor is closed")
+        blocks = min(rows, len(self.vms))
+        if blocks == 0:
+            return []
+        size, extra = divmod(rows, blocks)
+        ret, start = [], 0
+        for i in range(blocks):
+            stop = start + size + (1 if i < extra else 0)
+            ret.append(slice(start, stop))
+            start = stop
+        return ret
+
+    def scatter(self, arr: SecureArray) -> List[SecureArray]:
+        """Split `arr` by rows, see `partition`, and load block i into VM i."""
+        if arr.ndim == 0:
+            raise ValueError("cannot partition a 0-d array by rows")
+        share = _share(arr)
+        return [
+            _move(share[rows], (rows.stop - rows.start, *arr.shape[1:]), arr.dtype, vm)
+            for rows, vm in zip(self.partition(arr.shape[0]), self.vms)
+        ]
+
+    def gather(self, parts: List[SecureArray]) -> SecureArray:
+        """Concatenate the blocks by rows into one array of the current VM."""
+        shares = [_share(part) for part in parts]
+        share = np.concatenate([np.reshape(share, (-1, *part.shape[1:])) for share, part in zip(shares, parts)])
+        shape = (share.shape[0], *parts[0].shape[1:])
+        return _move(share, shape, parts[0].dtype, get_vm())
+
+    def map(self, fn: Callable, *args, reduce: Callable = None) -> Union[SecureArray, tuple]:
+        """
+        Run `fn` on every row block of the SecureArray arguments and gather the results.
+
+        Parameters
+        ----------
+        fn : callable
+            A row-wise function, e.g. `lambda x, y: x < y`. It runs once per VM with that VM as the current VM,
+            on the blocks of the SecureArray arguments, other arguments are passed to every call as they are.
+        *args
+            Arguments of `fn`, the SecureArrays must have the same number of rows.
+        reduce : callable, optional
+            Combines the partial results of a reduction, e.g. `lambda parts: snp.sum(parts, axis=0)`.
+            It runs on the current VM with the partial results stacked along a new first axis.
+            By default the results are concatenated by rows. Arrays without rows are not split, `fn` runs
+            once on the current VM and its result is returned as it is.
+
+        Returns
+        -------
+        out : SecureArray or tuple of SecureArray
+            The gathered results, a tuple if `fn` returns a tuple.
+        """
+        rows = {arg.shape[0] for arg in args if isinstance(arg, SecureArray) and arg.ndim > 0}
+        if len(rows) != 1:
+            raise ValueError(f"expect SecureArrays with the same number of rows, got {sorted(rows)}")
+        count = len(self.partition(rows.pop()))
+        if count == 0:
+            return fn(*args)
+        blocks = [self.scatter(arg) if isinstance(arg, SecureArray) else [arg] * count for arg in args]
+        futures = [
+            vm.submit(self.__run, vm, fn, [block[i] for block in blocks]) for i, vm in enumerate(self.vms[:count])
+        ]
+        results = [future.result() for future in futures]
+        if not isinstance(results[0], tuple):
+            return self.__combine(results, reduce)
+        return tuple(self.__combine([result[j] for result in results], reduce) for j in range(len(results[0])))
+
+    @staticmethod
+    def __run(vm: VM, fn: Callable, args: list):
+        with use_vm(vm):
+            return fn(*args)
+
+    def __combine(self, parts: List[SecureArray], reduce: Callable) -> SecureArray:
+        if reduce is None:
+            return self.gather(parts)
+        shares = np.stack([np.reshape(_share(part), part.shape) for part in parts])
+        return reduce(_move(shares, shares.shape, parts[0].dtype, get_vm()))
+
+    def sum(self, arr: SecureArray, axis: int = None) -> SecureArray:
+        """Sum of array elements along axis 0 or in total, computed per block then combined."""
+        if axis not in (None, 0):
+            raise ValueError("parallel sum only support axis=None or axis=0")
+        return self.map(lambda x: snp_math.sum(x, axis), arr, reduce=lambda parts: snp_math.sum(parts, axis=0))
+
+    def max(self, arr: SecureArray, axis: int = None) -> SecureArray:
+        """Maximum of array elements along axis 0 or in total, computed per block then combined."""
+        if axis not in (None, 0):
+            raise ValueError("parallel max only support axis=None or axis=0")
+        return self.map(lambda x: snp_math.max(x, axis), arr, reduce=lambda parts: snp_math.max(parts, axis=0))
+
+    def min(self, arr: SecureArray, axis: int = None) -> SecureArray:
+        """Minimum of array elements along axis 0 or in total, computed per block then combined."""
+        if axis not in (None, 0):
+            raise ValueError("parallel min only support axis=None or axis=0")
+        return self.map(lambda x: snp_math.min(x, axis), arr, reduce=lambda parts: snp_math.min(parts, axis=0))
+
+    def synchronize(self):
+        """Wait for the tasks submitted to the worker VMs."""
+        for vm in self.vms:
+            vm.synchronize()
+
+
+def parallel(workers: int, base_port: int, remote_addr: str = "127.0.0.1", party: int = None) -> ParallelExecutor:
+    """
+    Start `workers` VM pairs on separate ports and return an executor running jobs across them.
+
+    Worker i of party 0 listens on `base_port + 2 * i + 1` and connects to `base_port + 2 * i`,
+    party 1 the other way around, so both parties must call it with the same arguments, e.g.
+
+        with snp.parallel(16, 9000, peer_ip) as workers:
+            mask = workers.map(lambda x, y: x < y, a, b)
+            total = workers.sum(a * b, axis=0)
+
+    Parameters
+    ----------
+    workers : int
+        Number of VM pairs, typically the number of cores.
+    base_port : int
+        The first of the `2 * workers` ports used.
+    remote_addr : str
+        Address of the other party.
+    party : int, optional
+        This party, defaults to the party of the current VM.
+
+    Returns
+    -------
+    out : ParallelExecutor
+        The executor over the new VMs.
+    """
+    if workers < 1:
+        raise ValueError(f"workers must be positive, got {workers}")
+    if party is None:
+        party = get_vm().party_id()
+    vms = []
+    for i in range(workers):
+        net_params = NetParams()
+        net_params.remote_addr = remote_addr
+        if party == 0:
+            net_params.remote_port = base_port + 2 * i
+            net_params.local_port = base_port + 2 * i + 1
+        else:
+            net_params.remote_port = base_port + 2 * i + 1
+            net_params.local_port = base_port + 2 * i
+        net = NetFactory.get_instance().build(NetScheme.SOCKET, net_params)
+        vms.append(VM(net, party))
+    return ParallelExecutor(vms)
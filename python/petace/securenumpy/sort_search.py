@@ -13,10 +13,15 @@
 # limitations under the License.
 
 from typing import Tuple
-from .core import SecureArray, get_vm
+
+import numpy as np
+
+from .core import SecureArray
+from .core.trace import traced
 from .exceptions import AxisError
 
 
+@traced
 def where(cond: SecureArray, x: SecureArray, y: SecureArray) -> SecureArray:
     """
     Return elements chosen from x or y depending on condition.
@@ -24,7 +29,8 @@ def where(cond: SecureArray, x: SecureArray, y: SecureArray) -> SecureArray:
     Parameters
     ----------
     cond : SecureArray
-        When True, yield x, otherwise yield y.
+        When True, yield x, otherwise yield y. It must be of np.bool_ dtype, use
+        `arr.astype(np.bool_)` to convert an arithmetic array explicitly.
     x : SecureArray
         Values from which to choose.
     y : SecureArray
@@ -37,12 +43,13 @@ def where(cond: SecureArray, x: SecureArray, y: SecureArray) -> SecureArray:
     """
     if cond.shape != x.shape or cond.shape != y.shape:
         raise ValueError("cond, x, y must have the same shape")
-    vm = get_vm()
+    vm = x.vm
     ret = vm.new_share(x.buffer.shape, x.dtype)
     vm.execute_code("multiplexer", [cond.buffer, y.buffer, x.buffer, ret])
     return SecureArray(ret)
 
 
+@traced
 def argmax_and_max(arr: SecureArray, axis: int = None) -> Tuple[SecureArray, SecureArray]:
     """
     Returns the indices of the maximum values and maximum values along an axis.
@@ -73,17 +80,18 @@ def argmax_and_max(arr: SecureArray, axis: int = None) -> Tuple[SecureArray, Sec
         arr = arr.reshape((-1, 1))
     if axis == 1:
         arr = arr.transpose()
-    vm = get_vm()
+    vm = arr.vm
     if arr.ndim == 2:
         shape = (arr.buffer.shape[1],)
     else:
         shape = ()
-    max_index = vm.new_share(shape, arr.dtype)
+    max_index = vm.new_share(shape, np.int64)
     max_value = vm.new_share(shape, arr.dtype)
     vm.execute_code("argmax_and_max", [arr.buffer, max_index, max_value])
     return SecureArray(max_index), SecureArray(max_value)
 
 
+@traced
 def argmin_and_min(arr: SecureArray, axis: int = None) -> Tuple[SecureArray, SecureArray]:
     """
     Returns the indices of the minimum values and minimum values along an axis.
@@ -110,6 +118,7 @@ def argmin_and_min(arr: SecureArray, axis: int = None) -> Tuple[SecureArray, Sec
     return min_index, -min_value
 
 
+@traced
 def argmax(arr: SecureArray, axis: int = None) -> SecureArray:
     """
     Returns the indices of the maximum values along an axis.
@@ -130,6 +139,7 @@ def argmax(arr: SecureArray, axis: int = None) -> SecureArray:
     return max_index
 
 
+@traced
 def argmin(arr: SecureArray, axis: int = None) -> SecureArray:
     """
     Returns the indices of the minimum values along an axis.
@@ -149,6 +159,7 @@ def argmin(arr: SecureArray, axis: int = None) -> SecureArray:
     return argmax(-arr, axis)
 
 
+@traced
 def sort(arr: SecureArray, axis: int = -1) -> SecureArray:
     """
     Returns a sorted copy of an array.
@@ -17,9 +17,11 @@ import numpy as np
 
 from .math import max, min, sum
 from .core import SecureArray
+from .core.trace import traced
 from .exceptions import AxisError
 
 
+@traced
 def ptp(arr: SecureArray, axis: int = None) -> SecureArray:
     """
     Range of values (maximum - minimum) along an axis.
@@ -40,6 +42,7 @@ def ptp(arr: SecureArray, axis: int = None) -> SecureArray:
     return max(arr, axis) - min(arr, axis)
 
 
+@traced
 def average(arr: SecureArray, axis: int = None, weights: t.Union[SecureArray, np.ndarray] = None) -> SecureArray:
     """
     Compute the weighted average along the specified axis.
@@ -81,6 +84,7 @@ def average(arr: SecureArray, axis: int = None, weights: t.Union[SecureArray, np
     return sum(arr * weights, axis=axis) / sum(weights, axis=axis)
 
 
+@traced
 def mean(arr: SecureArray, axis: int = None) -> SecureArray:
     """
     Compute the arithmetic mean along the specified axis.
@@ -12,9 +12,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from petace.securenumpy import SecureArray, get_vm
+import numpy as np
 
+from petace.securenumpy import SecureArray
+from petace.securenumpy.core.trace import traced
 
+
+@traced
 def groupby_sum(x: SecureArray, encoding: SecureArray) -> SecureArray:
     vm = x.vm
     output = vm.new_share((x.shape[1], encoding.shape[1]), x.dtype)
@@ -22,13 +26,15 @@ def groupby_sum(x: SecureArray, encoding: SecureArray) -> SecureArray:
     return SecureArray(output)
 
 
+@traced
 def groupby_count(x: SecureArray, encoding: SecureArray) -> SecureArray:
-    vm = get_vm()
-    output = vm.new_share((x.shape[1], encoding.shape[1]), x.dtype)
+    vm = x.vm
+    output = vm.new_share((x.shape[1], encoding.shape[1]), np.int64)
     vm.execute_code("groupby_count", [x.buffer, encoding.buffer, output])
     return SecureArray(output)
 
 
+@traced
 def groupby_max(x: SecureArray, encoding: SecureArray) -> SecureArray:
     vm = x.vm
     output = vm.new_share((x.shape[1], encoding.shape[1]), x.dtype)
@@ -36,8 +42,9 @@ def groupby_max(x: SecureArray, encoding: SecureArray) -> SecureArray:
     return SecureArray(output)
 
 
+@traced
 def groupby_min(x: SecureArray, encoding: SecureArray) -> SecureArray:
-    vm = get_vm()
+    vm = x.vm
     output = vm.new_share((x.shape[1], encoding.shape[1]), x.dtype)
     vm.execute_code("groupby_min", [x.buffer, encoding.buffer, output])
     return SecureArray(output)
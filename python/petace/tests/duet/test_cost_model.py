@@ -0,0 +1,50 @@
+# Copyright 2023 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from petace.duet import VM
+from petace.duet.cost_model import Cost, estimate
+
+
+class TestCostModel:
+
+    def run_test_all(self):
+        for method in dir(self):
+            if method.startswith("test_"):
+                getattr(self, method)()
+
+    def test_all_operations(self):
+        for op in VM._supported_operations:
+            cost = estimate(op, ("am", "am", "am"), ((4, 3), (4, 3), (4, 3)))
+            assert cost.rounds >= 0 and cost.bytes_sent >= 0 and cost.local_ops >= 0
+        with pytest.raises(ValueError):
+            estimate("fft", ("am", "am"), ((2,), (2,)))
+
+    def test_local(self):
+        assert estimate("add", ("am", "am", "am"), ((10, 10),) * 3) == Cost(0, 0, 100)
+        assert estimate("mul", ("am", "cdm", "am"), ((10, 10),) * 3).rounds == 0
+        assert estimate("mat_mul", ("am", "cdm", "am"), ((10, 5), (5, 2), (10, 2))).rounds == 0
+        assert estimate("lt", ("pdm", "pdm", "pbm"), ((10,),) * 3).rounds == 0
+
+    def test_scaling(self):
+        small = estimate("lt", ("am", "am", "bm"), ((10,),) * 3)
+        large = estimate("lt", ("am", "am", "bm"), ((20,),) * 3)
+        assert small.rounds == large.rounds
+        assert large.bytes_sent == 2 * small.bytes_sent
+        assert estimate("mat_mul", ("am", "am", "am"), ((10, 5), (5, 2), (10, 2))) == Cost(1, 8 * 60, 200)
+        short = estimate("argmax_and_max", ("am", "am", "am"), ((8, 2), (2,), (2,)))
+        tall = estimate("argmax_and_max", ("am", "am", "am"), ((64, 2), (2,), (2,)))
+        assert tall.rounds == 2 * short.rounds
+        assert estimate("quick_sort", ("am",), ((1024,),)).rounds > estimate("quick_sort", ("am",), ((32,),)).rounds
@@ -0,0 +1,75 @@
+# Copyright 2023 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+import pytest
+
+from petace.duet import AbstractVM
+from petace.duet.program import ProgramRecorder
+from petace.securenumpy import SecureArray
+from petace.securenumpy import use_vm
+
+
+def record(func, shapes, passes):
+    vm = AbstractVM()
+    with use_vm(vm):
+        inputs = [SecureArray(vm.new_share(shape, np.float64)) for shape in shapes]
+        recorder = ProgramRecorder(vm, [arr.buffer.reg_addr for arr in inputs])
+        with recorder:
+            result = func(*inputs)
+        program = recorder.finish([result.buffer.reg_addr], passes)
+    return program, {report.name: report for report in program.report}
+
+
+class TestOptimizer:
+
+    def run_test_all(self):
+        for method in dir(self):
+            if method.startswith("test_"):
+                getattr(self, method)()
+
+    def test_cse(self):
+        program, report = record(lambda x: (x / 3.0) + (x / 3.0), [(4, 3)], ("cse",))
+        assert report["cse"].rewrites == 2
+        assert report["cse"].instructions_after == 2
+        assert program.instruction_count == 2
+
+    def test_dce(self):
+
+        def func(x):
+            x * x
+            return x + 1.0
+
+        program, report = record(func, [(4, 3)], ("dce",))
+        assert report["dce"].instructions_after == 1
+        assert report["dce"].cost_after.rounds < report["dce"].cost_before.rounds
+        assert program.instruction_count == 1
+
+    def test_fold(self):
+        _, report = record(lambda x: x * 2.0 * 3.0 - 1.0 - 2.0, [(4, 3)], ("fold", "dce"))
+        assert report["fold"].rewrites == 2
+        assert report["fold"].instructions_after == 2
+        _, report = record(lambda x: x * 2 * 3, [(4, 3)], ("fold",))
+        assert report["fold"].rewrites == 1
+
+    def test_matrix_chain(self):
+        _, report = record(lambda a, b, v: a @ b @ v, [(20, 10), (10, 15), (15, 1)], ("matrix_chain",))
+        assert report["matrix_chain"].rewrites == 1
+        assert report["matrix_chain"].cost_after.bytes_sent < report["matrix_chain"].cost_before.bytes_sent
+        _, report = record(lambda a, b, v: a @ (b @ v), [(20, 10), (10, 15), (15, 1)], ("matrix_chain",))
+        assert report["matrix_chain"].rewrites == 0
+
+    def test_unknown_pass(self):
+        with pytest.raises(ValueError):
+            record(lambda x: x + 1.0, [(4, 3)], ("inline",))
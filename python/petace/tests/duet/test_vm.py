@@ -12,8 +12,21 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import gc
+import os
+import json
+import weakref
+import asyncio
+import tempfile
+import warnings
+import pytest
+
+import numpy as np
+import numpy.testing as npt
+
 import petace.securenumpy as snp
-from petace.tests.utils import SnpTestBase
+from petace.duet import merge_traces
+from petace.tests.utils import SnpTestBase, init_vm
 
 
 class TestVM(SnpTestBase):
@@ -40,3 +53,160 @@ class TestVM(SnpTestBase):
             else:
                 recv_shape = vm.recv_shape()
                 assert recv_shape == shape
+
+    def test_memory_stats(self, party_id):
+        vm = snp.get_vm()
+        vm.set_track_call_sites(True)
+        stats = vm.memory_stats()
+        a = snp.array(np.ones((100, 10)), 0)
+        b = a + 1
+        new_stats = vm.memory_stats(top=2)
+        vm.set_track_call_sites(False)
+        assert new_stats["live_count"] == stats["live_count"] + 2
+        assert new_stats["live_bytes"] == stats["live_bytes"] + 2 * 8000
+        assert new_stats["types"]["am"]["count"] == stats["types"].get("am", {"count": 0})["count"] + 2
+        assert new_stats["peak_bytes"] >= new_stats["live_bytes"]
+        assert len(new_stats["top"]) == 2
+        assert new_stats["top"][0]["bytes"] == 8000
+        assert "test_vm.py" in new_stats["top"][0]["call_site"]
+        del a, b
+        assert vm.memory_stats()["live_bytes"] == stats["live_bytes"]
+
+    def test_leak_check(self, party_id):
+        vm = snp.get_vm()
+        kept = []
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            with vm.leak_check() as check:
+                snp.array(np.ones(10), 0) * 2
+                kept.append(snp.array(np.ones(10), 0))
+        assert len(check.leaks) == 1
+        assert check.leaks[0] is kept[0].buffer
+        assert any(issubclass(w.category, ResourceWarning) for w in caught)
+
+    def test_profile(self, party_id):
+        vm = snp.get_vm()
+        records = []
+        vm.add_profile_hook(records.append)
+        vm.enable_profile()
+        a = snp.array(np.ones((10, 10)), 0)
+        b = a * a + a
+        vm.remove_profile_hook(records.append)
+        vm.enable_profile(False)
+        b + 1
+        assert [record.op for record in records] == ["share", "mul", "add"]
+        assert records[1].types == ("am", "am", "am")
+        assert records[1].shapes == ((10, 10), (10, 10), (10, 10))
+        assert records[1].bytes_sent > 0 and records[1].bytes_received > 0
+        assert records[2].bytes_sent == 0
+        report = vm.profile(reset=True)
+        assert report["mul"]["count"] == 1
+        assert report["mul"]["rounds"] == 1
+        assert "mul" in report.table()
+        assert len(vm.profile()) == 0
+
+    def test_num_threads(self, party_id):
+        vm = snp.get_vm()
+        threads = vm.num_threads()
+        vm.set_num_threads(2)
+        assert vm.num_threads() == 2
+        with pytest.raises(ValueError):
+            vm.set_num_threads(0)
+        vm.enable_profile()
+        data = np.arange(64 * 64, dtype=np.float64).reshape(64, 64) / 4096
+        a = snp.array(data, 0)
+        b = a @ a
+        report = vm.profile(reset=True)
+        vm.enable_profile(False)
+        vm.set_num_threads(threads)
+        assert report["mat_mul"]["thread_time"] == pytest.approx(2 * report["mat_mul"]["wall_time"])
+        assert report.parallel_efficiency("mat_mul") >= 0
+        assert 0 <= report["mat_mul"]["cpu_time"] <= vm.thread_cpu_time()
+        assert "efficiency" in report.table()
+        res = b.reveal_to(0)
+        if party_id == 0:
+            npt.assert_almost_equal(res, data @ data, decimal=2)
+
+    def test_trace(self, party_id):
+        vm = snp.get_vm()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "trace.json")
+            vm.start_trace(path)
+            a = snp.array(np.ones((10, 10)), 0)
+            snp.sum(a * a, axis=0)
+            assert vm.stop_trace() == path
+            assert vm.tracer is None
+            merged = os.path.join(tmp, "merged.json")
+            merge_traces([path], merged)
+            with open(merged) as f:
+                events = json.load(f)["traceEvents"]
+        assert all(event["pid"] == party_id for event in events)
+        names = {event["name"] for event in events}
+        network = "send" if party_id == 0 else "recv"
+        for name in ("share", "mul", "sum", "array", "SecureArray.__mul__", network, "allocate", "delete"):
+            assert name in names, name
+
+    def test_async(self, party_id):
+        vm = snp.get_vm()
+        data = np.arange(12, dtype=np.float64).reshape(3, 4)
+        a = snp.array(data, 0)
+        b = a * 2.0
+        res = snp.core.SecureArray(vm.new_share(a.shape, a.dtype))
+        future = vm.execute_code_async("add", [a.buffer, b.buffer, res.buffer])
+        # plaintext work of this thread overlaps with the instruction
+        expected = data * 3
+        future.result()
+
+        async def reveal():
+            return await asyncio.gather(res.reveal_to_async(0), a.reveal_to_async(0))
+
+        revealed, original = asyncio.run(reveal())
+        # instructions of this thread wait for the submitted tasks
+        vm.submit(snp.sum, res, axis=0)
+        total = snp.sum(res, axis=0).reveal_to(0)
+        vm.synchronize()
+        if party_id == 0:
+            npt.assert_almost_equal(revealed, expected, decimal=3)
+            npt.assert_almost_equal(original, data, decimal=3)
+            npt.assert_almost_equal(total, np.sum(expected, axis=0), decimal=2)
+
+    def test_async_read(self, party_id):
+        vm = snp.get_vm()
+        data = np.arange(6, dtype=np.float64)
+        a = snp.array(data, 0)
+        res = snp.core.SecureArray(vm.new_share(a.shape, a.dtype))
+        vm.execute_code_async("add", [a.buffer, a.buffer, res.buffer])
+        # reading the share waits for the task writing it
+        share = res.to_share()
+        res = snp.fromshare(share, np.float64).reveal_to(0)
+        if party_id == 0:
+            npt.assert_almost_equal(res, data * 2, decimal=3)
+
+    def test_async_buffers(self, party_id):
+        vm = snp.get_vm()
+        data = np.arange(6, dtype=np.float64)
+        a = snp.array(data, 0)
+        # the result of a task is not freed by the scope of the thread submitting it
+        with vm.scope():
+            future = vm.submit(lambda: a * 2.0)
+        doubled = future.result()
+        # a buffer deleted while a queued task uses it is freed after the task
+        future = vm.submit(lambda x: x + 1.0, a)
+        vm.delete_buffer(a.buffer)
+        res = future.result().reveal_to(0)
+        if party_id == 0:
+            npt.assert_almost_equal(res, data + 1, decimal=3)
+        res = doubled.reveal_to(0)
+        if party_id == 0:
+            npt.assert_almost_equal(res, data * 2, decimal=3)
+
+    def test_close(self, party_id):
+        other = init_vm(party_id, port_offset=8)
+        other.submit(other.party_id).result()
+        other.close()
+        assert other.submit(other.party_id).result() == party_id
+        # the worker thread does not keep the VM alive
+        ref = weakref.ref(other)
+        del other
+        gc.collect()
+        assert ref() is None
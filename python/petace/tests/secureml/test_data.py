@@ -0,0 +1,68 @@
+# Copyright 2023 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+import numpy.testing as npt
+
+import petace.securenumpy as snp
+import petace.secureml as sml
+
+from petace.tests.utils import SnpTestBase, init_vm
+
+
+class TestBatchLoader(SnpTestBase):
+
+    def test_batches(self, party_id):
+        x = np.arange(22, dtype=np.float64).reshape(11, 2) / 10
+        y = np.arange(11) % 2 == 0
+        with sml.BatchLoader([(x if party_id == 0 else None, 0), (y if party_id == 1 else None, 1, np.bool_)],
+                             4,
+                             shuffle=True,
+                             seed=42) as loader:
+            assert len(loader) == 3
+            for epoch in range(2):
+                batches = loader.batches(epoch)
+                for rows, (bx, by) in zip(batches, loader):
+                    assert bx.shape == (len(rows), 2) and by.shape == (len(rows),)
+                    px, py = bx.reveal_to(0), by.reveal_to(0)
+                    if party_id == 0:
+                        npt.assert_almost_equal(px, x[rows], decimal=3)
+                        npt.assert_array_equal(py, y[rows])
+            assert loader.epoch == 2
+            # the shuffled epochs cover every row once
+            assert sorted(np.concatenate(loader.batches(1)).tolist()) == list(range(11))
+
+    def test_drop_last(self, party_id):
+        x = np.arange(10, dtype=np.float64)
+        loader = sml.BatchLoader([(x if party_id == 0 else None, 0)], 3, drop_last=True, prefetch=2)
+        assert len(loader) == 3
+        total = None
+        for (batch,) in loader:
+            assert batch.shape == (3,)
+            step = snp.sum(batch)
+            total = step if total is None else total + step
+        loader.close()
+        res = total.reveal_to(0)
+        if party_id == 0:
+            npt.assert_almost_equal(res, np.sum(x[:9]), decimal=3)
+
+    def test_loader_vm(self, party_id):
+        loader_vm = init_vm(party_id, port_offset=6)
+        x = np.arange(12, dtype=np.float64).reshape(6, 2)
+        with sml.BatchLoader([(x if party_id == 0 else None, 0)], 4, shuffle=True, loader_vm=loader_vm) as loader:
+            for rows, (batch,) in zip(loader.batches(0), loader):
+                assert batch.vm is snp.get_vm()
+                res = (batch * 2.0).reveal_to(0)
+                if party_id == 0:
+                    npt.assert_almost_equal(res, x[rows] * 2, decimal=3)
@@ -41,6 +41,16 @@ class TestGetItem(SnpTestBase):
             if party_id == 0:
                 npt.assert_almost_equal(c0, plain)
 
+    def test_bool(self, party_id):
+        data = np.arange(12).reshape(4, 3) % 3 == 0
+        p0 = snp.array(data, 0, dtype=np.bool_)
+        test_cases = ((p0[1], data[1]), (p0[1:3, :2], data[1:3, :2]), (p0[:, 2], data[:, 2]))
+        for cipher, plain in test_cases:
+            assert cipher.dtype == np.bool_
+            c0 = cipher.reveal_to(0)
+            if party_id == 0:
+                npt.assert_equal(c0, plain)
+
     def test_1d_sum(self, _):
         data = snp.ones((10, 10))
         _ = data[:, 5] + data[5]
@@ -0,0 +1,106 @@
+# Copyright 2023 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+import numpy.testing as npt
+import pytest
+
+import petace.securenumpy as snp
+from petace.tests.utils import SnpTestBase
+
+
+class TestInt(SnpTestBase):
+
+    def test_arith(self, party_id):
+        np.random.seed(43)
+        p0 = np.random.randint(-1000, 1000, (4, 5))
+        p1 = np.random.randint(-1000, 1000, (4, 5))
+        c0 = snp.array(p0, 0, dtype=np.int64)
+        c1 = snp.array(p1, 1, dtype=np.int64)
+        cases = ((c0 + c1, p0 + p1), (c0 - c1, p0 - p1), (c0 * c1, p0 * p1), (c0 * 7, p0 * 7), (-c1, -p1), (c0 * p1,
+                                                                                                            p0 * p1))
+        for cipher, plain in cases:
+            assert cipher.dtype == np.int64
+            res = cipher.reveal_to(0)
+            if party_id == 0:
+                assert res.dtype == np.int64
+                npt.assert_equal(res, plain)
+
+    def test_promotion(self, party_id):
+        p0 = np.arange(6).reshape((2, 3))
+        c0 = snp.array(p0, 0, dtype=np.int64)
+        res = c0 * 0.5
+        assert res.dtype == np.float64
+        res = res.reveal_to(0)
+        if party_id == 0:
+            npt.assert_almost_equal(res, p0 * 0.5, decimal=4)
+        assert (c0 / 2).dtype == np.float64
+
+    def test_compare(self, party_id):
+        np.random.seed(43)
+        p0 = np.random.randint(-5, 5, 50)
+        p1 = np.random.randint(-5, 5, 50)
+        c0 = snp.array(p0, 0, dtype=np.int64)
+        c1 = snp.array(p1, 1, dtype=np.int64)
+        # products carry fixed-point error, comparisons must still be exact
+        c0 = c0 * c1
+        p0 = p0 * p1
+        cases = ((c0 < c1, p0 < p1), (c0 > c1, p0 > p1), (c0 <= c1, p0 <= p1), (c0 >= c1, p0 >= p1),
+                 (c0 == c1, p0 == p1), (c0 != c1, p0 != p1), (c0 < 2, p0 < 2), (c0 == 0, p0 == 0))
+        for cipher, plain in cases:
+            res = cipher.reveal_to(0)
+            if party_id == 0:
+                npt.assert_equal(res, plain)
+
+    def test_eq_cost(self, party_id):
+        p0 = np.arange(-3, 3)
+        c0 = snp.array(p0, 0, dtype=np.int64)
+        c1 = snp.array(np.zeros(6, dtype=np.int64), 1, dtype=np.int64)
+        vm = snp.get_vm()
+        vm.enable_profile()
+        cipher = c0 * c1 + c0 == c0
+        report = vm.profile(reset=True)
+        vm.enable_profile(False)
+        # both bounds of the rounded difference are checked by a single comparison
+        assert report["gt"]["count"] == 1 and "lt" not in report
+        res = cipher.reveal_to(0)
+        if party_id == 0:
+            npt.assert_equal(res, np.ones(6, dtype=np.bool_))
+
+    def test_eq_2d(self, party_id):
+        p0 = np.arange(6).reshape(2, 3)
+        c0 = snp.array(p0, 0, dtype=np.int64)
+        cipher = c0 == snp.array(p0 % 2 * p0, 0, dtype=np.int64)
+        assert cipher.shape == (2, 3)
+        res = cipher.reveal_to(0)
+        if party_id == 0:
+            npt.assert_equal(res, p0 == p0 % 2 * p0)
+
+    def test_range(self, party_id):
+        vm = snp.get_vm()
+        # every party provides its own array, so both fail before any message is sent
+        with pytest.raises(ValueError):
+            snp.array(np.array([2**vm.INT_BITS]), party_id, dtype=np.int64)
+        res = snp.array(np.array([1 - 2**vm.INT_BITS]), 0, dtype=np.int64).reveal_to(0)
+        if party_id == 0:
+            npt.assert_equal(res, [1 - 2**vm.INT_BITS])
+
+    def test_argmax(self, party_id):
+        np.random.seed(43)
+        data = np.random.random((3, 5))
+        index = snp.argmax(snp.array(data, 0), axis=0)
+        assert index.dtype == np.int64
+        res = index.reveal_to(0)
+        if party_id == 0:
+            npt.assert_equal(res, np.argmax(data, axis=0))
@@ -186,3 +186,29 @@ class TestResize(SnpTestBase):
         res_plain = res.reveal_to(0)
         if party_id == 0:
             npt.assert_equal(res_plain, np.resize(np.arange(10), (2, 4)))
+
+
+class TestAstype(SnpTestBase):
+
+    def test_bool_to_float(self, party_id):
+        np.random.seed(43)
+        p0 = np.random.random((4, 5))
+        p1 = np.random.random((4, 5))
+        mask = snp.array(p0, 0) > snp.array(p1, 1)
+        vm = snp.get_vm()
+        vm.enable_profile()
+        converted = mask.astype(np.float64)
+        report = vm.profile(reset=True)
+        vm.enable_profile(False)
+        # the constants are built locally, only the multiplexer communicates
+        assert "share" not in report
+        assert report["multiplexer"]["count"] == 1
+        res = (converted * 3).reveal_to(0)
+        if party_id == 0:
+            npt.assert_almost_equal(res, (p0 > p1) * 3.0, decimal=4)
+
+    def test_float_to_bool(self, party_id):
+        data = np.array([0.0, 1.5, 0.0, -2.0])
+        res = snp.array(data, 0).astype(np.bool_).reveal_to(0)
+        if party_id == 0:
+            npt.assert_equal(res, data != 0)
@@ -0,0 +1,58 @@
+# Copyright 2023 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+import numpy.testing as npt
+
+import petace.securenumpy as snp
+from petace.tests.utils import SnpTestBase
+
+
+class TestArrayMany(SnpTestBase):
+
+    def test_array_many(self, party_id):
+        np.random.seed(43)
+        data = [
+            (np.random.random((10, 3)), 0, np.float64),
+            (np.random.random(7), 1, np.float64),
+            (np.array(np.random.random()), 0, np.float64),
+            (np.random.randint(0, 100, (4, 5)), 1, np.int64),
+            (np.random.random((6, 2)) > 0.5, 0, np.bool_),
+            (np.random.random((3, 3)), 1),
+        ]
+        ciphers = snp.array_many(data)
+        npt.assert_equal(len(ciphers), len(data))
+        for cipher, entry in zip(ciphers, data):
+            npt.assert_equal(cipher.shape, entry[0].shape)
+            plain = cipher.reveal_to(0)
+            if party_id == 0:
+                npt.assert_almost_equal(plain, entry[0], decimal=4)
+
+    def test_bool_and_empty(self, party_id):
+        data = [
+            (np.array([True, False, True]), 0, np.bool_),
+            (np.zeros((0, 3)), 1, np.float64),
+            (np.array([[False, True], [True, True]]), 0, np.bool_),
+            (np.zeros(0, dtype=np.bool_), 0, np.bool_),
+            (np.arange(4.0), 1, np.float64),
+        ]
+        ciphers = snp.array_many(data)
+        for cipher, (plain, _, dtype) in zip(ciphers, data):
+            npt.assert_equal(cipher.shape, plain.shape)
+            assert cipher.dtype == dtype
+            if plain.size == 0:
+                continue
+            res = cipher.reveal_to(0)
+            if party_id == 0:
+                npt.assert_equal(res, plain)
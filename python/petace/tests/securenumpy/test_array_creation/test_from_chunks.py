@@ -0,0 +1,50 @@
+# Copyright 2023 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+import numpy.testing as npt
+
+import petace.securenumpy as snp
+from petace.tests.utils import SnpTestBase
+
+
+class TestFromChunks(SnpTestBase):
+
+    def test_2d(self, party_id):
+        np.random.seed(43)
+        data = np.random.random((103, 4))
+        chunks = (data[i:i + 10] for i in range(0, data.shape[0], 10))
+        data_cipher = snp.array_from_chunks(chunks, 0)
+        npt.assert_equal(data_cipher.shape, data.shape)
+        data_plain = data_cipher.reveal_to(0)
+        if party_id == 0:
+            npt.assert_almost_equal(data_plain, data, decimal=4)
+
+    def test_1d(self, party_id):
+        np.random.seed(43)
+        data = np.random.randint(0, 100, 50)
+        chunks = (data[i:i + 7] for i in range(0, data.shape[0], 7))
+        data_cipher = snp.array_from_chunks(chunks, 1, np.int64)
+        npt.assert_equal(data_cipher.shape, data.shape)
+        data_plain = data_cipher.reveal_to(1)
+        if party_id == 1:
+            npt.assert_equal(data_plain, data)
+
+    def test_failed(self, party_id):
+        chunks = (np.zeros(shape) for shape in [(3, 2), (3, 2), (4,)])
+        with npt.assert_raises(ValueError):
+            snp.array_from_chunks(chunks, 0)
+        # both parties are in sync again
+        data_cipher = snp.array_from_chunks([np.ones(3)], 0)
+        npt.assert_equal(data_cipher.shape, (3,))
@@ -0,0 +1,46 @@
+# Copyright 2023 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+import numpy.testing as npt
+
+import petace.securenumpy as snp
+from petace.tests.utils import SnpTestBase
+
+
+class TestFromBits(SnpTestBase):
+
+    def test_1d(self, party_id):
+        np.random.seed(43)
+        data = np.random.random(101) > 0.5
+        if party_id == 0:
+            cipher = snp.frombits(np.packbits(data), data.shape, 0)
+        else:
+            cipher = snp.frombits(None, None, 0)
+        assert cipher.shape == data.shape
+        plain = cipher.reveal_to(0)
+        if party_id == 0:
+            npt.assert_equal(plain, data)
+
+    def test_2d(self, party_id):
+        np.random.seed(43)
+        data = np.random.random((7, 13)) > 0.5
+        if party_id == 1:
+            cipher = snp.frombits(np.packbits(data), data.shape, 1)
+        else:
+            cipher = snp.frombits(None, None, 1)
+        assert cipher.shape == data.shape
+        plain = cipher.reveal_to(1)
+        if party_id == 1:
+            npt.assert_equal(plain, data)
@@ -12,6 +12,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
+import tempfile
+
 import numpy as np
 import numpy.testing as npt
 
@@ -53,3 +56,63 @@ class TestFromShare(SnpTestBase):
         data_plain_new = data_cipher_new.reveal_to(0)
         if party_id == 0:
             npt.assert_almost_equal(data_plain_new, data, decimal=4)
+
+    def test_share_copy(self, party_id):
+        data = np.arange(20, dtype=np.float64).reshape((4, 5))
+        data_cipher = snp.array(data, 0)
+        share = data_cipher.to_share()
+        kept = share.copy()
+        # in-place instructions on the array do not change the exported share
+        data_cipher[0] = np.zeros(5)
+        npt.assert_equal(share, kept)
+        del data_cipher
+        data_plain_new = snp.fromshare(share, np.float64).reveal_to(0)
+        if party_id == 0:
+            npt.assert_almost_equal(data_plain_new, data, decimal=4)
+
+    def test_packed_bool(self, party_id):
+        np.random.seed(43)
+        data = np.random.random((10, 13)) > 0.5
+        data_cipher = snp.array(data, 0, dtype=np.bool_)
+        share = data_cipher.to_share(packed=True)
+        npt.assert_equal(share.dtype, np.uint64)
+        npt.assert_equal(share.size, (data.size + 63) // 64)
+        data_cipher_new = snp.fromshare(share, np.bool_, data.shape)
+        data_plain_new = data_cipher_new.reveal_to(0)
+        if party_id == 0:
+            npt.assert_equal(data_plain_new, data)
+
+    def test_ring32(self, party_id):
+        np.random.seed(43)
+        data = np.random.uniform(-1000, 1000, (10, 20))
+        data_cipher = snp.array(data, 0)
+        share = data_cipher.to_share(ring_bits=32)
+        npt.assert_equal(share.dtype, np.int32)
+        npt.assert_equal(share.shape, data.shape)
+        data_cipher_new = snp.fromshare(share, np.float64)
+        data_plain_new = data_cipher_new.reveal_to(0)
+        if party_id == 0:
+            npt.assert_almost_equal(data_plain_new, data, decimal=4)
+
+    def test_memmap(self, party_id):
+        np.random.seed(43)
+        data = np.random.random((10, 20))
+        data_cipher = snp.array(data, 0)
+        with tempfile.TemporaryDirectory() as tmp:
+            share = np.memmap(os.path.join(tmp, "a.share"), dtype=np.int64, mode="w+", shape=data.shape)
+            assert data_cipher.to_share(out=share) is share
+            data_plain_new = snp.fromshare(share, np.float64).reveal_to(0)
+            del share
+        if party_id == 0:
+            npt.assert_almost_equal(data_plain_new, data, decimal=4)
+
+    def test_buffer(self, party_id):
+        np.random.seed(43)
+        data = np.random.random((10, 20))
+        data_cipher = snp.array(data, 0)
+        raw = bytearray(data.size * 8)
+        data_cipher.to_share(out=raw)
+        for share in (bytes(raw), memoryview(raw).cast("q")):
+            data_plain_new = snp.fromshare(share, np.float64, data.shape).reveal_to(0)
+            if party_id == 0:
+                npt.assert_almost_equal(data_plain_new, data, decimal=4)
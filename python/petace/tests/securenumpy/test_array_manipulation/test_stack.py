@@ -84,6 +84,17 @@ class TestHstack(SnpTestBase):
             if party_id == 0:
                 npt.assert_almost_equal(res, np.hstack(arrays), decimal=4)
 
+    def test_bool(self, party_id):
+        np.random.seed(43)
+        for shape in ((10,), (10, 20)):
+            arrays = [np.random.random(shape) > 0.5 for _ in range(3)]
+            arrays_cipher = [snp.array(arr, 0, dtype=np.bool_) for arr in arrays]
+            res_cipher = snp.hstack(arrays_cipher)
+            assert res_cipher.dtype == np.bool_
+            res = res_cipher.reveal_to(0)
+            if party_id == 0:
+                npt.assert_equal(res, np.hstack(arrays))
+
 
 class TestColumnStack(SnpTestBase):
 
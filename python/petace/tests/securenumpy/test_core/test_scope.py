@@ -0,0 +1,52 @@
+# Copyright 2023 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+import numpy.testing as npt
+
+import petace.securenumpy as snp
+from petace.tests.utils import SnpTestBase
+
+
+class TestScope(SnpTestBase):
+
+    def test_scope(self, party_id):
+        np.random.seed(43)
+        data = np.random.random((10, 20))
+        vm = snp.get_vm()
+        live_bytes = vm.live_bytes
+        with snp.scope() as scope:
+            a = snp.array(data, 0)
+            b = scope.keep(a * 2 + 1)
+        assert a.buffer.reg_addr is None
+        assert b.buffer.reg_addr is not None
+        assert scope.peak_bytes >= live_bytes + 3 * data.size * 8
+        npt.assert_equal(vm.live_bytes, live_bytes + data.size * 8)
+        res = b.reveal_to(0)
+        if party_id == 0:
+            npt.assert_almost_equal(res, data * 2 + 1, decimal=4)
+
+    def test_nested(self, party_id):
+        data = np.arange(6, dtype=np.float64)
+        vm = snp.get_vm()
+        live_bytes = vm.live_bytes
+        with snp.scope() as outer:
+            with snp.scope() as inner:
+                a = inner.keep(snp.array(data, 0))
+            assert a.buffer.reg_addr is not None
+            b = a + 1
+        assert a.buffer.reg_addr is None
+        assert b.buffer.reg_addr is None
+        npt.assert_equal(vm.live_bytes, live_bytes)
+        assert outer.peak_bytes >= inner.peak_bytes
@@ -0,0 +1,89 @@
+# Copyright 2023 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import tempfile
+
+import numpy as np
+import numpy.testing as npt
+
+import petace.securenumpy as snp
+from petace.tests.utils import SnpTestBase
+
+
+class TestSecureMemmap(SnpTestBase):
+
+    def _memmap(self, data, tmp, name):
+        return snp.SecureMemmap.from_array(snp.array(data, 0), os.path.join(tmp, f"{name}.share"), tile_rows=7)
+
+    def test_elementwise(self, party_id):
+        with tempfile.TemporaryDirectory() as tmp:
+            self._check_elementwise(party_id, tmp)
+
+    def _check_elementwise(self, party_id, tmp):
+        np.random.seed(43)
+        data_a = np.random.random((30, 4))
+        data_b = np.random.random((30, 4))
+        a = self._memmap(data_a, tmp, "a")
+        b = self._memmap(data_b, tmp, "b")
+        cases = ((a + b, data_a + data_b), (a * b, data_a * data_b), (a - 0.5, data_a - 0.5),
+                 (a * data_b, data_a * data_b), (a > b, data_a > data_b))
+        for cipher, plain in cases:
+            npt.assert_equal(cipher.shape, plain.shape)
+            res = cipher.reveal_to(0)
+            if party_id == 0:
+                npt.assert_almost_equal(res, plain, decimal=3)
+
+    def test_reduction(self, party_id):
+        np.random.seed(43)
+        data = np.random.random((30, 4))
+        with tempfile.TemporaryDirectory() as tmp:
+            a = self._memmap(data, tmp, "c")
+            cases = [(a.sum(), np.sum(data)), (a.sum(axis=0), np.sum(data, axis=0))]
+            cases += [(a.mean(axis=0), np.mean(data, axis=0)), (a.sum(axis=1), np.sum(data, axis=1))]
+            cases += [((a > 0.5).sum(), np.sum(data > 0.5))]
+            for cipher, plain in cases:
+                res = cipher.reveal_to(0)
+                if party_id == 0:
+                    npt.assert_almost_equal(res, plain, decimal=3)
+
+    def test_setitem_block(self, party_id):
+        data = np.arange(24, dtype=np.float64).reshape(6, 4) / 4
+        with tempfile.TemporaryDirectory() as tmp:
+            a = self._memmap(data, tmp, "d")
+            a[1:3, 2:4] = snp.array(np.zeros((2, 2)), 0)
+            res = a[0:6].reveal_to(0)
+            del a
+        expected = data.copy()
+        expected[1:3, 2:4] = 0
+        if party_id == 0:
+            npt.assert_almost_equal(res, expected, decimal=3)
+
+    def test_ring32_default(self, party_id):
+        data = np.arange(12, dtype=np.float64).reshape(6, 2) / 4
+        vm = snp.get_vm()
+        vm.set_export_ring_bits(32)
+        try:
+            with tempfile.TemporaryDirectory() as tmp:
+                # share files always hold 64-bit ring shares, whatever the export default
+                a = snp.SecureMemmap.from_array(snp.array(data, 0), os.path.join(tmp, "a.share"), tile_rows=4)
+                a[2:4] = snp.array(data[:2] * 2, 0)
+                res = a.sum(axis=0).reveal_to(0)
+                del a
+        finally:
+            vm.set_export_ring_bits(64)
+        expected = data.copy()
+        expected[2:4] = data[:2] * 2
+        if party_id == 0:
+            npt.assert_almost_equal(res, np.sum(expected, axis=0), decimal=3)
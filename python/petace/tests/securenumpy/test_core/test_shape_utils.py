@@ -0,0 +1,56 @@
+# Copyright 2023 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+import pytest
+
+from petace.securenumpy.core.shape_utils import getitem_shape, matmul_shape, vstack_shape, hstack_shape
+
+
+class TestShapeUtils:
+
+    def run_test_all(self):
+        for method in dir(self):
+            if method.startswith("test_"):
+                getattr(self, method)()
+
+    def test_matmul(self):
+        cases = (((2, 5), (5, 3)), ((5,), (5,)), ((5,), (5, 2)), ((2, 5), (5,)))
+        for a, b in cases:
+            assert matmul_shape(a, b) == (np.ones(a) @ np.ones(b)).shape
+        with pytest.raises(ValueError):
+            matmul_shape((2, 5), (4, 3))
+        with pytest.raises(ValueError):
+            matmul_shape((), (3,))
+
+    def test_getitem(self):
+        shape = (9, 2)
+        indices = (0, -1, slice(5, None), slice(-5, -1), slice(1, 9), (2, 1), (1, slice(None, 2)), (slice(1, None), 1),
+                   (slice(1, None), slice(1, 2)))
+        for index in indices:
+            assert getitem_shape(index, shape) == np.empty(shape)[index].shape
+        for index in (1, slice(1, None), slice(-2, None), slice(5, 10)):
+            assert getitem_shape(index, (18,)) == np.empty((18,))[index].shape
+        with pytest.raises(IndexError):
+            getitem_shape((1, 1), (3,))
+
+    def test_stack(self):
+        cases = (((), ()), ((3,), (3,)), ((2, 3), (4, 3)), ((1, 3), (3,)))
+        for shapes in cases:
+            assert vstack_shape(shapes) == np.vstack([np.empty(i) for i in shapes]).shape
+        cases = (((), ()), ((3,), (4,)), ((3, 2), (3, 4)))
+        for shapes in cases:
+            assert hstack_shape(shapes) == np.hstack([np.empty(i) for i in shapes]).shape
+        with pytest.raises(ValueError):
+            vstack_shape([(2, 3), (2, 4)])
@@ -0,0 +1,77 @@
+# Copyright 2023 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import tempfile
+import threading
+
+import numpy as np
+import numpy.testing as npt
+import pytest
+
+import petace.securenumpy as snp
+from petace.duet.exception import DuetVMError
+from petace.tests.utils import SnpTestBase, init_vm
+
+
+class TestUseVM(SnpTestBase):
+
+    def test_sessions(self, party_id):
+        default = snp.get_vm()
+        sessions = [default, init_vm(party_id, port_offset=2)]
+        data = [np.arange(12, dtype=np.float64).reshape(3, 4) + i for i in range(2)]
+        results = [None, None]
+        errors = []
+
+        def job(i):
+            try:
+                with snp.use_vm(sessions[i]):
+                    a = snp.array(data[i], 0)
+                    assert a.vm is sessions[i]
+                    results[i] = snp.sum(a * a, axis=0).reveal_to(0)
+            except BaseException as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=job, args=(i,)) for i in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # an exception of a thread does not fail the test by itself
+        if errors:
+            raise errors[0]
+        if party_id == 0:
+            for i in range(2):
+                npt.assert_almost_equal(results[i], np.sum(data[i] * data[i], axis=0), decimal=2)
+        assert snp.get_vm() is default
+
+    def test_bound(self, party_id):
+        other = init_vm(party_id, port_offset=4)
+        with snp.use_vm(other):
+            a = snp.array(np.ones((2, 2)), 0)
+            assert snp.current_vm() is other
+        # operations on an array run on its VM whatever the current VM is, and are traced there
+        with tempfile.TemporaryDirectory() as tmp:
+            other.start_trace(os.path.join(tmp, "trace.json"))
+            b = a * 2.0
+            names = {event["name"] for event in other.tracer.events}
+            other.stop_trace()
+        assert "SecureArray.__mul__" in names
+        assert b.vm is other
+        res = b.reveal_to(0)
+        if party_id == 0:
+            npt.assert_almost_equal(res, np.full((2, 2), 2.0), decimal=4)
+        c = snp.array(np.ones((2, 2)), 0)
+        with pytest.raises(DuetVMError):
+            a + c
@@ -0,0 +1,86 @@
+# Copyright 2023 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+import pytest
+
+import petace.securenumpy as snp
+from petace.duet.cost_model import estimate
+
+
+class TestExplain:
+
+    def run_test_all(self):
+        for method in dir(self):
+            if method.startswith("test_"):
+                getattr(self, method)()
+
+    def test_explain(self):
+        x = snp.AbstractArray((100, 10))
+        w = snp.AbstractArray((10,))
+        explanation = snp.explain(lambda x, w: (x @ w).reveal_to(0), x, w)
+        assert [inst.op for inst in explanation.instructions if inst.op != "reshape"] == ["mat_mul", "reveal"]
+        mat_mul = [inst for inst in explanation.instructions if inst.op == "mat_mul"][0]
+        assert mat_mul.cost == estimate("mat_mul", mat_mul.types, mat_mul.shapes)
+        assert explanation.total.rounds == 2
+        assert explanation.result.shape == (100,)
+        assert explanation.by_op()["mat_mul"]["count"] == 1
+        assert "mat_mul" in explanation.table()
+
+    def test_compare_formulations(self):
+        x = snp.AbstractArray((64, 4))
+        by_argmax = snp.explain(lambda x: snp.argmax(x, axis=0), x)
+        by_max = snp.explain(lambda x: snp.max(x, axis=0), x)
+        assert by_argmax.total.rounds > 0 and by_max.total.rounds > 0
+        scaled = snp.explain(lambda x: x * 2.0, x)
+        squared = snp.explain(lambda x: x * x, x)
+        assert scaled.total.rounds < squared.total.rounds
+
+    def test_restore_vm(self):
+        previous = snp.core.init.GLOBALVM.vm
+        snp.explain(lambda x: x + np.ones((2, 2)), snp.AbstractArray((2, 2)))
+        assert snp.core.init.GLOBALVM.vm is previous
+
+    def test_other_party_shapes(self):
+        data = np.ones((100, 10))
+        for party in (0, 1):
+            explanation = snp.explain(lambda d: snp.sum(snp.array(d, 0) * snp.array(d, 0), axis=0), data, party=party)
+            assert explanation.result.shape == (10,)
+            mul = [inst for inst in explanation.instructions if inst.op == "mul"][0]
+            assert mul.shapes[0] == (100, 10)
+
+    def test_reveal_many(self):
+        x = snp.AbstractArray((3, 4))
+        y = snp.AbstractArray((5,))
+        explanation = snp.explain(lambda x, y: snp.reveal_many([x, y], 0), x, y)
+        assert explanation.by_op()["reveal"]["count"] == 1
+        assert explanation.total.rounds > 0
+        assert explanation.total.bytes_sent == 17 * 8
+
+    def test_messages(self):
+        data = np.ones((2, 3))
+        receiver = snp.explain(lambda d: snp.array(d, 1), data, party=0)
+        assert receiver.by_op()["recv_buffer"] == {"count": 1, "rounds": 1, "bytes_sent": 0, "local_ops": 0}
+        sender = snp.explain(lambda d: snp.array(d, 1), data, party=1)
+        assert sender.by_op()["send_buffer"]["bytes_sent"] == 12
+
+    def test_error(self):
+
+        def fn(x):
+            if snp.get_vm().party_id() == 1:
+                raise KeyError("party 1")
+            return snp.array(np.ones(3), 1)
+
+        with pytest.raises(KeyError):
+            snp.explain(fn, snp.AbstractArray((2,)))
@@ -0,0 +1,68 @@
+# Copyright 2023 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+import numpy.testing as npt
+
+import petace.securenumpy as snp
+from petace.tests.utils import SnpTestBase
+
+
+class TestRevealMany(SnpTestBase):
+
+    def _data(self):
+        np.random.seed(43)
+        return [
+            np.random.random((10, 3)),
+            np.random.random(7),
+            np.array(np.random.random()),
+            np.random.randint(0, 100, (4, 5)),
+            np.random.random((6, 2)) > 0.5,
+            np.random.random(9) > 0.5,
+            np.array(True),
+        ]
+
+    def _cipher(self, data):
+        return [snp.array(i, 0, dtype=i.dtype.type) for i in data]
+
+    def test_reveal_many(self, party_id):
+        data = self._data()
+        res = snp.reveal_many(self._cipher(data), 1)
+        npt.assert_equal(len(res), len(data))
+        for plain, expect in zip(res, data):
+            if party_id == 1:
+                npt.assert_equal(plain.shape, expect.shape)
+                npt.assert_equal(plain.dtype, expect.dtype)
+                npt.assert_almost_equal(plain, expect, decimal=4)
+            else:
+                assert plain is None
+
+    def test_reveal_many_to_all(self, party_id):
+        data = self._data()
+        res = snp.reveal_many_to_all(self._cipher(data))
+        for plain, expect in zip(res, data):
+            npt.assert_equal(plain.shape, expect.shape)
+            npt.assert_almost_equal(plain, expect, decimal=4)
+
+    def test_one_reveal_per_dtype(self, party_id):
+        data = self._data() + [np.zeros((0, 2))]
+        ciphers = self._cipher(data)
+        vm = snp.get_vm()
+        vm.enable_profile()
+        res = snp.reveal_many(ciphers, 0)
+        report = vm.profile(reset=True)
+        vm.enable_profile(False)
+        assert report["reveal"]["count"] == 3
+        if party_id == 0:
+            npt.assert_equal(res[-1].shape, (0, 2))
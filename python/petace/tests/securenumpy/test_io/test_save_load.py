@@ -0,0 +1,55 @@
+# Copyright 2023 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import tempfile
+
+import numpy as np
+import numpy.testing as npt
+
+import petace.securenumpy as snp
+from petace.securenumpy.io import read_header
+from petace.tests.utils import SnpTestBase
+
+
+class TestSaveLoad(SnpTestBase):
+
+    def _check(self, party_id, data, dtype, mmap=True, **kwargs):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "a.sa")
+            snp.save(path, snp.array(data, 0, dtype=dtype), **kwargs)
+            header, offset = read_header(path)
+            npt.assert_equal(offset % 64, 0)
+            npt.assert_equal(tuple(header["shape"]), data.shape)
+            npt.assert_equal(header["party"], party_id)
+            data_cipher = snp.load(path, mmap=mmap)
+            npt.assert_equal(data_cipher.shape, data.shape)
+            npt.assert_equal(data_cipher.dtype, dtype)
+            data_plain = data_cipher.reveal_to(0)
+            del data_cipher
+        if party_id == 0:
+            npt.assert_almost_equal(data_plain, data, decimal=4)
+
+    def test_float(self, party_id):
+        np.random.seed(43)
+        self._check(party_id, np.random.random((10, 20)), np.float64)
+        self._check(party_id, np.array(np.random.random()), np.float64, mmap=False)
+
+    def test_ring32(self, party_id):
+        np.random.seed(43)
+        self._check(party_id, np.random.randint(-100, 100, 30), np.int64, ring_bits=32)
+
+    def test_packed_bool(self, party_id):
+        np.random.seed(43)
+        self._check(party_id, np.random.random((7, 11)) > 0.5, np.bool_, packed=True)
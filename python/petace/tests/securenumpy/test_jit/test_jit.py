@@ -0,0 +1,119 @@
+# Copyright 2023 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import warnings
+
+import numpy as np
+import numpy.testing as npt
+
+import petace.securenumpy as snp
+from petace.tests.utils import SnpTestBase
+
+
+@snp.jit
+def gradient_step(x, y, w, lr):
+    error = x @ w - y
+    grad = x.T @ error
+    return w - grad * lr, snp.sum(error * error)
+
+
+class TestJit(SnpTestBase):
+
+    def test_replay(self, party_id):
+        np.random.seed(44)
+        x = np.random.random((50, 4))
+        y = np.random.random(50)
+        w = np.zeros(4)
+        x_s, y_s, w_s = snp.array(x, 0), snp.array(y, 0), snp.array(w, 0)
+        for _ in range(3):
+            w_s, loss_s = gradient_step(x_s, y_s, w_s, 0.01)
+            error = x @ w - y
+            w, loss = w - x.T @ error * 0.01, np.sum(error * error)
+        assert gradient_step.trace_count == 1
+        w_res = w_s.reveal_to(0)
+        loss_res = loss_s.reveal_to(0)
+        if party_id == 0:
+            npt.assert_almost_equal(w_res, w, decimal=3)
+            npt.assert_almost_equal(loss_res, loss, decimal=2)
+        # another public argument is another signature
+        gradient_step(x_s, y_s, w_s, 0.02)
+        assert gradient_step.trace_count == 2
+        gradient_step.clear()
+
+    def test_eager_fallback(self, party_id):
+        data = np.arange(6, dtype=np.float64)
+        a = snp.array(data, 0)
+
+        @snp.jit
+        def reveal_double(x):
+            return (x * 2).reveal_to(0)
+
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            res = reveal_double(a)
+            res = reveal_double(a)
+        assert reveal_double.trace_count == 1
+        assert any(issubclass(w.category, RuntimeWarning) for w in caught)
+        if party_id == 0:
+            npt.assert_almost_equal(res, data * 2, decimal=4)
+
+    def test_private_input(self, party_id):
+        inputs = iter([np.ones((2, 2)), np.full((2, 2), 2.0)])
+        x = snp.array(np.ones((2, 2)), 1)
+
+        @snp.jit
+        def scale(x):
+            return x * snp.array(next(inputs), 0)
+
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            scale(x)
+            res = scale(x).reveal_to(0)
+        assert scale.trace_count == 1
+        assert any(issubclass(w.category, RuntimeWarning) for w in caught)
+        # the second call shares its new data instead of replaying the first one
+        if party_id == 0:
+            npt.assert_almost_equal(res, np.full((2, 2), 2.0), decimal=4)
+
+    def test_astype(self, party_id):
+        a = snp.array(np.array([True, False, True]), 0)
+        to_float = snp.jit(lambda x: x.astype(np.float64) * 2.0)
+        for _ in range(2):
+            res = to_float(a).reveal_to(0)
+        assert len(to_float.programs()) == 1
+        if party_id == 0:
+            npt.assert_almost_equal(res, [2.0, 0.0, 2.0], decimal=4)
+
+    def test_passes(self, party_id):
+        np.random.seed(45)
+        a, b, v = np.random.random((20, 10)), np.random.random((10, 15)), np.random.random(15)
+        a_s, b_s, v_s = snp.array(a, 0), snp.array(b, 0), snp.array(v, 0)
+
+        def func(a, b, v):
+            return (-a) @ b @ v * 2.0 * 0.5 + (-a) @ (b @ v) * 3
+
+        optimized = snp.jit(func)
+        plain = snp.jit(passes=())(func)
+        for _ in range(2):
+            res = optimized(a_s, b_s, v_s).reveal_to(0)
+            plain_res = plain(a_s, b_s, v_s).reveal_to(0)
+            if party_id == 0:
+                npt.assert_almost_equal(res, -4 * a @ b @ v, decimal=2)
+                npt.assert_almost_equal(res, plain_res, decimal=2)
+        program, plain_program = optimized.programs()[0], plain.programs()[0]
+        assert program.instruction_count < plain_program.instruction_count
+        assert {report.name for report in program.report} == {"fold", "cse", "matrix_chain", "dce"}
+        assert plain_program.report == []
+        optimized.clear()
+        plain.clear()
@@ -0,0 +1,72 @@
+# Copyright 2023 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import tempfile
+
+import numpy as np
+import numpy.testing as npt
+
+import petace.securenumpy as snp
+from petace.tests.utils import SnpTestBase
+
+
+class TestTiledMatmul(SnpTestBase):
+
+    def test_secret(self, party_id):
+        np.random.seed(43)
+        data_a = np.random.random((13, 9))
+        data_b = np.random.random((9, 5))
+        a = snp.array(data_a, 0)
+        b = snp.array(data_b, 1)
+        for cipher in (snp.tiled_matmul(a, b, 4), snp.tiled_matmul(a, data_b, 4)):
+            npt.assert_equal(cipher.shape, (13, 5))
+            res = cipher.reveal_to(0)
+            if party_id == 0:
+                npt.assert_almost_equal(res, data_a @ data_b, decimal=3)
+
+    def test_gram(self, party_id):
+        np.random.seed(43)
+        data = np.random.random((50, 3))
+        with tempfile.TemporaryDirectory() as tmp:
+            x = snp.SecureMemmap.from_array(snp.array(data, 0), os.path.join(tmp, "x.share"))
+            cipher = snp.tiled_matmul(x, x, 8, trans_a=True)
+            del x
+        npt.assert_equal(cipher.shape, (3, 3))
+        res = cipher.reveal_to(0)
+        if party_id == 0:
+            npt.assert_almost_equal(res, data.T @ data, decimal=3)
+
+    def test_out(self, party_id):
+        np.random.seed(43)
+        data_a = np.random.random((10, 6))
+        data_b = np.random.random((6, 11))
+        with tempfile.TemporaryDirectory() as tmp:
+            out = snp.SecureMemmap(os.path.join(tmp, "out.share"), np.float64, "w+", (10, 11))
+            assert snp.tiled_matmul(snp.array(data_a, 0), snp.array(data_b, 1), 4, out=out) is out
+            res = out[0:10].reveal_to(0)
+            del out
+        if party_id == 0:
+            npt.assert_almost_equal(res, data_a @ data_b, decimal=3)
+
+    def test_empty(self, party_id):
+        a = snp.array(np.ones((3, 0)), 0)
+        b = snp.array(np.ones((0, 4)), 1)
+        res = snp.tiled_matmul(a, b, 2).reveal_to(0)
+        if party_id == 0:
+            npt.assert_equal(res, np.zeros((3, 4)))
+        for cipher in (snp.tiled_matmul(b, np.ones((4, 2)), 2), snp.tiled_matmul(np.ones((2, 3)), a, 2)):
+            res = cipher.reveal_to(0)
+            if party_id == 0:
+                npt.assert_equal(res.shape, cipher.shape)
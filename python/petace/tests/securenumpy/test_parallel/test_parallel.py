@@ -0,0 +1,57 @@
+# Copyright 2023 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import gc
+
+import numpy as np
+import numpy.testing as npt
+
+import petace.securenumpy as snp
+from petace.tests.utils import SnpTestBase
+
+
+class TestParallel(SnpTestBase):
+
+    def test_parallel(self, party_id):
+        np.random.seed(48)
+        x = np.random.random((101, 3))
+        y = np.random.random((101, 3))
+        a, b = snp.array(x, 0), snp.array(y, 1)
+        with snp.parallel(3, 8900) as workers:
+            assert [(rows.start, rows.stop) for rows in workers.partition(101)] == [(0, 34), (34, 68), (68, 101)]
+            less, product = workers.map(lambda u, v: (u < v, u * v), a, b)
+            total = workers.sum(a, axis=0)
+            largest = workers.max(b)
+        assert less.vm is snp.get_vm()
+        assert less.shape == (101, 3) and total.shape == (3,) and largest.shape == ()
+        less, product = less.reveal_to(0), product.reveal_to(0)
+        total, largest = total.reveal_to(0), largest.reveal_to(0)
+        if party_id == 0:
+            npt.assert_equal(less, x < y)
+            npt.assert_almost_equal(product, x * y, decimal=3)
+            npt.assert_almost_equal(total, np.sum(x, axis=0), decimal=2)
+            npt.assert_almost_equal(largest, np.max(y), decimal=3)
+
+    def test_reuse_ports(self, party_id):
+        data = np.arange(8, dtype=np.float64).reshape(4, 2)
+        for _ in range(2):
+            with snp.parallel(2, 8910) as workers:
+                assert workers.partition(0) == []
+                total = workers.sum(snp.array(data, 0), axis=0)
+            assert workers.vms == []
+            # the closed VMs release their connections once collected
+            gc.collect()
+        res = total.reveal_to(0)
+        if party_id == 0:
+            npt.assert_almost_equal(res, np.sum(data, axis=0), decimal=3)
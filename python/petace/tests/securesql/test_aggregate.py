@@ -47,9 +47,10 @@ class TestSecureSQL(SnpTestBase):
         input_a = snp.array(data_a, 0)
         input_coding = snp.array(encoding, 0)
         output = ssql.groupby_count(input_a, input_coding)
+        assert output.dtype == np.int64
         p0 = output.reveal_to(0)
         if party_id == 0:
-            npt.assert_almost_equal(p0, data_b, decimal=3)
+            npt.assert_equal(p0, data_b)
 
     def test_group_by_max(self, party_id):
         data_a = np.array([[-15.812, -14.7387], [7.8120, -9.7387], [-2.8120, 6.7387], [1.8120, 1.7387],
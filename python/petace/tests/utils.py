@@ -48,12 +48,12 @@ def run_test(test_func):
             raise PETAceTestException(n, error)
 
 
-def init_network(party):
+def init_network(party, port_offset=0):
     net_params = NetParams()
     ip1 = "127.0.0.1"
-    port1 = 8890
+    port1 = 8890 + port_offset
     ip2 = "127.0.0.1"
-    port2 = 8891
+    port2 = 8891 + port_offset
     if party == 0:
         net_params.remote_addr = ip1
         net_params.remote_port = port1
@@ -78,8 +78,8 @@ class NetworkTestBase(ABC):
                 getattr(self, method)(party)
 
 
-def init_vm(party):
-    net = init_network(party)
+def init_vm(party, port_offset=0):
+    net = init_network(party, port_offset)
 
     duet = VM(net, party)
     return duet
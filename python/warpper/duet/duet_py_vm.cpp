@@ -14,6 +14,11 @@
 
 #include "duet_py_vm.h"
 
+#include <time.h>
+
+#include <algorithm>
+#include <stdexcept>
+
 #include "duet/util/matrix.h"
 
 namespace petace {
@@ -31,20 +36,16 @@ void PythonDuetVM::set_private_bool_matrix(
         const py::array_t<bool, py::array::c_style | py::array::forcecast>& input_array, RegisterAddress addr) {
     const std::shared_ptr<PrivateMatrixBool>& matirx_ptr = get_data<PrivateMatrixBool>(addr);
     if (party_id() == matirx_ptr->party_id()) {
-        py::buffer_info buf_info = input_array.request();
-        if (buf_info.ndim != 2)
-            throw std::runtime_error("Number of dimensions must be two");
-
-        auto array_ptr = static_cast<bool*>(buf_info.ptr);
-        matirx_ptr->resize(buf_info.shape[0], buf_info.shape[1]);
-
-        for (size_t i = 0; i < matirx_ptr->size(); ++i) {
-            if (array_ptr[i] == true) {
-                (*matirx_ptr)(i) = 1;
-            } else {
-                (*matirx_ptr)(i) = 0;
-            }
-        }
+        bool_to_eigen_(input_array, matirx_ptr->matrix());
+    }
+}
+
+void PythonDuetVM::set_private_bool_matrix_from_bits(
+        const py::array_t<std::uint8_t, py::array::c_style | py::array::forcecast>& input_bits, std::size_t rows,
+        std::size_t cols, RegisterAddress addr) {
+    const std::shared_ptr<PrivateMatrixBool>& matirx_ptr = get_data<PrivateMatrixBool>(addr);
+    if (party_id() == matirx_ptr->party_id()) {
+        bits_to_eigen_(input_bits, rows, cols, matirx_ptr->matrix());
     }
 }
 
@@ -66,6 +67,26 @@ void PythonDuetVM::set_boolean_share_matrix(
     numpy_to_eigen_(input_array, share_ptr->shares());
 }
 
+void PythonDuetVM::set_boolean_share_matrix_packed(
+        const py::array_t<std::uint64_t, py::array::c_style | py::array::forcecast>& input_words, std::size_t rows,
+        std::size_t cols, RegisterAddress addr) {
+    const std::shared_ptr<BoolMatrix>& share_ptr = get_data<BoolMatrix>(addr);
+    std::size_t size = rows * cols;
+    if (static_cast<std::size_t>(input_words.size()) < (size + 63) / 64)
+        throw std::runtime_error("Not enough words for the given shape");
+
+    auto words_ptr = input_words.data();
+    Matrix<std::int64_t>& shares = share_ptr->shares();
+    shares.resize(rows, cols);
+    std::int64_t* out_ptr = shares.data();
+    int threads = static_cast<int>(num_threads_);
+    py::gil_scoped_release release;
+#pragma omp parallel for schedule(static) num_threads(threads)
+    for (std::int64_t i = 0; i < static_cast<std::int64_t>(size); ++i) {
+        out_ptr[i] = static_cast<std::int64_t>((words_ptr[i / 64] >> (i % 64)) & 1);
+    }
+}
+
 void PythonDuetVM::set_public_double(PublicDouble value, RegisterAddress addr) {
     const std::shared_ptr<PublicDouble>& ptr = get_data<PublicDouble>(addr);
     *ptr = value;
@@ -79,19 +100,14 @@ void PythonDuetVM::set_public_index(PublicIndex value, RegisterAddress addr) {
 void PythonDuetVM::set_public_bool_matrix(
         const py::array_t<bool, py::array::c_style | py::array::forcecast>& input_array, RegisterAddress addr) {
     const std::shared_ptr<PublicMatrixBool>& matirx_ptr = get_data<PublicMatrixBool>(addr);
-    py::buffer_info buf_info = input_array.request();
-    if (buf_info.ndim != 2)
-        throw std::runtime_error("Number of dimensions must be two");
-
-    auto array_ptr = static_cast<bool*>(buf_info.ptr);
-    matirx_ptr->resize(buf_info.shape[0], buf_info.shape[1]);
-    for (size_t i = 0; i < matirx_ptr->size(); ++i) {
-        if (array_ptr[i] == true) {
-            (*matirx_ptr)(i) = 1;
-        } else {
-            (*matirx_ptr)(i) = 0;
-        }
-    }
+    bool_to_eigen_(input_array, matirx_ptr->matrix());
+}
+
+void PythonDuetVM::set_public_bool_matrix_from_bits(
+        const py::array_t<std::uint8_t, py::array::c_style | py::array::forcecast>& input_bits, std::size_t rows,
+        std::size_t cols, RegisterAddress addr) {
+    const std::shared_ptr<PublicMatrixBool>& matirx_ptr = get_data<PublicMatrixBool>(addr);
+    bits_to_eigen_(input_bits, rows, cols, matirx_ptr->matrix());
 }
 
 py::array_t<double, py::array::c_style | py::array::forcecast> PythonDuetVM::get_private_double_matrix(
@@ -99,7 +115,17 @@ py::array_t<double, py::array::c_style | py::array::forcecast> PythonDuetVM::get
     const std::shared_ptr<PrivateMatrix<double>>& matirx_ptr = get_data<PrivateMatrix<double>>(addr);
     py::array_t<double, py::array::c_style | py::array::forcecast> ret;
     if (party_id() == matirx_ptr->party_id()) {
-        eigen_to_numpy_(matirx_ptr->matrix(), ret);
+        eigen_to_numpy_(Matrix<double>(matirx_ptr->matrix()), ret);
+    }
+    return ret;
+}
+
+py::array_t<double, py::array::c_style | py::array::forcecast> PythonDuetVM::take_private_double_matrix(
+        RegisterAddress addr) {
+    const std::shared_ptr<PrivateMatrix<double>>& matirx_ptr = get_data<PrivateMatrix<double>>(addr);
+    py::array_t<double, py::array::c_style | py::array::forcecast> ret;
+    if (party_id() == matirx_ptr->party_id()) {
+        eigen_to_numpy_(std::move(matirx_ptr->matrix()), ret);
     }
     return ret;
 }
@@ -108,7 +134,7 @@ py::array_t<std::int64_t, py::array::c_style | py::array::forcecast> PythonDuetV
         RegisterAddress addr) {
     const std::shared_ptr<ArithMatrix>& share_ptr = get_data<ArithMatrix>(addr);
     py::array_t<std::int64_t, py::array::c_style | py::array::forcecast> ret;
-    eigen_to_numpy_(share_ptr->shares(), ret);
+    eigen_to_numpy_(Matrix<std::int64_t>(share_ptr->shares()), ret);
     return ret;
 }
 
@@ -116,21 +142,92 @@ py::array_t<std::int64_t, py::array::c_style | py::array::forcecast> PythonDuetV
         RegisterAddress addr) {
     const std::shared_ptr<BoolMatrix>& share_ptr = get_data<BoolMatrix>(addr);
     py::array_t<std::int64_t, py::array::c_style | py::array::forcecast> ret;
-    eigen_to_numpy_(share_ptr->shares(), ret);
+    eigen_to_numpy_(Matrix<std::int64_t>(share_ptr->shares()), ret);
+    return ret;
+}
+
+py::array_t<std::uint64_t, py::array::c_style | py::array::forcecast> PythonDuetVM::get_boolean_share_matrix_packed(
+        RegisterAddress addr) {
+    const std::shared_ptr<BoolMatrix>& share_ptr = get_data<BoolMatrix>(addr);
+    const Matrix<std::int64_t>& shares = share_ptr->shares();
+    std::size_t size = static_cast<std::size_t>(shares.size());
+    Matrix<std::uint64_t> words = Matrix<std::uint64_t>::Zero(1, (size + 63) / 64);
+    const std::int64_t* lanes_ptr = shares.data();
+    std::uint64_t* words_ptr = words.data();
+    {
+        // each thread builds whole words, so no two threads write the same word
+        py::gil_scoped_release release;
+        std::int64_t word_count = static_cast<std::int64_t>(words.size());
+        int threads = static_cast<int>(num_threads_);
+#pragma omp parallel for schedule(static) num_threads(threads)
+        for (std::int64_t w = 0; w < word_count; ++w) {
+            std::size_t begin = static_cast<std::size_t>(w) * 64;
+            std::size_t end = std::min(begin + 64, size);
+            std::uint64_t word = 0;
+            for (std::size_t i = begin; i < end; ++i) {
+                word |= (static_cast<std::uint64_t>(lanes_ptr[i]) & 1) << (i - begin);
+            }
+            words_ptr[w] = word;
+        }
+    }
+    py::array_t<std::uint64_t, py::array::c_style | py::array::forcecast> ret;
+    eigen_to_numpy_(std::move(words), ret);
     return ret;
 }
 
 py::array_t<bool, py::array::c_style | py::array::forcecast> PythonDuetVM::get_private_bool_matrix(
         RegisterAddress address) {
     const std::shared_ptr<PrivateMatrixBool>& matirx_ptr = get_data<PrivateMatrixBool>(address);
-    Matrix<bool> tmp;
+    py::array_t<bool, py::array::c_style | py::array::forcecast> ret;
     if (party_id() == matirx_ptr->party_id()) {
-        tmp.resize(matirx_ptr->rows(), matirx_ptr->cols());
-        for (std::size_t i = 0; i < matirx_ptr->size(); ++i) {
-            tmp(i) = ((*matirx_ptr)(i) == 1 ? true : false);
-        }
+        eigen_to_numpy_(Matrix<bool>(matirx_ptr->matrix().template cast<bool>()), ret);
+    }
+    return ret;
+}
+
+py::array_t<bool, py::array::c_style | py::array::forcecast> PythonDuetVM::take_private_bool_matrix(
+        RegisterAddress address) {
+    const std::shared_ptr<PrivateMatrixBool>& matirx_ptr = get_data<PrivateMatrixBool>(address);
+    py::array_t<bool, py::array::c_style | py::array::forcecast> ret;
+    if (party_id() == matirx_ptr->party_id()) {
+        eigen_to_numpy_(Matrix<bool>(matirx_ptr->matrix().template cast<bool>()), ret);
+        matirx_ptr->resize(0, 0);
+    }
+    return ret;
+}
+
+void PythonDuetVM::exec_program(
+        const std::vector<Instruction>& instructions, const std::vector<std::vector<RegisterAddress>>& addresses) {
+    if (instructions.size() != addresses.size()) {
+        throw std::runtime_error("Number of instructions and operand lists must match");
+    }
+    for (std::size_t i = 0; i < instructions.size(); ++i) {
+        exec_code(instructions[i], addresses[i]);
+    }
+}
+
+void PythonDuetVM::set_num_threads(std::size_t num_threads) {
+    if (num_threads == 0) {
+        throw std::invalid_argument("Number of threads must be positive");
+    }
+    num_threads_ = num_threads;
+}
+
+std::size_t PythonDuetVM::num_threads() const {
+    return num_threads_;
+}
+
+double PythonDuetVM::thread_cpu_time() const {
+    double total = 0.0;
+    int threads = static_cast<int>(num_threads_);
+    // the OpenMP threads of a thread are kept in its own pool and reused by its regions
+#pragma omp parallel num_threads(threads) reduction(+ : total)
+    {
+        timespec ts;
+        clock_gettime(CLOCK_THREAD_CPUTIME_ID, &ts);
+        total += static_cast<double>(ts.tv_sec) + static_cast<double>(ts.tv_nsec) * 1e-9;
     }
-    return py::array_t<bool, py::array::c_style | py::array::forcecast>({tmp.rows(), tmp.cols()}, tmp.data());
+    return total;
 }
 
 }  // namespace duet
@@ -41,6 +41,11 @@ class PythonDuetVM : public DuetVM {
     void set_private_bool_matrix(
             const py::array_t<bool, py::array::c_style | py::array::forcecast>& input_array, RegisterAddress addr);
 
+    // Sets a private bool matrix from a bitmap packed by np.packbits (big bit order, row-major).
+    void set_private_bool_matrix_from_bits(
+            const py::array_t<std::uint8_t, py::array::c_style | py::array::forcecast>& input_bits, std::size_t rows,
+            std::size_t cols, RegisterAddress addr);
+
     void set_public_double_matrix(
             const py::array_t<double, py::array::c_style | py::array::forcecast>& input_array, RegisterAddress addr);
 
@@ -51,9 +56,18 @@ class PythonDuetVM : public DuetVM {
             const py::array_t<std::int64_t, py::array::c_style | py::array::forcecast>& input_array,
             RegisterAddress addr);
 
+    // Sets a boolean share from words holding 64 lanes each, lane k of the matrix is bit k % 64 of word k / 64.
+    void set_boolean_share_matrix_packed(
+            const py::array_t<std::uint64_t, py::array::c_style | py::array::forcecast>& input_words, std::size_t rows,
+            std::size_t cols, RegisterAddress addr);
+
     void set_public_bool_matrix(
             const py::array_t<bool, py::array::c_style | py::array::forcecast>& input_array, RegisterAddress addr);
 
+    void set_public_bool_matrix_from_bits(
+            const py::array_t<std::uint8_t, py::array::c_style | py::array::forcecast>& input_bits, std::size_t rows,
+            std::size_t cols, RegisterAddress addr);
+
     void set_public_double(PublicDouble value, RegisterAddress addr);
 
     void set_public_index(PublicIndex value, RegisterAddress addr);
@@ -66,11 +80,38 @@ class PythonDuetVM : public DuetVM {
 
     py::array_t<bool, py::array::c_style | py::array::forcecast> get_public_bool_matrix(RegisterAddress address);
 
+    // The share getters copy the register once into a new array, as the register stays in use by later instructions.
     py::array_t<std::int64_t, py::array::c_style | py::array::forcecast> get_airth_share_matrix(RegisterAddress addr);
 
     py::array_t<std::int64_t, py::array::c_style | py::array::forcecast> get_boolean_share_matrix(RegisterAddress addr);
 
+    py::array_t<std::uint64_t, py::array::c_style | py::array::forcecast> get_boolean_share_matrix_packed(
+            RegisterAddress addr);
+
+    // Moves the matrix out of the register into the returned array, the register is left empty.
+    // Only these methods save a copy over building the array from the register.
+    py::array_t<double, py::array::c_style | py::array::forcecast> take_private_double_matrix(RegisterAddress address);
+
+    py::array_t<bool, py::array::c_style | py::array::forcecast> take_private_bool_matrix(RegisterAddress address);
+
+    // Executes `instructions` in order, the operands of instruction i are `addresses[i]`.
+    // One call replays a whole recorded program without returning to Python between instructions.
+    void exec_program(
+            const std::vector<Instruction>& instructions, const std::vector<std::vector<RegisterAddress>>& addresses);
+
+    // Sets the number of OpenMP threads of the packing loops of this wrapper, which convert bool shares from
+    // and to bit-packed words, 1 by default. The Duet instructions are precompiled and keep their own threading.
+    // The setting belongs to this VM, VMs used by different threads keep their own.
+    void set_num_threads(std::size_t num_threads);
+
+    std::size_t num_threads() const;
+
+    // CPU seconds used by the calling thread and the OpenMP threads it runs the kernels of this VM on.
+    double thread_cpu_time() const;
+
 private:
+    std::size_t num_threads_ = 1;
+
     template <typename T>
     void numpy_to_eigen_(
             const py::array_t<T, py::array::c_style | py::array::forcecast>& input_numpy, Matrix<T>& output_eigen) {
@@ -78,16 +119,60 @@ class PythonDuetVM : public DuetVM {
         if (buf_info.ndim != 2)
             throw std::runtime_error("Number of dimensions must be two");
 
-        auto array_ptr = static_cast<T*>(buf_info.ptr);
-        Eigen::Map<Matrix<T>> mat(array_ptr, buf_info.shape[0], buf_info.shape[1]);
-        output_eigen = Matrix<T>(mat);
+        // Registers own their Eigen storage, so the data is copied once into the destination.
+        // The caller keeps the array alive, so the copy runs without the GIL.
+        auto array_ptr = static_cast<const T*>(buf_info.ptr);
+        py::gil_scoped_release release;
+        Eigen::Map<const Matrix<T>> mat(array_ptr, buf_info.shape[0], buf_info.shape[1]);
+        output_eigen = mat;
+    }
+
+    void bool_to_eigen_(const py::array_t<bool, py::array::c_style | py::array::forcecast>& input_numpy,
+            Matrix<std::int64_t>& output_eigen) {
+        py::buffer_info buf_info = input_numpy.request();
+        if (buf_info.ndim != 2)
+            throw std::runtime_error("Number of dimensions must be two");
+
+        auto array_ptr = static_cast<const bool*>(buf_info.ptr);
+        py::gil_scoped_release release;
+        Eigen::Map<const Matrix<bool>> mat(array_ptr, buf_info.shape[0], buf_info.shape[1]);
+        output_eigen = mat.template cast<std::int64_t>();
+    }
+
+    void bits_to_eigen_(const py::array_t<std::uint8_t, py::array::c_style | py::array::forcecast>& input_bits,
+            std::size_t rows, std::size_t cols, Matrix<std::int64_t>& output_eigen) {
+        std::size_t size = rows * cols;
+        if (static_cast<std::size_t>(input_bits.size()) < (size + 7) / 8)
+            throw std::runtime_error("Not enough bits for the given shape");
+
+        auto bits_ptr = input_bits.data();
+        py::gil_scoped_release release;
+        output_eigen.resize(rows, cols);
+        std::int64_t* out_ptr = output_eigen.data();
+        std::int64_t full_bytes = static_cast<std::int64_t>(size / 8);
+        int threads = static_cast<int>(num_threads_);
+#pragma omp parallel for schedule(static) num_threads(threads)
+        for (std::int64_t i = 0; i < full_bytes; ++i) {
+            std::uint8_t byte = bits_ptr[i];
+            for (std::size_t j = 0; j < 8; ++j) {
+                out_ptr[8 * i + j] = (byte >> (7 - j)) & 1;
+            }
+        }
+        for (std::size_t i = static_cast<std::size_t>(full_bytes) * 8; i < size; ++i) {
+            out_ptr[i] = (bits_ptr[i / 8] >> (7 - i % 8)) & 1;
+        }
     }
 
+    // Hands the storage of `input_eigen` over to the returned array without copying. Getters of registers still
+    // in use pass a copy of the register, take_private_double_matrix passes the register's own matrix.
+    // The array owns the moved matrix through a capsule and frees it when it is garbage collected.
     template <typename T>
     void eigen_to_numpy_(
-            const Matrix<T>& input_eigen, py::array_t<T, py::array::c_style | py::array::forcecast>& out_numpy) {
+            Matrix<T>&& input_eigen, py::array_t<T, py::array::c_style | py::array::forcecast>& out_numpy) {
+        auto owned = new Matrix<T>(std::move(input_eigen));
+        py::capsule base(owned, [](void* ptr) { delete reinterpret_cast<Matrix<T>*>(ptr); });
         out_numpy = py::array_t<T, py::array::c_style | py::array::forcecast>(
-                {input_eigen.rows(), input_eigen.cols()}, input_eigen.data());
+                {owned->rows(), owned->cols()}, owned->data(), base);
     }
 };
 
@@ -35,22 +35,32 @@ PYBIND11_MODULE(pyduet, m) {
             .def("new_public_bool_matrix", &petace::duet::PythonDuetVM::new_data<petace::duet::PublicMatrixBool>)
             .def("new_private_double_matrix", &petace::duet::PythonDuetVM::new_private_matrix<double>)
             .def("new_private_bool_matrix", &petace::duet::PythonDuetVM::new_private_matrix<std::int64_t>)
-            .def("exec_code", &petace::duet::PythonDuetVM::exec_code)
+            .def("exec_code", &petace::duet::PythonDuetVM::exec_code, py::call_guard<py::gil_scoped_release>())
+            .def("exec_program", &petace::duet::PythonDuetVM::exec_program, py::call_guard<py::gil_scoped_release>())
             .def("set_private_double_matrix", &petace::duet::PythonDuetVM::set_private_double_matrix)
             .def("set_private_bool_matrix", &petace::duet::PythonDuetVM::set_private_bool_matrix)
+            .def("set_private_bool_matrix_from_bits", &petace::duet::PythonDuetVM::set_private_bool_matrix_from_bits)
             .def("set_public_double_matrix", &petace::duet::PythonDuetVM::set_public_double_matrix)
             .def("set_public_double", &petace::duet::PythonDuetVM::set_public_double)
             .def("set_public_index", &petace::duet::PythonDuetVM::set_public_index)
             .def("set_public_bool_matrix", &petace::duet::PythonDuetVM::set_public_bool_matrix)
+            .def("set_public_bool_matrix_from_bits", &petace::duet::PythonDuetVM::set_public_bool_matrix_from_bits)
             .def("set_airth_share_matrix", &petace::duet::PythonDuetVM::set_airth_share_matrix)
             .def("set_boolean_share_matrix", &petace::duet::PythonDuetVM::set_boolean_share_matrix)
+            .def("set_boolean_share_matrix_packed", &petace::duet::PythonDuetVM::set_boolean_share_matrix_packed)
             .def("get_private_double_matrix", &petace::duet::PythonDuetVM::get_private_double_matrix)
             .def("get_private_bool_matrix", &petace::duet::PythonDuetVM::get_private_bool_matrix)
+            .def("take_private_double_matrix", &petace::duet::PythonDuetVM::take_private_double_matrix)
+            .def("take_private_bool_matrix", &petace::duet::PythonDuetVM::take_private_bool_matrix)
             .def("get_airth_share_matrix", &petace::duet::PythonDuetVM::get_airth_share_matrix)
             .def("get_boolean_share_matrix", &petace::duet::PythonDuetVM::get_boolean_share_matrix)
+            .def("get_boolean_share_matrix_packed", &petace::duet::PythonDuetVM::get_boolean_share_matrix_packed)
             .def("delete_data", &petace::duet::PythonDuetVM::delete_data)
             .def("is_registr_empty", &petace::duet::PythonDuetVM::is_registr_empty)
             .def("party_id", &petace::duet::PythonDuetVM::party_id)
+            .def("set_num_threads", &petace::duet::PythonDuetVM::set_num_threads)
+            .def("num_threads", &petace::duet::PythonDuetVM::num_threads)
+            .def("thread_cpu_time", &petace::duet::PythonDuetVM::thread_cpu_time)
             .def("get_private_double_matrix_shape",
                     &petace::duet::PythonDuetVM::shape<petace::duet::PrivateMatrix<double>>)
             .def("get_public_double_matrix_shape",
@@ -70,6 +80,6 @@ PYBIND11_MODULE(pyduet, m) {
             .def("public_double_hstack", &petace::duet::PythonDuetVM::hstack<petace::duet::PublicMatrix<double>>)
             .def("airth_share_hstack", &petace::duet::PythonDuetVM::hstack<petace::duet::ArithMatrix>)
             .def("bool_share_hstack", &petace::duet::PythonDuetVM::hstack<petace::duet::BoolMatrix>)
-            .def("send_buffer", &petace::duet::PythonDuetVM::send_buffer)
-            .def("recv_buffer", &petace::duet::PythonDuetVM::recv_buffer);
+            .def("send_buffer", &petace::duet::PythonDuetVM::send_buffer, py::call_guard<py::gil_scoped_release>())
+            .def("recv_buffer", &petace::duet::PythonDuetVM::recv_buffer, py::call_guard<py::gil_scoped_release>());
 }
@@ -44,10 +44,13 @@ PYBIND11_MODULE(pynetwork, m) {
                         py::buffer_info info = b.request();
                         self.send_data(static_cast<void*>(info.ptr), size);
                     })
-            .def("recv_data", [](petace::network::Network& self, py::buffer b, int size) {
-                py::buffer_info info = b.request();
-                self.recv_data(static_cast<void*>(info.ptr), size);
-            });
+            .def("recv_data",
+                    [](petace::network::Network& self, py::buffer b, int size) {
+                        py::buffer_info info = b.request();
+                        self.recv_data(static_cast<void*>(info.ptr), size);
+                    })
+            .def("get_bytes_sent", &petace::network::Network::get_bytes_sent)
+            .def("get_bytes_received", &petace::network::Network::get_bytes_received);
 
     py::class_<petace::network::NetSocket, std::shared_ptr<petace::network::NetSocket>, petace::network::Network>(
             m, "petace::network::NetSocket");